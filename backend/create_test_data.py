@@ -13,6 +13,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loanserp.base')
 django.setup()
 
 from exposure.models import Keyword, ExposureSnapshot
+from exposure.ingest import upsert_snapshots
 
 def create_test_data(days=30):
     """Create test data for the last N days"""
@@ -48,7 +49,7 @@ def create_test_data(days=30):
     start_date = end_date - timedelta(days=days - 1)
 
     current_date = start_date
-    created_count = 0
+    rows = []
 
     while current_date <= end_date:
         for i, kw in enumerate(keywords):
@@ -73,23 +74,19 @@ def create_test_data(days=30):
             clicks = int(impressions * random.uniform(0.05, 0.15))  # 5-15% CTR
             position = round(random.uniform(3.0, 15.0), 1)
 
-            # Create or update snapshot
-            snapshot, created = ExposureSnapshot.objects.update_or_create(
-                date=current_date,
-                keyword=kw,
-                defaults={
-                    'impressions': impressions,
-                    'clicks': clicks,
-                    'position': position
-                }
-            )
-
-            if created:
-                created_count += 1
+            rows.append({
+                'date': current_date,
+                'keyword_id': kw.id,
+                'impressions': impressions,
+                'clicks': clicks,
+                'position': position
+            })
 
         current_date += timedelta(days=1)
 
-    print(f"✓ Created {created_count} exposure snapshots")
+    # Create or update snapshots in bulk
+    result = upsert_snapshots(rows)
+    print(f"✓ Created {result['inserted']} exposure snapshots (updated {result['updated']})")
     print()
     print("=" * 50)
     print("Test data created successfully!")
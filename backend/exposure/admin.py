@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Keyword, ExposureSnapshot, TrendAnalysisJob
+from .models import Keyword, ExposureSnapshot, SyncWatermark, TrendAnalysisJob
 @admin.register(Keyword)
 class KAdmin(admin.ModelAdmin):
     list_display = ("name","enabled")
@@ -11,3 +11,6 @@ class EAdmin(admin.ModelAdmin):
 @admin.register(TrendAnalysisJob)
 class JAdmin(admin.ModelAdmin):
     list_display = ("id","days","start_date","end_date","created_at")
+@admin.register(SyncWatermark)
+class WAdmin(admin.ModelAdmin):
+    list_display = ("keyword","last_complete_date","updated_at")
@@ -0,0 +1,245 @@
+"""
+Columnar archive of ExposureSnapshot, one file per calendar month.
+
+Months are written as Parquet (zstd, dictionary pages) or Arrow IPC files
+(zstd record batches) under EXPOSURE_ARCHIVE_DIR, named
+exposure_YYYY-MM.<parquet|arrow>, with a _manifest.json listing what has
+been archived. Columns:
+
+    date (date32), keyword (dictionary<int32, string>), keyword_id (int64),
+    impressions (int32), clicks (int32, nullable), position (float64, nullable)
+
+Every batch of a file shares one keyword dictionary (all keywords known at
+write time), which Arrow IPC files require and Parquet encodes once per
+column chunk.
+
+archive_months() appends months that are complete and no longer revised by
+GSC; already archived months are skipped unless forced. read_archive()
+memory-maps the files for offline analysis (zero-copy for uncompressed
+Arrow files), so heavy history scans stay off Postgres.
+
+pyarrow is imported lazily so the web process does not pay for it.
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from django.conf import settings
+from django.db import connection, transaction
+from .models import ExposureSnapshot, Keyword
+from .rollups import month_start, next_month
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+MANIFEST = "_manifest.json"
+
+
+def _pa():
+    try:
+        import pyarrow
+    except ImportError as e:  # pragma: no cover - depends on deployment
+        raise ImportError("pyarrow is required for the exposure archive (pip install pyarrow)") from e
+    return pyarrow
+
+
+def archive_dir() -> Path:
+    return Path(getattr(settings, "EXPOSURE_ARCHIVE_DIR", settings.BASE_DIR / "archive"))
+
+
+def month_path(month: date, fmt: str = "parquet", root: Optional[Path] = None) -> Path:
+    return (root or archive_dir()) / f"exposure_{month:%Y-%m}.{FORMATS[fmt]}"
+
+
+def load_manifest(root: Optional[Path] = None) -> Dict[str, Dict]:
+    """{'YYYY-MM': {'format', 'file', 'rows', 'bytes', 'written_at'}, ...}"""
+    p = (root or archive_dir()) / MANIFEST
+    if not p.exists():
+        return {}
+    with open(p, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest: Dict[str, Dict], root: Path) -> None:
+    fd, tmp = tempfile.mkstemp(dir=root, prefix=".manifest-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=2)
+    os.replace(tmp, root / MANIFEST)
+
+
+def schema(pa=None):
+    pa = pa or _pa()
+    return pa.schema([
+        ("date", pa.date32()),
+        ("keyword", pa.dictionary(pa.int32(), pa.string())),
+        ("keyword_id", pa.int64()),
+        ("impressions", pa.int32()),
+        ("clicks", pa.int32()),
+        ("position", pa.float64()),
+    ])
+
+
+def _record_batches(month: date, batch_rows: int) -> Iterator:
+    """Stream one month from a server-side cursor as Arrow record batches."""
+    pa = _pa()
+    sch = schema(pa)
+    ids, names = [], []
+    for kid, name in Keyword.objects.order_by("id").values_list("id", "name"):
+        ids.append(kid)
+        names.append(name)
+    index = {kid: i for i, kid in enumerate(ids)}
+    dictionary = pa.array(names, type=pa.string())
+
+    qs = (ExposureSnapshot.objects
+          .filter(date__gte=month, date__lt=next_month(month))
+          .order_by("date", "keyword_id")
+          .values_list("date", "keyword_id", "impressions", "clicks", "position"))
+
+    def _batch(rows):
+        cols = list(zip(*rows))
+        keyword = pa.DictionaryArray.from_arrays(pa.array([index[k] for k in cols[1]], pa.int32()), dictionary)
+        return pa.RecordBatch.from_arrays([
+            pa.array(cols[0], pa.date32()), keyword, pa.array(cols[1], pa.int64()),
+            pa.array(cols[2], pa.int32()), pa.array(cols[3], pa.int32()), pa.array(cols[4], pa.float64()),
+        ], schema=sch)
+
+    with transaction.atomic():
+        rows = []
+        for r in qs.iterator(chunk_size=batch_rows):
+            rows.append(r)
+            if len(rows) >= batch_rows:
+                yield _batch(rows)
+                rows = []
+        if rows:
+            yield _batch(rows)
+
+
+def write_month(month: date, fmt: str = "parquet", root: Optional[Path] = None,
+                compression: Optional[str] = "zstd", batch_rows: int = 50000) -> Dict:
+    """
+    Write one month to its archive file (atomically replaced) and record it in the manifest.
+
+    Returns: {'month': 'YYYY-MM', 'format': str, 'file': str, 'rows': int, 'bytes': int}
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    pa = _pa()
+    month = month_start(month)
+    root = root or archive_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    path = month_path(month, fmt, root)
+    fd, tmp = tempfile.mkstemp(dir=root, prefix=f".{path.name}-")
+    os.close(fd)
+
+    n = 0
+    try:
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            with pq.ParquetWriter(tmp, schema(pa), compression=compression or "none",
+                                  use_dictionary=["keyword"]) as writer:
+                for batch in _record_batches(month, batch_rows):
+                    writer.write_batch(batch)
+                    n += batch.num_rows
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema(pa), options=options) as writer:
+                for batch in _record_batches(month, batch_rows):
+                    writer.write_batch(batch)
+                    n += batch.num_rows
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    entry = {"format": fmt, "file": path.name, "rows": n, "bytes": path.stat().st_size,
+             "written_at": int(time.time())}
+    manifest = load_manifest(root)
+    old = manifest.get(f"{month:%Y-%m}")
+    if old and old.get("file") != path.name and (root / old["file"]).exists():
+        # 換格式時移除舊檔，避免 reader 讀到兩份
+        (root / old["file"]).unlink()
+    manifest[f"{month:%Y-%m}"] = entry
+    _save_manifest(manifest, root)
+    return {"month": f"{month:%Y-%m}", **entry}
+
+
+def last_archivable_month(today: Optional[date] = None) -> Optional[date]:
+    """Latest month whose every day is past GSC's revision window."""
+    today = today or date.today()
+    final = today - timedelta(days=getattr(settings, "GSC_SYNC_LAG_DAYS", 1)
+                              + getattr(settings, "GSC_SYNC_REFETCH_DAYS", 3))
+    m = month_start(final)
+    if next_month(m) - timedelta(days=1) > final:
+        m = month_start(m - timedelta(days=1))
+    return m
+
+
+def archive_months(start: Optional[date] = None, end: Optional[date] = None, fmt: str = "parquet",
+                   force: bool = False, root: Optional[Path] = None,
+                   compression: Optional[str] = "zstd") -> List[Dict]:
+    """
+    Archive every finalized month in [start, end] (default: first snapshot
+    month .. last archivable month) that is not archived yet (or all with force).
+    """
+    root = root or archive_dir()
+    if start is None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(date) FROM {connection.ops.quote_name(ExposureSnapshot._meta.db_table)}")
+            first = cursor.fetchone()[0]
+        if first is None:
+            return []
+        start = first
+    last = last_archivable_month()
+    end_month = min(month_start(end), last) if end else last
+    done = load_manifest(root)
+    out = []
+    m = month_start(start)
+    while m <= end_month:
+        key = f"{m:%Y-%m}"
+        if force or key not in done:
+            out.append(write_month(m, fmt, root, compression))
+        m = next_month(m)
+    return out
+
+
+def read_archive(start: Optional[date] = None, end: Optional[date] = None,
+                 keywords: Optional[List[str]] = None, columns: Optional[List[str]] = None,
+                 root: Optional[Path] = None):
+    """
+    Memory-map the archived months overlapping [start, end] and return one
+    pyarrow.Table (optionally filtered to `keywords` and projected to `columns`).
+    """
+    pa = _pa()
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    root = root or archive_dir()
+    tables = []
+    for key, entry in sorted(load_manifest(root).items()):
+        m = date.fromisoformat(f"{key}-01")
+        if (start and next_month(m) <= start) or (end and m > end):
+            continue
+        path = str(root / entry["file"])
+        if entry["format"] == "parquet":
+            t = pq.read_table(path, memory_map=True)
+        else:
+            t = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        tables.append(t)
+    if not tables:
+        return schema(pa).empty_table()
+
+    t = pa.concat_tables(tables, promote_options="permissive")
+    mask = None
+    if start:
+        mask = pc.greater_equal(t["date"], pa.scalar(start, pa.date32()))
+    if end:
+        m2 = pc.less_equal(t["date"], pa.scalar(end, pa.date32()))
+        mask = m2 if mask is None else pc.and_(mask, m2)
+    if keywords:
+        m3 = pc.is_in(pc.cast(t["keyword"], pa.string()), value_set=pa.array(keywords, pa.string()))
+        mask = m3 if mask is None else pc.and_(mask, m3)
+    if mask is not None:
+        t = t.filter(mask)
+    return t.select(columns) if columns else t
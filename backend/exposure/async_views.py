@@ -0,0 +1,152 @@
+"""
+Async (ASGI) versions of the hot exposure endpoints.
+
+Served instead of the DRF views in views.py when EXPOSURE_ASYNC_VIEWS is on,
+which loanserp.asgi turns on by default. Responses, caching and validators
+match the sync views: the payload builders are shared, and the bodies are
+rendered with the same DRF renderers.
+
+- The coverage check behind ?pull= uses the async ORM
+  (coverage.afind_missing_cells). Cache I/O and the ETag version go through
+  Django's async cache API (ctx.aversion / acached / aconditional).
+- Grid aggregation (many ORM rows into numpy) and the blocking GSC client
+  (pull=sync; googleapiclient/httplib2 has no async transport) each run in
+  one sync_to_async hop. Under ASGI every request gets its own thread for
+  such hops, so a slow pull only parks its own coroutine. The event loop
+  keeps serving other dashboards, instead of the pull holding one of the
+  few gunicorn sync workers.
+"""
+from functools import wraps
+from typing import Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from .context import PeriodError, RequestContext
+from .coverage import afind_missing_cells
+from .gsc_auto_pull import auto_pull_if_needed
+from .jobs import job_status, request_pull
+from .views import (_BUNDLE_RENDERERS, _bundle_body, _bundle_job, _bundle_options, _pull_failed, _pull_plan,
+                    _queued, _timeseries_job, _with_cache_header)
+
+_json = JSONRenderer()
+
+
+def _render(data, status: int = 200, renderer=_json) -> HttpResponse:
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f"{content_type}; charset={renderer.charset}"
+    return HttpResponse(renderer.render(data), status=status, content_type=content_type)
+
+
+def _with_context(view):
+    """async 版：解析期間一次（RequestContext 作為第二個參數傳入）；日期格式錯誤回 400"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            ctx = RequestContext.from_request(request)
+        except PeriodError as e:
+            return _render({"error": str(e)}, status=400)
+        return await view(request, ctx, *args, **kwargs)
+    return require_GET(wrapper)
+
+
+async def _maybe_pull(ctx: RequestContext) -> Tuple[Optional[dict], Optional[str]]:
+    """views._maybe_pull：覆蓋率檢查走 async ORM，資料齊全時不必進 thread"""
+    pull_mode, pull_start, pull_end = _pull_plan(ctx)
+    if pull_mode is None:
+        return None, None
+    keywords = getattr(settings, 'KEYWORD_TRACK_LIST', [])
+    try:
+        if pull_mode == "sync":
+            pull_status = await sync_to_async(auto_pull_if_needed)(pull_start, pull_end, keywords)
+        else:
+            missing = await afind_missing_cells(pull_start, pull_end, keywords)
+            if missing:
+                pull_status = await sync_to_async(request_pull)(pull_start, pull_end, keywords, missing)
+            else:
+                # 沒有缺漏時不排程，不碰 Redis / Celery
+                pull_status = request_pull(pull_start, pull_end, keywords, missing)
+            pull_status = _queued(pull_status)
+    except Exception as e:
+        pull_status = _pull_failed(e)
+    return pull_status, pull_mode
+
+
+async def _timeseries_payload(ctx: RequestContext):
+    endpoint, params, compute = _timeseries_job(ctx)
+    return await ctx.acached(endpoint, params, sync_to_async(compute))
+
+
+@_with_context
+async def top5_timeseries(request, ctx: RequestContext):
+    """views.top5_timeseries（async）"""
+    async def build():
+        payload, hit = await _timeseries_payload(ctx)
+        return _with_cache_header(_render(payload), hit)
+    return await ctx.aconditional("top5_timeseries", {"resolution": ctx.resolution}, build)
+
+
+@_with_context
+async def top5_timeseries_auto(request, ctx: RequestContext):
+    """views.top5_timeseries_auto（async）"""
+    pull_status, pull_key = await _maybe_pull(ctx)
+
+    async def build():
+        payload, _ = await _timeseries_payload(ctx)
+        response = dict(payload)
+        if pull_status:
+            response["pull_status"] = pull_status
+        return _render(response)
+
+    if pull_status and not pull_status.get("had_data"):
+        return await build()
+    return await ctx.aconditional("top5_timeseries_auto", {"resolution": ctx.resolution, "pull": pull_key}, build)
+
+
+@_with_context
+async def dashboard_bundle(request, ctx: RequestContext):
+    """views.dashboard_bundle（async）；Accept / ?format= 協商與 DRF 相同"""
+    try:
+        renderer, _ = DefaultContentNegotiation().select_renderer(
+            Request(request), [cls() for cls in _BUNDLE_RENDERERS])
+    except NotAcceptable as e:
+        return _render({"detail": str(e.detail)}, status=406)
+    try:
+        smooth, compact = _bundle_options(ctx)
+    except ValueError:
+        return _render({"error": "smooth must be an integer"}, status=400)
+    pull_status, pull_key = await _maybe_pull(ctx)
+
+    async def build():
+        endpoint, params, compute = _bundle_job(ctx, smooth)
+        bundle, hit = await ctx.acached(endpoint, params, sync_to_async(compute))
+        body = _bundle_body(bundle, compact)
+        if pull_status:
+            body["pull_status"] = pull_status
+        resp = _with_cache_header(_render(body, renderer=renderer), hit)
+        patch_vary_headers(resp, ["Accept"])
+        return resp
+
+    if pull_status and not pull_status.get("had_data"):
+        return await build()
+    params = {"resolution": ctx.resolution, "smooth": smooth, "compact": compact, "pull": pull_key,
+              "format": renderer.format}
+    return await ctx.aconditional("dashboard_bundle", params, build)
+
+
+@require_GET
+async def pull_status(request):
+    """views.pull_status（async）"""
+    job_id = request.GET.get("job_id")
+    if not job_id:
+        return _render({"error": "job_id is required"}, status=400)
+    status = await sync_to_async(job_status)(job_id)
+    if status is None:
+        return _render({"error": "unknown job_id"}, status=404)
+    return _render(status)
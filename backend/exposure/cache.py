@@ -0,0 +1,197 @@
+"""
+Response cache for the exposure endpoints.
+
+Entries are keyed by (endpoint, start, end, normalized params) and stored
+in the Django cache (Redis). Every ingestion bumps a generation stamp for
+each date it wrote and for that date's month (ingest.after_write); an entry
+remembers the newest stamp of its range when it was computed and is treated
+as a miss once any date in the range has moved on, so only ranges that saw
+new data are recomputed. A range reads month stamps for its whole months
+and day stamps only for the partial months at its edges, so one lookup is
+at most 62 keys plus one per month, however long the range.
+
+The same stamps are the data version behind the ETag / Last-Modified
+validators (context.RequestContext), so they are kept even when the
+response cache itself is disabled.
+
+Ranges that end before GSC's revision window (today - lag - refetch days)
+are final and get EXPOSURE_CACHE_TTL; ranges reaching into it get
+EXPOSURE_CACHE_TTL_RECENT.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_RESP = "exposure:resp"
+_GEN = "exposure:gen"
+_STATS = "exposure:cache:stats"
+
+ENDPOINTS = ("top5_timeseries", "top5_timeseries_csv", "top5_compare", "topn_timeseries", "dashboard_bundle")
+
+
+def _enabled() -> bool:
+    return getattr(settings, "EXPOSURE_CACHE_ENABLED", True)
+
+
+def _gen_key(d: date) -> str:
+    return f"{_GEN}:{d.isoformat()}"
+
+
+def _gen_month_key(d: date) -> str:
+    return f"{_GEN}:m:{d:%Y-%m}"
+
+
+def bump_dates(dates: Iterable[date]) -> None:
+    """
+    Mark `dates` as changed (called after every ingestion batch).
+    Each date's month is stamped too, so long ranges read one key per whole
+    month instead of one per day (range_generation).
+    Cache errors (Redis down) are logged, not raised: the rows are already
+    committed and the stamps are only an invalidation hint, so affected
+    cached responses just live until their TTL.
+    """
+    dates = set(dates)
+    if not dates:
+        return
+    stamp = time.time_ns() // 1000  # 微秒，之後也可當 Last-Modified 使用
+    stamps = {_gen_key(d): stamp for d in dates}
+    stamps.update({_gen_month_key(d): stamp for d in dates})
+    try:
+        # generation 不設過期：被逐出時會回到 0，跟舊 entry 的 stamp 不同一樣視為失效
+        cache.set_many(stamps, timeout=None)
+    except Exception:
+        logger.warning("exposure cache: could not bump generation for %d date(s) %s..%s",
+                       len(dates), min(dates), max(dates), exc_info=True)
+
+
+def _generation_keys(start: date, end: date) -> List[str]:
+    """Month keys for the whole calendar months in [start, end], day keys for the edges (<= 62 + months)."""
+    keys = []
+    d = start
+    while d <= end:
+        nxt = date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+        if d.day == 1 and nxt - timedelta(days=1) <= end:
+            keys.append(_gen_month_key(d))
+            d = nxt
+        else:
+            keys.append(_gen_key(d))
+            d += timedelta(days=1)
+    return keys
+
+
+def range_generation(start: date, end: date) -> int:
+    """Newest generation stamp among the dates of [start, end] (0 if never written)."""
+    if end < start:
+        return 0
+    return max(cache.get_many(_generation_keys(start, end)).values(), default=0)
+
+
+async def arange_generation(start: date, end: date) -> int:
+    # BaseCache.aget_many 逐個 key await aget（每個 key 一次 thread hop），這裡整批一次
+    return await sync_to_async(range_generation)(start, end)
+
+
+def is_final(end: date, today: Optional[date] = None) -> bool:
+    """True when GSC will no longer revise any date up to `end`."""
+    today = today or date.today()
+    lag = getattr(settings, "GSC_SYNC_LAG_DAYS", 1)
+    refetch = getattr(settings, "GSC_SYNC_REFETCH_DAYS", 3)
+    return end <= today - timedelta(days=lag + refetch)
+
+
+def ttl_for(end: date) -> int:
+    if is_final(end):
+        return int(getattr(settings, "EXPOSURE_CACHE_TTL", 24 * 3600))
+    return int(getattr(settings, "EXPOSURE_CACHE_TTL_RECENT", 300))
+
+
+def response_key(endpoint: str, start: date, end: date, params: Optional[Dict] = None) -> str:
+    norm = json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str)
+    h = hashlib.sha1(norm.encode("utf-8")).hexdigest()[:16]
+    return f"{_RESP}:{endpoint}:{start.isoformat()}:{end.isoformat()}:{h}"
+
+
+def _count(endpoint: str, outcome: str) -> None:
+    key = f"{_STATS}:{endpoint}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 第一次計數：key 還不存在
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def _lookup(endpoint: str, key: str, gen: int) -> Tuple[object, bool]:
+    entry = cache.get(key)
+    hit = entry is not None and entry[0] == gen
+    _count(endpoint, "hit" if hit else "miss")
+    return (entry[1] if hit else None), hit
+
+
+def cached(endpoint: str, start: date, end: date, params: Optional[Dict],
+           compute: Callable[[], object], gen: Optional[int] = None) -> Tuple[object, bool]:
+    """
+    Return (value, hit). On a miss `compute()` runs and its (picklable)
+    result is stored with the range's current generation (pass `gen` when
+    it has already been read for this request).
+    """
+    if not _enabled():
+        return compute(), False
+
+    key = response_key(endpoint, start, end, params)
+    if gen is None:
+        gen = range_generation(start, end)
+    value, hit = _lookup(endpoint, key, gen)
+    if hit:
+        return value, True
+
+    # 先讀 generation 再計算：計算期間若有新寫入，存下的舊 stamp 下次就會對不上
+    value = compute()
+    cache.set(key, (gen, value), ttl_for(end))
+    return value, False
+
+
+async def acached(endpoint: str, start: date, end: date, params: Optional[Dict],
+                  compute: Callable[[], Awaitable[object]], gen: Optional[int] = None) -> Tuple[object, bool]:
+    """cached() for async views: `compute` is awaited, cache I/O goes through the async cache API."""
+    if not _enabled():
+        return await compute(), False
+
+    key = response_key(endpoint, start, end, params)
+    if gen is None:
+        gen = await arange_generation(start, end)
+    value, hit = await sync_to_async(_lookup)(endpoint, key, gen)
+    if hit:
+        return value, True
+
+    value = await compute()
+    await cache.aset(key, (gen, value), ttl_for(end))
+    return value, False
+
+
+def stats(endpoints: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Returns: {endpoint: {'hits': int, 'misses': int, 'hit_ratio': float}, ...}
+    """
+    endpoints = list(endpoints or ENDPOINTS)
+    keys = [f"{_STATS}:{e}:{o}" for e in endpoints for o in ("hit", "miss")]
+    raw = cache.get_many(keys)
+    out = {}
+    for e in endpoints:
+        hits = int(raw.get(f"{_STATS}:{e}:hit", 0))
+        misses = int(raw.get(f"{_STATS}:{e}:miss", 0))
+        total = hits + misses
+        out[e] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else 0.0}
+    return out
+
+
+def reset_stats() -> None:
+    cache.delete_many([f"{_STATS}:{e}:{o}" for e in ENDPOINTS for o in ("hit", "miss")])
@@ -0,0 +1,165 @@
+"""
+Shared request context for the exposure endpoints.
+
+RequestContext.from_request() parses the period once: start/end, or the
+last `days` days, capped at EXPOSURE_MAX_RANGE_DAYS. Malformed dates raise
+PeriodError, which views turn into a 400.
+
+ctx.version is the newest ingestion stamp among the range's dates
+(cache.range_generation, one MGET). conditional() derives a weak ETag from
+(endpoint, period, params, version) and a Last-Modified from the stamp. It
+answers If-None-Match / If-Modified-Since with 304 before the view runs
+any aggregation. When no stamp is known (nothing ingested since the cache
+was cleared) responses carry no validators and are always recomputed.
+
+aversion() / acached() / aconditional() are the same for the async views
+(async_views.py), going through Django's async cache API.
+"""
+import hashlib
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from . import cache as response_cache
+from .series import pick_resolution
+
+# 回應格式改變時調整，讓瀏覽器手上的舊 ETag 失效
+ETAG_SALT = "1"
+
+
+class PeriodError(ValueError):
+    """Malformed start / end query parameters."""
+
+
+class Period(NamedTuple):
+    start: date
+    end: date
+    days: int
+
+
+def parse_period(q, default_days: int = 7, max_days: Optional[int] = None) -> Period:
+    """
+    start=YYYY-MM-DD&end=YYYY-MM-DD, else the last `days` days ending today.
+    Ranges longer than max_days (default EXPOSURE_MAX_RANGE_DAYS, 0 = no cap) are cut at the end.
+    """
+    if max_days is None:
+        max_days = settings.EXPOSURE_MAX_RANGE_DAYS
+    try:
+        days = int(q.get("days", default_days))
+    except (TypeError, ValueError):
+        days = default_days
+    days = max(1, min(days, max_days) if max_days else days)
+
+    if q.get("start") and q.get("end"):
+        try:
+            start = date.fromisoformat(q["start"])
+            end = date.fromisoformat(q["end"])
+        except ValueError:
+            raise PeriodError("start/end must be YYYY-MM-DD")
+        if end < start:
+            raise PeriodError("end must not be before start")
+        total = (end - start).days + 1
+        if max_days and total > max_days:
+            end = start + timedelta(days=max_days - 1)
+            total = max_days
+        return Period(start, end, total)
+    end = date.today()
+    return Period(end - timedelta(days=days - 1), end, days)
+
+
+class RequestContext:
+    def __init__(self, request, period: Period):
+        self.request = request
+        self.query = getattr(request, "query_params", request.GET)
+        self.start, self.end, self.days = period
+        # days=N 的區間每天都會移動：只以 ETag 比對，不採用 If-Modified-Since
+        self.explicit = bool(self.query.get("start") and self.query.get("end"))
+        self._version: Optional[int] = None
+
+    @classmethod
+    def from_request(cls, request, default_days: int = 7, max_days: Optional[int] = None) -> "RequestContext":
+        q = getattr(request, "query_params", request.GET)
+        return cls(request, parse_period(q, default_days, max_days))
+
+    @property
+    def resolution(self) -> str:
+        """?resolution=day|week|month|auto（只能比 auto 更粗）"""
+        return pick_resolution(self.days, self.query.get("resolution", "auto").lower())
+
+    @property
+    def version(self) -> int:
+        """Newest ingestion stamp (microseconds) of the range; 0 when unknown."""
+        if self._version is None:
+            self._version = response_cache.range_generation(self.start, self.end)
+        return self._version
+
+    def period(self) -> Dict:
+        return {"start": self.start.isoformat(), "end": self.end.isoformat(), "days": self.days}
+
+    def cached(self, endpoint: str, params: Optional[Dict], compute: Callable[[], object]):
+        """response_cache.cached with the version already read for the validators."""
+        return response_cache.cached(endpoint, self.start, self.end, params, compute, gen=self.version)
+
+    def etag(self, endpoint: str, params: Optional[Dict] = None) -> Optional[str]:
+        if not self.version:
+            return None
+        key = response_cache.response_key(endpoint, self.start, self.end, params)
+        h = hashlib.sha1(f"{ETAG_SALT}:{key}:{self.version}".encode("utf-8")).hexdigest()[:20]
+        return f'W/"{h}"'
+
+    def last_modified(self) -> Optional[int]:
+        return self.version // 1_000_000 if self.version else None
+
+    def _not_modified(self, etag: Optional[str]):
+        if not etag:
+            return None
+        not_modified = get_conditional_response(self.request, etag=etag,
+                                                last_modified=self.last_modified() if self.explicit else None)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+        return not_modified
+
+    def _stamp(self, resp, etag: Optional[str]):
+        if etag and 200 <= resp.status_code < 300:
+            resp["ETag"] = etag
+            resp["Last-Modified"] = http_date(self.last_modified())
+            # 允許瀏覽器存放，但每次使用前都要帶 If-None-Match 回來驗證
+            patch_cache_control(resp, private=True, no_cache=True)
+        return resp
+
+    def conditional(self, endpoint: str, params: Optional[Dict], build: Callable[[], object]):
+        """
+        304 Not Modified when the client's ETag / Last-Modified is current,
+        otherwise build() the response and stamp the validators on it.
+        """
+        if not getattr(settings, "EXPOSURE_CONDITIONAL_GET", True):
+            return build()
+        etag = self.etag(endpoint, params)
+        not_modified = self._not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        return self._stamp(build(), etag)
+
+    # --- async views (ASGI) ---
+
+    async def aversion(self) -> int:
+        """Read the version through the async cache API; etag() / last_modified() then need no I/O."""
+        if self._version is None:
+            self._version = await response_cache.arange_generation(self.start, self.end)
+        return self._version
+
+    async def acached(self, endpoint: str, params: Optional[Dict], compute: Callable[[], Awaitable[object]]):
+        return await response_cache.acached(endpoint, self.start, self.end, params, compute,
+                                            gen=await self.aversion())
+
+    async def aconditional(self, endpoint: str, params: Optional[Dict], build: Callable[[], Awaitable[object]]):
+        """conditional() with an async build()."""
+        if not getattr(settings, "EXPOSURE_CONDITIONAL_GET", True):
+            return await build()
+        await self.aversion()
+        etag = self.etag(endpoint, params)
+        not_modified = self._not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        return self._stamp(await build(), etag)
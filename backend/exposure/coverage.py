@@ -0,0 +1,89 @@
+"""
+Coverage engine: find which (keyword, date) cells are missing for a range.
+
+One grouped query over the (date, keyword_id) covering index answers the
+whole range. Keywords that are complete come
+back as a bare count; only incomplete keywords carry the list of dates they
+do have, so the payload stays small when coverage is good.
+
+A cell is present when it has a snapshot row. GSC returns no row for a day
+without impressions; pull_engine.run_pull writes those days as
+0-impression rows, so a fetched day is never reported missing again.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Case, Count, When, Value
+from .models import ExposureSnapshot, Keyword
+
+
+def _drange(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _coverage_rows(start: date, end: date, names: Dict[int, str], n_days: int):
+    # 主查詢只碰 (date, keyword_id) covering index，不 join Keyword
+    return (ExposureSnapshot.objects
+            .filter(date__gte=start, date__lte=end, keyword_id__in=list(names))
+            .values("keyword_id")
+            .annotate(
+                n=Count("date"),
+                present=Case(
+                    When(n__lt=n_days, then=ArrayAgg("date")),
+                    default=Value(None),
+                ),
+            ))
+
+
+def _collect(keywords: List[str], all_dates: List[date], names: Dict[int, str], rows) -> Dict[str, List[date]]:
+    n_days = len(all_dates)
+    seen = {}
+    for r in rows:
+        seen[names[r["keyword_id"]]] = r
+
+    missing: Dict[str, List[date]] = {}
+    for kw in dict.fromkeys(keywords):
+        r = seen.get(kw)
+        if r is None:
+            missing[kw] = list(all_dates)
+        elif r["n"] < n_days:
+            present = set(r["present"] or [])
+            missing[kw] = [d for d in all_dates if d not in present]
+    return missing
+
+
+def find_missing_cells(start: date, end: date, keywords: List[str]) -> Dict[str, List[date]]:
+    """
+    Return {keyword: [missing dates...]} for every keyword with at least one
+    missing day in [start, end]. Complete keywords are omitted.
+    """
+    if not keywords or end < start:
+        return {}
+    all_dates = _drange(start, end)
+    # 先把名稱換成 id
+    names = dict(Keyword.objects.filter(name__in=keywords).values_list("id", "name"))
+    rows = list(_coverage_rows(start, end, names, len(all_dates))) if names else []
+    return _collect(keywords, all_dates, names, rows)
+
+
+async def afind_missing_cells(start: date, end: date, keywords: List[str]) -> Dict[str, List[date]]:
+    """find_missing_cells with the async ORM (ASGI views)."""
+    if not keywords or end < start:
+        return {}
+    all_dates = _drange(start, end)
+    names = {kid: name async for kid, name in Keyword.objects.filter(name__in=keywords).values_list("id", "name")}
+    rows = [r async for r in _coverage_rows(start, end, names, len(all_dates))] if names else []
+    return _collect(keywords, all_dates, names, rows)
+
+
+def missing_spans(missing: Dict[str, List[date]]) -> Dict[str, Tuple[date, date]]:
+    """把每個關鍵字缺的日期收斂成一個 (first, last) 區間，供 GSC 查詢使用"""
+    return {kw: (min(ds), max(ds)) for kw, ds in missing.items() if ds}
+
+
+def missing_dates(missing: Dict[str, List[date]]) -> List[date]:
+    """Dates on which at least one keyword is missing, sorted."""
+    out = set()
+    for ds in missing.values():
+        out.update(ds)
+    return sorted(out)
@@ -0,0 +1,126 @@
+"""
+Streaming export of ExposureSnapshot rows (every keyword, any range).
+
+Rows come from a server-side cursor (QuerySet.iterator) in (date, keyword)
+order, which the (date, keyword_id) covering index returns without a sort,
+and are encoded to CSV or NDJSON in small batches, optionally through an
+incremental gzip compressor. Memory stays bounded by one batch and the
+first bytes leave before the query has finished.
+
+The iterator runs inside a transaction so Postgres streams from a plain
+cursor. In autocommit mode Django declares WITH HOLD cursors, which
+materialize the whole result at commit.
+
+Under ASGI, Django reads a sync StreamingHttpResponse iterator with
+sync_to_async(list), i.e. the whole export in memory before the first byte.
+aiter_chunks wraps the stream as an async iterator instead: one thread hop
+per chunk, always on the request's thread, so the cursor and its transaction
+stay on one connection.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from .models import ExposureSnapshot, Keyword
+
+FORMATS = ("csv", "ndjson")
+COLUMNS = ["date", "keyword", "impressions", "clicks", "position"]
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+
+def _chunk_size() -> int:
+    return int(getattr(settings, "EXPOSURE_EXPORT_CHUNK_SIZE", 5000))
+
+
+def iter_rows(start: date, end: date, keywords: Optional[List[str]] = None,
+              chunk_size: Optional[int] = None) -> Iterator[tuple]:
+    """(date, keyword, impressions, clicks, position) ordered by date, keyword_id."""
+    kw_qs = Keyword.objects.all()
+    if keywords:
+        kw_qs = kw_qs.filter(name__in=keywords)
+    names: Dict[int, str] = dict(kw_qs.values_list("id", "name"))
+    if not names:
+        return
+    qs = ExposureSnapshot.objects.filter(date__gte=start, date__lte=end)
+    if keywords:
+        qs = qs.filter(keyword_id__in=list(names))
+    qs = qs.order_by("date", "keyword_id").values_list("date", "keyword_id", "impressions", "clicks", "position")
+    with transaction.atomic():
+        for d, kid, impr, clicks, pos in qs.iterator(chunk_size=chunk_size or _chunk_size()):
+            yield d, names.get(kid, ""), impr, clicks, pos
+
+
+def _batched(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode(rows: Iterable[tuple], fmt: str, batch_size: int = 1000) -> Iterator[bytes]:
+    """Encode rows as CSV (with header) or NDJSON, one bytes chunk per batch."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(COLUMNS)
+        yield buf.getvalue().encode("utf-8")
+        for batch in _batched(rows, batch_size):
+            buf.seek(0)
+            buf.truncate()
+            w.writerows((d.isoformat(), kw, impr, "" if clicks is None else clicks,
+                         "" if pos is None else pos) for d, kw, impr, clicks, pos in batch)
+            yield buf.getvalue().encode("utf-8")
+        return
+    for batch in _batched(rows, batch_size):
+        yield "".join(
+            json.dumps({"date": d.isoformat(), "keyword": kw, "impressions": impr,
+                        "clicks": clicks, "position": pos}, ensure_ascii=False) + "\n"
+            for d, kw, impr, clicks, pos in batch
+        ).encode("utf-8")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Incremental gzip (Content-Encoding: gzip); every input chunk is flushed so data keeps flowing."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def export_stream(start: date, end: date, fmt: str = "csv", keywords: Optional[List[str]] = None,
+                  gzip: bool = False) -> Iterator[bytes]:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    chunks = encode(iter_rows(start, end, keywords), fmt)
+    return gzip_stream(chunks) if gzip else chunks
+
+
+async def aiter_chunks(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """export_stream as an async iterator for ASGI responses (see module docstring)."""
+    done = object()
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await step(chunks, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        # 客戶端中斷時也要在同一個 thread 關掉 generator（結束 transaction / cursor）
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
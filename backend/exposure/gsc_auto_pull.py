@@ -2,49 +2,91 @@
 Auto-pull GSC data when requested by frontend
 """
 from datetime import date, timedelta
-from typing import List, Tuple
+from typing import Dict, List, NamedTuple, Tuple
 from django.conf import settings
-from .models import Keyword, ExposureSnapshot
-from .gsc_client import fetch_daily_impressions
+from .gsc_client import fetch_daily_impressions, fetch_impressions_batch, keyword_regex_chunks
+from .ingest import ensure_keywords
+from .pull_engine import run_pull
+from .coverage import find_missing_cells, missing_dates, missing_spans
 
 
 def check_data_coverage(start: date, end: date, keywords: List[str]) -> Tuple[bool, List[date]]:
     """
     Check if we have complete data for all keywords in the date range.
     Returns: (has_complete_data, list_of_missing_dates)
+
+    See coverage.find_missing_cells for the exact missing (keyword, date) cells.
+    """
+    missing = find_missing_cells(start, end, keywords)
+    return not missing, missing_dates(missing)
+
+
+def gsc_history_start(today: date = None) -> date:
+    """Earliest date Search Analytics still serves (GSC_MAX_HISTORY_DAYS, about 16 months)."""
+    today = today or date.today()
+    return today - timedelta(days=getattr(settings, 'GSC_MAX_HISTORY_DAYS', 486) - 1)
+
+
+class FetchUnit(NamedTuple):
+    """One GSC request group: these keywords over [start, end]."""
+    keywords: List[str]
+    start: date
+    end: date
+
+
+def plan_fetch_units(start: date, end: date, keywords: List[str],
+                     spans: Dict[str, Tuple[date, date]] = None, batched: bool = None) -> List[FetchUnit]:
+    """
+    Batched mode groups keywords sharing the same span into one unit
+    (one includingRegex query, paginated); otherwise one unit per keyword.
     """
-    # Generate all dates in range
-    all_dates = []
-    current = start
-    while current <= end:
-        all_dates.append(current)
-        current += timedelta(days=1)
-
-    # Check which dates have data for all keywords
-    missing_dates = []
-    for check_date in all_dates:
-        count = ExposureSnapshot.objects.filter(
-            date=check_date,
-            keyword__name__in=keywords
-        ).count()
-
-        # If we don't have data for all keywords on this date, it's missing
-        if count < len(keywords):
-            missing_dates.append(check_date)
-
-    has_complete = len(missing_dates) == 0
-    return has_complete, missing_dates
-
-
-def pull_gsc_data_for_range(start: date, end: date, keywords: List[str] = None) -> dict:
+    if batched is None:
+        batched = getattr(settings, 'GSC_BATCHED_FETCH', True)
+    spans = spans or {}
+    if not batched:
+        return [FetchUnit([kw], *spans.get(kw, (start, end))) for kw in keywords]
+    groups: Dict[Tuple[date, date], List[str]] = {}
+    for kw in keywords:
+        groups.setdefault(spans.get(kw, (start, end)), []).append(kw)
+    # one unit per regex chunk so chunks can be fetched in parallel
+    return [FetchUnit(chunk, s, e)
+            for (s, e), kws in groups.items()
+            for chunk in keyword_regex_chunks(kws)]
+
+
+def fetch_unit(property_uri: str, unit: FetchUnit, service=None, policy=None) -> Dict[str, List[dict]]:
+    """Fetch one unit; returns {keyword: rows}."""
+    s, e = unit.start.isoformat(), unit.end.isoformat()
+    if len(unit.keywords) == 1:
+        kw = unit.keywords[0]
+        return {kw: fetch_daily_impressions(property_uri, kw, s, e, service=service, policy=policy)}
+    return fetch_impressions_batch(property_uri, unit.keywords, s, e, service=service, policy=policy)
+
+
+def _describe(unit: FetchUnit) -> str:
+    names = ", ".join(repr(k) for k in unit.keywords[:3])
+    more = len(unit.keywords) - 3
+    return f"{names} (+{more} more)" if more > 0 else names
+
+
+def pull_gsc_data_for_range(start: date, end: date, keywords: List[str] = None,
+                            spans: Dict[str, Tuple[date, date]] = None,
+                            batch_size: int = None, workers: int = None) -> dict:
     """
     Pull GSC data for specified date range and keywords.
     If keywords not provided, uses settings.KEYWORD_TRACK_LIST
+    If spans is given ({keyword: (start, end)}), each keyword is only fetched
+    for its own sub-range instead of the whole [start, end].
+    Fetches run on pull_engine's thread pool (workers, default
+    settings.GSC_PULL_WORKERS); rows are written with ingest.upsert_snapshots
+    in batches of batch_size (default: settings.GSC_INGEST_BATCH_SIZE).
 
     Returns: {
         'success': bool,
         'keywords_pulled': int,
         'snapshots_created': int,
+        'snapshots_updated': int,
+        'api_calls': int,
         'date_range': str,
         'errors': []
     }
@@ -56,51 +98,27 @@ def pull_gsc_data_for_range(start: date, end: date, keywords: List[str] = None)
     start_str = start.isoformat()
     end_str = end.isoformat()
 
-    result = {
-        'success': True,
-        'keywords_pulled': 0,
-        'snapshots_created': 0,
+    kw_ids = ensure_keywords(keywords)
+    units = plan_fetch_units(start, end, keywords, spans)
+    pulled = run_pull(property_uri, units, kw_ids, start, end, workers=workers, batch_size=batch_size)
+
+    errors = []
+    for unit, exc in pulled['errors']:
+        if unit is None:
+            errors.append(f"Error saving snapshots: {str(exc)}")
+        else:
+            errors.append(f"Error pulling {_describe(unit)}: {str(exc)}")
+
+    return {
+        'success': not errors,
+        'keywords_pulled': pulled['keywords_pulled'],
+        'snapshots_created': pulled['inserted'],
+        'snapshots_updated': pulled['updated'],
+        'api_calls': pulled['api_calls'],
         'date_range': f'{start_str} to {end_str}',
-        'errors': []
+        'errors': errors
     }
 
-    for kw_name in keywords:
-        try:
-            # Get or create keyword
-            kw, _ = Keyword.objects.get_or_create(
-                name=kw_name,
-                defaults={'enabled': True}
-            )
-
-            # Fetch from GSC
-            rows = fetch_daily_impressions(property_uri, kw_name, start_str, end_str)
-
-            # Save to database
-            for row in rows:
-                row_date = date.fromisoformat(row['date'])
-
-                # Only create if within requested range
-                if start <= row_date <= end:
-                    snapshot, created = ExposureSnapshot.objects.update_or_create(
-                        date=row_date,
-                        keyword=kw,
-                        defaults={
-                            'impressions': row['impressions'],
-                            'clicks': row.get('clicks', 0),
-                            'position': row.get('position', 0.0)
-                        }
-                    )
-                    if created:
-                        result['snapshots_created'] += 1
-
-            result['keywords_pulled'] += 1
-
-        except Exception as e:
-            result['errors'].append(f"Error pulling '{kw_name}': {str(e)}")
-            result['success'] = False
-
-    return result
-
 
 def auto_pull_if_needed(start: date, end: date, keywords: List[str] = None) -> dict:
     """
@@ -116,22 +134,23 @@ def auto_pull_if_needed(start: date, end: date, keywords: List[str] = None) -> d
         keywords = settings.KEYWORD_TRACK_LIST
 
     # Ensure keywords exist in DB
-    for kw_name in keywords:
-        Keyword.objects.get_or_create(name=kw_name, defaults={'enabled': True})
+    ensure_keywords(keywords)
 
-    # Check coverage
-    has_data, missing_dates = check_data_coverage(start, end, keywords)
+    # Check coverage (one grouped query for the whole range)
+    missing = find_missing_cells(start, end, keywords)
+    has_data = not missing
 
     result = {
         'had_data': has_data,
         'pulled': False,
         'pull_result': None,
-        'missing_dates_count': len(missing_dates)
+        'missing_dates_count': len(missing_dates(missing)),
+        'missing_cells_count': sum(len(ds) for ds in missing.values()),
     }
 
-    # If data is missing, pull from GSC
+    # If data is missing, pull only the keywords/sub-ranges that are absent
     if not has_data:
-        pull_result = pull_gsc_data_for_range(start, end, keywords)
+        pull_result = pull_gsc_data_for_range(start, end, list(missing), spans=missing_spans(missing))
         result['pulled'] = True
         result['pull_result'] = pull_result
 
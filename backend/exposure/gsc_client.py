@@ -1,13 +1,21 @@
-import os, datetime
-from typing import Dict, List
+import os, re, datetime, threading
+from typing import Dict, Iterator, List, Tuple
+import httplib2
 from django.conf import settings
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 
 SCOPES = settings.GSC_SCOPES
 
+def _save_credentials(creds):
+    token_path = settings.GSC_TOKEN_FILE
+    os.makedirs(os.path.dirname(token_path), exist_ok=True)
+    with open(token_path, "w") as f:
+        f.write(creds.to_json())
+
 def _load_credentials():
     token_path = settings.GSC_TOKEN_FILE
     client_path = settings.GSC_CLIENT_SECRETS_FILE
@@ -21,9 +29,7 @@ def _load_credentials():
             flow = InstalledAppFlow.from_client_secrets_file(client_path, SCOPES)
             # WSL 可用本機瀏覽器授權
             creds = flow.run_local_server(port=0, prompt='consent')
-        os.makedirs(os.path.dirname(token_path), exist_ok=True)
-        with open(token_path, "w") as f:
-            f.write(creds.to_json())
+        _save_credentials(creds)
     return creds
 
 def _build_service(creds):
@@ -33,12 +39,100 @@ def _build_service(creds):
     except Exception:
         return build('webmasters', 'v3', credentials=creds, cache_discovery=False)
 
-def fetch_daily_impressions(property_uri: str, keyword: str, start_date: str, end_date: str) -> List[Dict]:
+def _base_http():
+    return httplib2.Http(timeout=getattr(settings, "GSC_HTTP_TIMEOUT", 60))
+
+class _ServiceHolder:
+    """
+    Process-level holder for GSC credentials and the discovery-built service.
+
+    - credentials are loaded once and refreshed only when within
+      GSC_TOKEN_REFRESH_MARGIN_SEC of expiry (refreshed token is written back)
+    - the service object is built once per process
+    - httplib2 is not thread-safe, so each thread gets its own AuthorizedHttp
+    - after fork (gunicorn / celery prefork) everything is rebuilt lazily
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # fork 時若有其他 thread 持有 lock，子行程會繼承鎖住的 lock：一律重建
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._creds = None
+        self._service = None
+        self._local = threading.local()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self.reset()
+
+    def _needs_refresh(self) -> bool:
+        creds = self._creds
+        if not creds.token or not creds.expiry:
+            return not creds.valid
+        margin = datetime.timedelta(seconds=getattr(settings, "GSC_TOKEN_REFRESH_MARGIN_SEC", 300))
+        # google-auth 的 expiry 為 naive UTC
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now <= margin
+
+    def credentials(self):
+        with self._lock:
+            self._check_fork()
+            if self._creds is None:
+                self._creds = _load_credentials()
+            elif self._creds.refresh_token and self._needs_refresh():
+                self._creds.refresh(Request())
+                _save_credentials(self._creds)
+            return self._creds
+
+    def service(self):
+        creds = self.credentials()
+        with self._lock:
+            if self._service is None:
+                self._service = _build_service(creds)
+            return self._service
+
+    def http(self):
+        """Per-thread authorized http to pass to request.execute(http=...)."""
+        creds = self.credentials()
+        h = getattr(self._local, "http", None)
+        if h is None:
+            h = AuthorizedHttp(creds, http=_base_http())
+            self._local.http = h
+        return h
+
+_holder = _ServiceHolder()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_holder.reset)
+
+def get_service():
+    return _holder.service()
+
+def _execute(svc, property_uri: str, body: Dict, policy=None) -> Dict:
+    """policy: 可選，提供 .call(fn) 的物件（例如 pull_engine.CallPolicy：限流 + 退避重試）"""
+    def run():
+        # 不同版本 method 名稱一致為 searchanalytics().query()
+        req = svc.searchanalytics().query(siteUrl=property_uri, body=body)
+        if svc is _holder._service:
+            return req.execute(http=_holder.http())
+        return req.execute()
+    return policy.call(run) if policy is not None else run()
+
+def _to_row(r: Dict, date_key: str) -> Dict:
+    return {
+        "date": date_key,
+        "impressions": int(r.get("impressions", 0)),
+        "clicks": int(r.get("clicks", 0)),
+        "position": float(r.get("position", 0.0)),
+    }
+
+def fetch_daily_impressions(property_uri: str, keyword: str, start_date: str, end_date: str,
+                            service=None, policy=None) -> List[Dict]:
     """
     回傳 rows: [{'date':'YYYY-MM-DD','impressions':int,'clicks':int,'position':float},...]
     """
-    creds = _load_credentials()
-    svc = _build_service(creds)
+    svc = service or _holder.service()
     body = {
         "startDate": start_date,
         "endDate": end_date,
@@ -49,15 +143,76 @@ def fetch_daily_impressions(property_uri: str, keyword: str, start_date: str, en
         }],
         "rowLimit": 1000
     }
-    # 不同版本 method 名稱一致為 searchanalytics().query()
-    resp = svc.searchanalytics().query(siteUrl=property_uri, body=body).execute()
-    out = []
-    for r in resp.get("rows", []):
-        key_date = r.get("keys", [""])[0]
-        out.append({
-            "date": key_date,
-            "impressions": int(r.get("impressions", 0)),
-            "clicks": int(r.get("clicks", 0)),
-            "position": float(r.get("position", 0.0)),
-        })
+    resp = _execute(svc, property_uri, body, policy)
+    return [_to_row(r, r.get("keys", [""])[0]) for r in resp.get("rows", [])]
+
+# Search Analytics 單頁上限 25000 列；includingRegex 為 RE2，長度上限約 4096 字元
+GSC_MAX_ROW_LIMIT = 25000
+GSC_MAX_REGEX_LEN = 4000
+
+def _re2_escape(kw: str) -> str:
+    return re.sub(r"([\\.^$|?*+()\[\]{}])", r"\\\1", kw)
+
+def keyword_regex_chunks(keywords: List[str], max_len: int = GSC_MAX_REGEX_LEN) -> List[List[str]]:
+    """把關鍵字切成多組，每組組成的 ^(a|b|...)$ 不超過 max_len"""
+    chunks, cur, cur_len = [], [], 4
+    for kw in dict.fromkeys(keywords):
+        piece = len(_re2_escape(kw)) + 1
+        if cur and cur_len + piece > max_len:
+            chunks.append(cur)
+            cur, cur_len = [], 4
+        cur.append(kw)
+        cur_len += piece
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def _batch_filter(keywords: List[str]) -> Dict:
+    if len(keywords) == 1:
+        f = {"dimension": "QUERY", "operator": "EQUALS", "expression": keywords[0]}
+    else:
+        expr = "^(" + "|".join(_re2_escape(k) for k in keywords) + ")$"
+        f = {"dimension": "QUERY", "operator": "includingRegex", "expression": expr}
+    return {"groupType": "AND", "filters": [f]}
+
+def iter_batched_rows(property_uri: str, keywords: List[str], start_date: str, end_date: str,
+                      service=None, page_size: int = GSC_MAX_ROW_LIMIT,
+                      policy=None) -> Iterator[Tuple[str, Dict]]:
+    """
+    多關鍵字一次查詢：dimensions=["DATE","QUERY"]，以 includingRegex 涵蓋一組關鍵字，
+    用 startRow 逐頁讀取，邊讀邊 yield (keyword, row)。
+    row 格式同 fetch_daily_impressions。
+    """
+    svc = service or _holder.service()
+    page_size = max(1, min(page_size, GSC_MAX_ROW_LIMIT))
+    for chunk in keyword_regex_chunks(keywords):
+        lookup = {k: k for k in chunk}
+        lookup.update({k.lower(): k for k in chunk if k.lower() not in lookup})
+        start_row = 0
+        while True:
+            body = {
+                "startDate": start_date,
+                "endDate": end_date,
+                "dimensions": ["DATE", "QUERY"],
+                "dimensionFilterGroups": [_batch_filter(chunk)],
+                "rowLimit": page_size,
+                "startRow": start_row,
+            }
+            rows = _execute(svc, property_uri, body, policy).get("rows", [])
+            for r in rows:
+                keys = r.get("keys", ["", ""])
+                kw = lookup.get(keys[1]) or lookup.get(keys[1].lower())
+                if kw is not None:
+                    yield kw, _to_row(r, keys[0])
+            if len(rows) < page_size:
+                break
+            start_row += len(rows)
+
+def fetch_impressions_batch(property_uri: str, keywords: List[str], start_date: str, end_date: str,
+                            service=None, page_size: int = GSC_MAX_ROW_LIMIT,
+                            policy=None) -> Dict[str, List[Dict]]:
+    """回傳 {keyword: rows}；沒有資料的關鍵字對應空 list"""
+    out: Dict[str, List[Dict]] = {k: [] for k in keywords}
+    for kw, row in iter_batched_rows(property_uri, keywords, start_date, end_date, service, page_size, policy):
+        out[kw].append(row)
     return out
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the Search Console service object.
+
+Serves canned rows through the same searchanalytics().query(...).execute()
+call chain as googleapiclient, honouring dimensions, QUERY filters
+(equals / contains / includingRegex), rowLimit and startRow, so batched
+fetching and pagination can be exercised without network or quota.
+"""
+import re
+from typing import Dict, List
+
+
+class _Request:
+    def __init__(self, fake, body: Dict):
+        self._fake = fake
+        self._body = body
+
+    def execute(self, http=None, num_retries=0):
+        return self._fake._run(self._body)
+
+
+class _SearchAnalytics:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def query(self, siteUrl: str, body: Dict):
+        return _Request(self._fake, body)
+
+
+class FakeSearchConsoleService:
+    """
+    rows: [{'date': 'YYYY-MM-DD', 'query': str, 'impressions': int, 'clicks': int, 'position': float}, ...]
+
+    `calls` records every request body, e.g. to count API calls per pull.
+    """
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = sorted(rows, key=lambda r: (r["date"], r["query"]))
+        self.calls: List[Dict] = []
+
+    def searchanalytics(self):
+        return _SearchAnalytics(self)
+
+    def _match(self, row: Dict, body: Dict) -> bool:
+        if not (body["startDate"] <= row["date"] <= body["endDate"]):
+            return False
+        for group in body.get("dimensionFilterGroups", []):
+            for f in group.get("filters", []):
+                if f.get("dimension", "").upper() != "QUERY":
+                    continue
+                op, expr, q = f.get("operator", "equals").lower(), f["expression"], row["query"]
+                if op == "equals" and q != expr:
+                    return False
+                if op == "contains" and expr not in q:
+                    return False
+                if op == "includingregex" and not re.search(expr, q):
+                    return False
+                if op == "excludingregex" and re.search(expr, q):
+                    return False
+        return True
+
+    def _run(self, body: Dict) -> Dict:
+        self.calls.append(body)
+        dims = [d.upper() for d in body.get("dimensions", [])]
+        matched = [r for r in self.rows if self._match(r, body)]
+        if dims == ["DATE"]:
+            # 只以日期分組時，把同一天的多個 query 合併
+            merged: Dict[str, Dict] = {}
+            for r in matched:
+                m = merged.setdefault(r["date"], {"date": r["date"], "impressions": 0, "clicks": 0, "position": 0.0})
+                m["impressions"] += r["impressions"]
+                m["clicks"] += r.get("clicks", 0)
+                m["position"] = r.get("position", 0.0)
+            matched = list(merged.values())
+        start = int(body.get("startRow", 0))
+        limit = int(body.get("rowLimit", 1000))
+        page = matched[start:start + limit]
+        out = []
+        for r in page:
+            keys = [r["date"] if d == "DATE" else r.get("query", "") for d in dims]
+            out.append({"keys": keys, "impressions": r["impressions"], "clicks": r.get("clicks", 0),
+                        "ctr": 0.0, "position": r.get("position", 0.0)})
+        return {"rows": out} if out else {}
@@ -0,0 +1,138 @@
+"""
+Bulk ingestion of ExposureSnapshot rows.
+
+Upserts whole batches with a single INSERT ... ON CONFLICT (date, keyword_id)
+DO UPDATE statement, relying on the unique ('date', 'keyword') constraint.
+The monthly partitions a batch touches are created first (partitions.ensure_partitions).
+"""
+from datetime import date, timedelta
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set
+from django.conf import settings
+from django.db import connection
+from .models import Keyword, ExposureSnapshot
+from .cache import bump_dates
+from .partitions import ensure_partitions
+from .rollups import refresh_rollups
+
+# Postgres allows at most 65535 bind parameters per statement (5 per row)
+MAX_BATCH_SIZE = 13000
+
+
+def ensure_keywords(names: Iterable[str]) -> Dict[str, int]:
+    """確保關鍵字存在，回傳 {name: id}（最多兩個查詢）"""
+    names = list(dict.fromkeys(n for n in names if n))
+    if not names:
+        return {}
+    Keyword.objects.bulk_create([Keyword(name=n, enabled=True) for n in names], ignore_conflicts=True)
+    return dict(Keyword.objects.filter(name__in=names).values_list("name", "id"))
+
+
+def _batches(rows: Iterable[dict], size: int):
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _upsert_batch(cursor, table: str, batch: List[dict]) -> int:
+    """Upsert one batch; returns how many rows were newly inserted."""
+    # ON CONFLICT cannot touch the same row twice in one statement: last row wins
+    dedup = {}
+    for r in batch:
+        dedup[(r["date"], r["keyword_id"])] = r
+    params = []
+    for r in dedup.values():
+        params.extend([r["date"], r["keyword_id"], int(r.get("impressions") or 0),
+                       r.get("clicks"), r.get("position")])
+    values = ",".join(["(%s::date,%s::bigint,%s::integer,%s::integer,%s::double precision)"]
+                      + ["(%s,%s,%s,%s,%s)"] * (len(dedup) - 1))
+    # 分區表不能 RETURNING xmax：以同一 snapshot 先數已存在的鍵，新增數 = 影響列數 - 已存在數
+    cursor.execute(
+        f"WITH v (date, keyword_id, impressions, clicks, position) AS (VALUES {values}), "
+        f"existing AS (SELECT count(*) AS n FROM {table} t JOIN v USING (date, keyword_id)), "
+        f"up AS (INSERT INTO {table} (date, keyword_id, impressions, clicks, position) "
+        "SELECT * FROM v "
+        "ON CONFLICT (date, keyword_id) DO UPDATE SET "
+        "impressions = EXCLUDED.impressions, clicks = EXCLUDED.clicks, position = EXCLUDED.position "
+        "RETURNING 1) "
+        "SELECT (SELECT count(*) FROM up) - (SELECT n FROM existing)",
+        params,
+    )
+    return cursor.fetchone()[0]
+
+
+def after_write(dates: Set[date], keyword_ids: Set[int]) -> None:
+    """Keep derived data in step with a finished ingestion (rollups, response cache)."""
+    if not dates:
+        return
+    refresh_rollups(dates, keyword_ids)
+    bump_dates(dates)
+
+
+def upsert_snapshots(rows: Iterable[dict], batch_size: Optional[int] = None, refresh: bool = True) -> dict:
+    """
+    rows: [{'date': date, 'keyword_id': int, 'impressions': int, 'clicks': int|None, 'position': float|None}, ...]
+
+    refresh=False skips after_write(); callers writing several chunks (pull_engine)
+    call it once at the end instead.
+
+    Returns: {
+        'inserted': int,
+        'updated': int,
+        'statements': int,
+        'dates': set of dates touched,
+        'keyword_ids': set of keyword ids touched,
+    }
+    """
+    size = batch_size or getattr(settings, "GSC_INGEST_BATCH_SIZE", 5000)
+    size = max(1, min(int(size), MAX_BATCH_SIZE))
+    table = connection.ops.quote_name(ExposureSnapshot._meta.db_table)
+
+    result = {"inserted": 0, "updated": 0, "statements": 0, "dates": set(), "keyword_ids": set()}
+    # 每批一個 statement（本身即為原子操作）；rows 可為邊抓邊產生的 generator
+    with connection.cursor() as cursor:
+        for batch in _batches(rows, size):
+            for r in batch:
+                if isinstance(r["date"], str):
+                    r["date"] = date.fromisoformat(r["date"])
+            ensure_partitions(r["date"] for r in batch)
+            inserted = _upsert_batch(cursor, table, batch)
+            n = len({(r["date"], r["keyword_id"]) for r in batch})
+            result["inserted"] += inserted
+            result["updated"] += n - inserted
+            result["statements"] += 1
+            result["dates"].update(r["date"] for r in batch)
+            result["keyword_ids"].update(r["keyword_id"] for r in batch)
+    if refresh:
+        after_write(result["dates"], result["keyword_ids"])
+    return result
+
+
+def gsc_rows_to_snapshots(keyword_id: int, rows: Iterable[dict], start: date = None, end: date = None,
+                          zero_fill_until: date = None):
+    """
+    把 gsc_client 回傳的 rows 轉成 upsert_snapshots 需要的格式（可限制日期範圍）
+    zero_fill_until（需要 start / end）：[start, min(end, zero_fill_until)] 內 GSC 沒回資料的日期
+    補一筆 0 曝光（position 為 NULL），覆蓋率檢查才知道這些日期已抓過，不會每次都判定缺漏
+    """
+    seen = set()
+    for r in rows:
+        d = date.fromisoformat(r["date"]) if isinstance(r["date"], str) else r["date"]
+        if (start and d < start) or (end and d > end):
+            continue
+        seen.add(d)
+        yield {
+            "date": d,
+            "keyword_id": keyword_id,
+            "impressions": r["impressions"],
+            "clicks": r.get("clicks", 0),
+            "position": r.get("position", 0.0),
+        }
+    if zero_fill_until and start and end:
+        for i in range((min(end, zero_fill_until) - start).days + 1):
+            d = start + timedelta(days=i)
+            if d not in seen:
+                yield {"date": d, "keyword_id": keyword_id, "impressions": 0, "clicks": 0, "position": None}
@@ -0,0 +1,159 @@
+"""
+Background GSC pull jobs with request coalescing (singleflight).
+
+Requests for the same tracked keyword set share one in-flight Celery job
+when that job's range already covers theirs; partially overlapping requests
+only enqueue the part that is not covered yet. The in-flight index lives in
+the Django cache (Redis) and is guarded by a Redis lock.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from .coverage import find_missing_cells, missing_spans
+
+_PREFIX = "exposure:pull"
+_local_lock = threading.Lock()
+
+
+def _job_ttl() -> int:
+    return int(getattr(settings, "GSC_PULL_TASK_TIME_LIMIT", 1800)) + 60
+
+
+def _kwset_key(keywords: List[str]) -> str:
+    h = hashlib.sha1("\n".join(sorted(set(keywords))).encode("utf-8")).hexdigest()[:16]
+    return f"{_PREFIX}:inflight:{h}"
+
+
+@contextmanager
+def _kwset_lock(index_key: str):
+    lock_factory = getattr(cache, "lock", None)
+    if lock_factory is None:
+        # 非 Redis cache（本機開發）退回行程內鎖
+        with _local_lock:
+            yield
+        return
+    with lock_factory(f"{index_key}:lock", timeout=10, blocking_timeout=10):
+        yield
+
+
+def _clip(start: date, end: date, cov_start: date, cov_end: date) -> Optional[Tuple[date, date]]:
+    """Part of [start, end] not covered by [cov_start, cov_end]; None if fully covered."""
+    if cov_start <= start and cov_end >= end:
+        return None
+    if cov_end < start or cov_start > end or (cov_start > start and cov_end < end):
+        return start, end
+    if cov_start <= start:
+        return cov_end + timedelta(days=1), end
+    return start, cov_start - timedelta(days=1)
+
+
+def job_meta(job_id: str) -> Optional[dict]:
+    return cache.get(f"{_PREFIX}:job:{job_id}")
+
+
+def request_pull(start: date, end: date, keywords: List[str],
+                 missing: Optional[Dict[str, List[date]]] = None) -> dict:
+    """
+    Enqueue (or join) a background pull for the missing cells of [start, end]
+    (`missing`: coverage already computed by the caller).
+
+    Returns: {
+        'had_data': bool,
+        'missing_cells_count': int,
+        'job_id': str or None,
+        'shared': bool,        # joined an existing in-flight job
+    }
+    """
+    from .tasks import pull_gsc_range
+
+    if missing is None:
+        missing = find_missing_cells(start, end, keywords)
+    out = {
+        "had_data": not missing,
+        "missing_cells_count": sum(len(ds) for ds in missing.values()),
+        "job_id": None,
+        "shared": False,
+    }
+    if not missing:
+        return out
+
+    spans = missing_spans(missing)
+    need_start = min(s for s, _ in spans.values())
+    need_end = max(e for _, e in spans.values())
+    index_key = _kwset_key(keywords)
+
+    with _kwset_lock(index_key):
+        now = time.time()
+        inflight = [j for j in (cache.get(index_key) or []) if j["expires"] > now]
+        for j in inflight:
+            rest = _clip(need_start, need_end, date.fromisoformat(j["start"]), date.fromisoformat(j["end"]))
+            if rest is None:
+                out.update(job_id=j["id"], shared=True)
+                cache.set(index_key, inflight, _job_ttl())
+                return out
+            need_start, need_end = rest
+
+        # 只拉尚未被其他 job 涵蓋的部分
+        spans = {kw: (max(s, need_start), min(e, need_end)) for kw, (s, e) in spans.items()
+                 if s <= need_end and e >= need_start}
+        if not spans:
+            out.update(job_id=inflight[-1]["id"], shared=True)
+            return out
+        job_id = str(uuid.uuid4())
+        inflight.append({"id": job_id, "start": need_start.isoformat(), "end": need_end.isoformat(),
+                         "expires": now + _job_ttl()})
+        cache.set(index_key, inflight, _job_ttl())
+        cache.set(f"{_PREFIX}:job:{job_id}", {
+            "start": need_start.isoformat(), "end": need_end.isoformat(),
+            "keywords": len(spans), "created_at": now, "index_key": index_key,
+        }, _job_ttl())
+
+    try:
+        pull_gsc_range.apply_async(
+            args=[need_start.isoformat(), need_end.isoformat(), list(spans),
+                  {kw: [s.isoformat(), e.isoformat()] for kw, (s, e) in spans.items()}],
+            task_id=job_id,
+        )
+    except Exception:
+        # broker 不可用時不要留下幽靈 job 讓後續請求一直共用
+        release_job(job_id)
+        raise
+    out["job_id"] = job_id
+    return out
+
+
+def release_job(job_id: str) -> None:
+    """Drop a finished job from its in-flight index (called by the task)."""
+    meta = job_meta(job_id)
+    if not meta:
+        return
+    index_key = meta["index_key"]
+    with _kwset_lock(index_key):
+        inflight = [j for j in (cache.get(index_key) or []) if j["id"] != job_id]
+        if inflight:
+            cache.set(index_key, inflight, _job_ttl())
+        else:
+            cache.delete(index_key)
+
+
+def job_status(job_id: str) -> Optional[Dict]:
+    from celery.result import AsyncResult
+
+    meta = job_meta(job_id)
+    res = AsyncResult(job_id)
+    if meta is None and res.state == "PENDING":
+        return None
+    out = {"job_id": job_id, "state": res.state, "ready": res.ready()}
+    if meta:
+        out.update(start=meta["start"], end=meta["end"], keywords=meta["keywords"])
+    if res.successful():
+        out["result"] = res.result
+    elif res.failed():
+        out["error"] = str(res.result)
+    return out
@@ -0,0 +1,42 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from exposure.archive import FORMATS, archive_months, load_manifest, read_archive
+
+
+class Command(BaseCommand):
+    help = ("Archive finalized months of ExposureSnapshot to Parquet / Arrow IPC files "
+            "(one file per month, new months only unless --force).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=str, help="YYYY-MM-DD (default: first snapshot date)")
+        parser.add_argument("--end", type=str, help="YYYY-MM-DD (default: last finalized month)")
+        parser.add_argument("--format", choices=list(FORMATS), default=None,
+                            help="parquet or arrow (default: EXPOSURE_ARCHIVE_FORMAT)")
+        parser.add_argument("--compression", type=str, default="zstd", help="zstd, lz4, snappy (parquet) or none")
+        parser.add_argument("--force", action="store_true", help="Rewrite months that are already archived")
+        parser.add_argument("--list", action="store_true", help="Show the manifest and exit")
+        parser.add_argument("--verify", action="store_true", help="Read the archive back and report row counts")
+
+    def handle(self, *args, **opts):
+        if opts["list"]:
+            for month, e in load_manifest().items():
+                self.stdout.write(f"{month}  {e['format']:>7}  {e['rows']:>10} rows  {e['bytes'] / 1e6:>8.2f} MB  {e['file']}")
+            return
+
+        try:
+            start = date.fromisoformat(opts["start"]) if opts.get("start") else None
+            end = date.fromisoformat(opts["end"]) if opts.get("end") else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        fmt = opts["format"] or settings.EXPOSURE_ARCHIVE_FORMAT
+        compression = None if opts["compression"].lower() == "none" else opts["compression"]
+
+        written = archive_months(start, end, fmt, force=opts["force"], compression=compression)
+        for w in written:
+            self.stdout.write(f"{w['month']}: {w['rows']} rows -> {w['file']} ({w['bytes'] / 1e6:.2f} MB)")
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(written)} month(s)"))
+
+        if opts["verify"]:
+            t = read_archive(start, end)
+            self.stdout.write(f"Archive readback: {t.num_rows} rows, {t.nbytes / 1e6:.2f} MB in Arrow memory")
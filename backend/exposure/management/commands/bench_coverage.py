@@ -0,0 +1,73 @@
+import random
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from exposure.coverage import find_missing_cells
+from exposure.models import Keyword, ExposureSnapshot
+
+
+def _legacy_check(start: date, end: date, keywords):
+    """舊版：每天一個 count() 查詢，僅供對照"""
+    missing = []
+    d = start
+    while d <= end:
+        n = ExposureSnapshot.objects.filter(date=d, keyword__name__in=keywords).count()
+        if n < len(keywords):
+            missing.append(d)
+        d += timedelta(days=1)
+    return missing
+
+
+class Command(BaseCommand):
+    help = "Benchmark coverage checks (legacy per-day count vs. grouped query) on synthetic data. Rolls back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ranges", type=str, default="7,30,90", help="Comma-separated range lengths in days")
+        parser.add_argument("--keywords", type=str, default="9,500", help="Comma-separated tracked keyword counts")
+        parser.add_argument("--gap-rate", type=float, default=0.01, help="Fraction of cells left missing")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **opts):
+        ranges = [int(x) for x in opts["ranges"].split(",") if x.strip()]
+        kw_counts = [int(x) for x in opts["keywords"].split(",") if x.strip()]
+        rng = random.Random(42)
+        end = date.today()
+
+        self.stdout.write(f"{'days':>5} {'kws':>5} | {'legacy q':>8} {'legacy ms':>10} | {'grouped q':>9} {'grouped ms':>10} | {'cells':>6}")
+        with transaction.atomic():
+            for n_kw in kw_counts:
+                names = [f"__bench_cov_{n_kw}_{i:05d}" for i in range(n_kw)]
+                Keyword.objects.bulk_create([Keyword(name=n) for n in names])
+                kws = list(Keyword.objects.filter(name__in=names))
+                start_all = end - timedelta(days=max(ranges) - 1)
+                snaps = []
+                for kw in kws:
+                    for i in range(max(ranges)):
+                        if rng.random() >= opts["gap_rate"]:
+                            snaps.append(ExposureSnapshot(date=start_all + timedelta(days=i), keyword=kw, impressions=1))
+                ExposureSnapshot.objects.bulk_create(snaps, batch_size=5000)
+
+                for days in ranges:
+                    start = end - timedelta(days=days - 1)
+                    legacy_q = grouped_q = 0
+                    legacy_t = grouped_t = 0.0
+                    for _ in range(opts["repeat"]):
+                        with CaptureQueriesContext(connection) as ctx:
+                            t0 = time.perf_counter()
+                            _legacy_check(start, end, names)
+                            legacy_t += time.perf_counter() - t0
+                        legacy_q = len(ctx.captured_queries)
+                        with CaptureQueriesContext(connection) as ctx:
+                            t0 = time.perf_counter()
+                            missing = find_missing_cells(start, end, names)
+                            grouped_t += time.perf_counter() - t0
+                        grouped_q = len(ctx.captured_queries)
+                    cells = sum(len(v) for v in missing.values())
+                    rep = opts["repeat"]
+                    self.stdout.write(
+                        f"{days:>5} {n_kw:>5} | {legacy_q:>8} {legacy_t / rep * 1000:>10.1f} | "
+                        f"{grouped_q:>9} {grouped_t / rep * 1000:>10.1f} | {cells:>6}"
+                    )
+            transaction.set_rollback(True)
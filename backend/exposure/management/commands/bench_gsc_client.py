@@ -0,0 +1,82 @@
+import datetime
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+import httplib2
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from exposure import gsc_client
+
+_CANNED = json.dumps({"rows": [
+    {"keys": ["2025-01-01"], "impressions": 120, "clicks": 7, "position": 4.2},
+    {"keys": ["2025-01-02"], "impressions": 98, "clicks": 5, "position": 4.8},
+]}).encode("utf-8")
+
+
+class _CannedHttp:
+    """不連網的 http：每個請求都回同一份 Search Analytics 結果"""
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        return httplib2.Response({"status": "200", "content-type": "application/json"}), _CANNED
+
+
+class Command(BaseCommand):
+    help = ("Micro-benchmark per-keyword GSC client overhead: legacy (load token + build service per call) "
+            "vs. the cached process-level holder. Uses the bundled discovery document and canned HTTP responses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keywords", type=int, default=200, help="Simulated keywords per pull")
+
+    def handle(self, *args, **opts):
+        n = opts["keywords"]
+        doc = discovery_cache.get_static_doc("searchconsole", "v1")
+
+        def _stub_build(name, version, credentials=None, **kwargs):
+            return build_from_document(doc, credentials=credentials)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            token_path = os.path.join(tmp, "token.json")
+            creds = Credentials(
+                token="bench-token", refresh_token="bench-refresh",
+                token_uri="https://oauth2.googleapis.com/token",
+                client_id="bench", client_secret="bench", scopes=gsc_client.SCOPES,
+                expiry=datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+            )
+            with open(token_path, "w") as f:
+                f.write(creds.to_json())
+
+            with override_settings(GSC_TOKEN_FILE=token_path), \
+                    mock.patch.object(gsc_client, "build", _stub_build), \
+                    mock.patch.object(gsc_client, "_base_http", _CannedHttp):
+
+                # legacy: every keyword re-reads token.json and rebuilds the service
+                def legacy(kw):
+                    c = gsc_client._load_credentials()
+                    svc = gsc_client._build_service(c)
+                    body = {"startDate": "2025-01-01", "endDate": "2025-01-02", "dimensions": ["DATE"],
+                            "dimensionFilterGroups": [{"groupType": "AND", "filters": [
+                                {"dimension": "QUERY", "operator": "EQUALS", "expression": kw}]}],
+                            "rowLimit": 1000}
+                    return svc.searchanalytics().query(siteUrl="sc-domain:bench", body=body).execute(http=_CannedHttp())
+
+                t0 = time.perf_counter()
+                for i in range(n):
+                    legacy(f"kw{i}")
+                legacy_t = time.perf_counter() - t0
+
+                gsc_client._holder.reset()
+                t0 = time.perf_counter()
+                for i in range(n):
+                    gsc_client.fetch_daily_impressions("sc-domain:bench", f"kw{i}", "2025-01-01", "2025-01-02")
+                cached_t = time.perf_counter() - t0
+                gsc_client._holder.reset()
+
+        self.stdout.write(f"keywords: {n}")
+        self.stdout.write(f"legacy : {legacy_t * 1000:8.1f} ms total, {legacy_t / n * 1000:7.3f} ms/keyword")
+        self.stdout.write(f"cached : {cached_t * 1000:8.1f} ms total, {cached_t / n * 1000:7.3f} ms/keyword")
+        if cached_t > 0:
+            self.stdout.write(self.style.SUCCESS(f"speedup: {legacy_t / cached_t:.1f}x"))
@@ -0,0 +1,69 @@
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from exposure.models import ExposureSnapshot
+from exposure.rollups import backfill_rollups, period_totals
+
+
+class Command(BaseCommand):
+    help = ("Benchmark period totals: GROUP BY over daily rows vs. rollup lookups, "
+            "on synthetic data (default 2 years x 5k keywords). Rolls back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keywords", type=int, default=5000)
+        parser.add_argument("--days", type=int, default=730)
+        parser.add_argument("--ranges", type=str, default="7,30,90,365,730")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _time(self, fn, repeat):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        return best, out
+
+    def handle(self, *args, **opts):
+        n_kw, n_days = opts["keywords"], opts["days"]
+        end = date.today()
+        first = end - timedelta(days=n_days - 1)
+        q = connection.ops.quote_name
+
+        with transaction.atomic():
+            self.stdout.write(f"Generating {n_kw} keywords x {n_days} days ...")
+            t0 = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {q('exposure_keyword')} (name, enabled) "
+                    "SELECT '__bench_rollup_' || g, true FROM generate_series(1, %s) g", [n_kw])
+                cursor.execute(
+                    f"INSERT INTO {q('exposure_exposuresnapshot')} (date, keyword_id, impressions, clicks, position) "
+                    f"SELECT d::date, k.id, (random() * 1000)::int, (random() * 50)::int, 1 + random() * 20 "
+                    f"FROM {q('exposure_keyword')} k, generate_series(%s::date, %s::date, interval '1 day') d "
+                    "WHERE k.name LIKE '__bench_rollup_%%'", [first, end])
+                cursor.execute(f"ANALYZE {q('exposure_exposuresnapshot')}")
+            gen_t = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            backfill_rollups(first, end)
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {q('exposure_exposurerollup')}")
+            self.stdout.write(f"  data {gen_t:.1f}s, rollup backfill {time.perf_counter() - t0:.1f}s")
+
+            self.stdout.write(f"{'range':>6} | {'daily GROUP BY ms':>17} | {'rollup ms':>9} | {'speedup':>7} | match")
+            for days in [int(x) for x in opts["ranges"].split(",") if x.strip()]:
+                start = end - timedelta(days=min(days, n_days) - 1)
+
+                def legacy():
+                    return {r["keyword_id"]: r["total"] for r in
+                            ExposureSnapshot.objects.filter(date__gte=start, date__lte=end)
+                            .values("keyword_id").annotate(total=Sum("impressions"))}
+
+                t_old, old = self._time(legacy, opts["repeat"])
+                t_new, new = self._time(lambda: period_totals(start, end), opts["repeat"])
+                match = all(new.get(k) and new[k].impressions == v for k, v in old.items())
+                self.stdout.write(f"{days:>6} | {t_old * 1000:>17.1f} | {t_new * 1000:>9.1f} | "
+                                  f"{t_old / t_new if t_new else 0:>6.1f}x | {match}")
+            transaction.set_rollback(True)
@@ -0,0 +1,80 @@
+import heapq
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from exposure.ranking import rank_keywords
+from exposure.rollups import iter_period_totals, refresh_rollups
+
+
+def _python_top(start: date, end: date, n: int):
+    """舊做法：所有關鍵字的合計送回 Python，再以 size-n min-heap 選出（對照組）"""
+    heap = []
+    for kid, t in iter_period_totals(start, end):
+        item = (float(t.impressions), -kid)
+        if len(heap) < n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return [-k for _, k in sorted(heap, reverse=True)]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark Top-N ranking by impressions as the keyword count grows (default 10 -> 50k "
+            "keywords x 90 days of synthetic data): rank_keywords (ORDER BY / LIMIT in SQL) vs. "
+            "streaming every keyword's totals to Python and selecting with a heap. Runs in one "
+            "transaction that is rolled back, so the synthetic keywords are never visible to other "
+            "sessions. The rows are not VACUUMed, so index-only scans still visit the heap and "
+            "timings are pessimistic next to a live table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--counts", type=str, default="10,100,1000,10000,50000")
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--range", type=int, default=30, help="Ranked range length in days")
+        parser.add_argument("--n", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _time(self, fn, repeat):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        return best, out
+
+    def handle(self, *args, **opts):
+        counts = sorted(int(x) for x in opts["counts"].split(",") if x.strip())
+        end = date.today()
+        first = end - timedelta(days=opts["days"] - 1)
+        start = end - timedelta(days=min(opts["range"], opts["days"]) - 1)
+        n, repeat = opts["n"], opts["repeat"]
+        q = connection.ops.quote_name
+
+        self.stdout.write(f"Top-{n} by impressions over {start}..{end}, data {first}..{end}")
+        self.stdout.write(f"{'keywords':>8} | {'SQL LIMIT ms':>12} | {'Python heap ms':>14} | match")
+        have = 0
+        with transaction.atomic():
+            for count in counts:
+                # 逐批追加關鍵字，量測累積後的表（整段在同一個 transaction，結束時 rollback）
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"INSERT INTO {q('exposure_keyword')} (name, enabled) "
+                        "SELECT '__bench_topn_' || g, true FROM generate_series(%s, %s) g RETURNING id",
+                        [have + 1, count])
+                    new_ids = [r[0] for r in cursor.fetchall()]
+                    cursor.execute(
+                        f"INSERT INTO {q('exposure_exposuresnapshot')} (date, keyword_id, impressions, clicks, position) "
+                        "SELECT d::date, k, (random() * 1000)::int, (random() * 50)::int, 1 + random() * 20 "
+                        "FROM unnest(%s::bigint[]) k, generate_series(%s::date, %s::date, interval '1 day') d",
+                        [new_ids, first, end])
+                    refresh_rollups([first + timedelta(days=i) for i in range(opts["days"])], new_ids)
+                    cursor.execute(f"ANALYZE {q('exposure_exposuresnapshot')}")
+                    cursor.execute(f"ANALYZE {q('exposure_exposurerollup')}")
+                have = count
+
+                t_sql, ranked = self._time(lambda: rank_keywords(start, end, n, "impressions", 0), repeat)
+                t_py, top = self._time(lambda: _python_top(start, end, n), repeat)
+                match = [k for k, _, _ in ranked] == top
+                self.stdout.write(f"{count:>8} | {t_sql * 1000:>12.1f} | {t_py * 1000:>14.1f} | {match}")
+            transaction.set_rollback(True)
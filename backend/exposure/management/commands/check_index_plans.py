@@ -0,0 +1,91 @@
+import json
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from exposure.models import ExposureRollup, ExposureSnapshot
+
+
+def _scans(plan: dict):
+    """Yield every scan node (node type, relation, index) in an EXPLAIN JSON plan."""
+    if "Relation Name" in plan:
+        yield plan.get("Node Type"), plan.get("Relation Name"), plan.get("Index Name")
+    for child in plan.get("Plans", []):
+        yield from _scans(child)
+
+
+def _parents(cursor, names) -> dict:
+    """{partition relation / partition index: parent name}; ExposureSnapshot scans run on its monthly partitions."""
+    cursor.execute(
+        "SELECT c.relname, p.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = ANY(%s)",
+        [list(names)],
+    )
+    return dict(cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = ("Regression check for ExposureSnapshot / ExposureRollup indexes: EXPLAIN the hot "
+            "range-scan queries and fail unless they are served by index-only scans (Postgres only).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--verbose-plans", action="store_true")
+
+    def _queries(self, days: int):
+        end = date.today()
+        start = end - timedelta(days=days - 1)
+        ids = [1, 2, 3, 4, 5]
+        snap = ExposureSnapshot.objects.filter(date__gte=start, date__lte=end)
+        return [
+            # (label, queryset, relation, 可接受的 index)
+            ("period totals by keyword",
+             snap.values("keyword_id").annotate(total=Sum("impressions")),
+             ExposureSnapshot._meta.db_table, {"exposure_snap_date_kw_uniq", "exposure_snap_kw_date_idx"}),
+            ("top-N grid",
+             snap.filter(keyword_id__in=ids).values_list("date", "keyword_id", "impressions"),
+             ExposureSnapshot._meta.db_table, {"exposure_snap_date_kw_uniq", "exposure_snap_kw_date_idx"}),
+            ("coverage",
+             snap.filter(keyword_id__in=ids).values("keyword_id").annotate(n=Count("date")),
+             ExposureSnapshot._meta.db_table, {"exposure_snap_date_kw_uniq", "exposure_snap_kw_date_idx"}),
+            ("rollup lookup",
+             ExposureRollup.objects.filter(grain=ExposureRollup.GRAIN_MONTH, period_start__gte=start)
+             .values_list("keyword_id", "impressions", "clicks", "position_weighted", "days"),
+             ExposureRollup._meta.db_table, {"exposure_rollup_grain_period_kw_uniq"}),
+        ]
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("check_index_plans needs PostgreSQL")
+
+        failures = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            # 小表或剛建好的表 planner 會偏好 seq scan；關掉它們只看索引本身能否撐起 index-only plan
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+            queries = self._queries(opts["days"])
+            parent = _parents(cursor, {r for _, _, r, _ in queries} | set().union(*(i for _, _, _, i in queries)))
+            for label, qs, relation, indexes in queries:
+                sql, params = qs.query.sql_with_params()
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                raw = cursor.fetchone()[0]
+                plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+                scans = [(t, parent.get(i, i)) for t, r, i in _scans(plan) if parent.get(r, r) == relation]
+                ok = bool(scans) and all(t == "Index Only Scan" and i in indexes for t, i in scans)
+                # 分區表每個被掃到的月份各一個 scan 節點，合併成 "n x ..." 顯示
+                seen = {}
+                for t, i in scans:
+                    key = f"{t} using {i}" if i else t
+                    seen[key] = seen.get(key, 0) + 1
+                desc = ", ".join(f"{n} x {k}" if n > 1 else k for k, n in seen.items()) or "no scan"
+                self.stdout.write(f"{'OK  ' if ok else 'FAIL'} {label}: {desc}")
+                if opts["verbose_plans"]:
+                    self.stdout.write(json.dumps(plan, indent=2))
+                if not ok:
+                    failures.append(label)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"not index-only: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("all checked queries use index-only scans"))
@@ -0,0 +1,41 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from exposure.partitions import (detach_old_partitions, ensure_future_partitions, is_partitioned,
+                                 list_partitions, split_default)
+
+
+class Command(BaseCommand):
+    help = ("Maintain the monthly partitions of ExposureSnapshot: premake future months, move rows "
+            "out of the DEFAULT partition and detach months past EXPOSURE_PARTITION_RETAIN_MONTHS "
+            "(the same steps as the daily celery-beat task).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--list", action="store_true", help="Show partitions and exit")
+        parser.add_argument("--premake", type=int, default=None,
+                            help="Months to create ahead (default: EXPOSURE_PARTITION_PREMAKE_MONTHS)")
+        parser.add_argument("--retain", type=int, default=None,
+                            help="Months to keep attached (default: EXPOSURE_PARTITION_RETAIN_MONTHS, 0 = all)")
+        parser.add_argument("--drop", action="store_true", help="Drop detached partitions instead of keeping them")
+        parser.add_argument("--today", type=str, help="YYYY-MM-DD (default: today)")
+
+    def handle(self, *args, **opts):
+        if not is_partitioned():
+            raise CommandError("exposure_exposuresnapshot is not partitioned (run migrate)")
+        if opts["list"]:
+            for p in list_partitions():
+                month = f"{p['month']:%Y-%m}" if p["month"] else "DEFAULT"
+                self.stdout.write(f"{month:>7}  {p['rows']:>10} rows  {p['bytes'] / 1e6:>8.2f} MB  {p['name']}")
+            return
+
+        try:
+            today = date.fromisoformat(opts["today"]) if opts.get("today") else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        for name in ensure_future_partitions(today, opts["premake"]):
+            self.stdout.write(f"created {name}")
+        for name in split_default():
+            self.stdout.write(f"moved DEFAULT rows into {name}")
+        for d in detach_old_partitions(opts["retain"], today, drop=opts["drop"] or None):
+            where = "dropped" if d["dropped"] else f"kept as {d['table']}"
+            self.stdout.write(f"detached {d['month']} ({where}; archive {'written' if d['archive_written'] else 'already present'})")
+        self.stdout.write(self.style.SUCCESS("partitions up to date"))
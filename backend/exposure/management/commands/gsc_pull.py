@@ -1,8 +1,10 @@
 from datetime import date, timedelta
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from exposure.gsc_client import fetch_daily_impressions
-from exposure.models import Keyword, ExposureSnapshot
+from exposure.gsc_auto_pull import gsc_history_start, plan_fetch_units
+from exposure.ingest import ensure_keywords
+from exposure.pull_engine import run_pull
+from exposure.models import Keyword
 
 class Command(BaseCommand):
     help = "Pull daily impressions from GSC for configured keywords in the given period."
@@ -10,21 +12,31 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--start", type=str, help="YYYY-MM-DD (default: today-N)")
         parser.add_argument("--end", type=str, help="YYYY-MM-DD (default: today)")
-        parser.add_argument("--days", type=int, default=7, help="If no start/end, use last N days (max 90)")
+        parser.add_argument("--days", type=int, default=7, help="If no start/end, use last N days (max GSC_MAX_HISTORY_DAYS)")
         parser.add_argument("--only", type=str, help="Comma-separated subset of keywords (optional)")
+        parser.add_argument("--per-keyword", action="store_true",
+                            help="One API call per keyword instead of batched includingRegex queries")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Parallel GSC fetches (default: settings.GSC_PULL_WORKERS)")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Rows per upsert statement (default: settings.GSC_INGEST_BATCH_SIZE)")
 
     def handle(self, *args, **opts):
         end_str = opts.get("end")
         start_str = opts.get("start")
-        days = min(int(opts.get("days", 7)), 90)
+        max_days = settings.GSC_MAX_HISTORY_DAYS
+        days = min(int(opts.get("days", 7)), max_days)
         if not end_str or not start_str:
             end = date.today()
             start = end - timedelta(days=days-1)
         else:
             start = date.fromisoformat(start_str)
             end = date.fromisoformat(end_str)
-        if (end - start).days + 1 > 90:
-            raise CommandError("Period cannot exceed 90 days.")
+        if (end - start).days + 1 > max_days:
+            raise CommandError(f"Period cannot exceed {max_days} days (GSC keeps about 16 months).")
+        if start < gsc_history_start():
+            self.stdout.write(self.style.WARNING(
+                f"GSC has no data before {gsc_history_start()}; earlier dates will come back empty."))
 
         # keyword list
         if opts.get("only"):
@@ -37,23 +49,17 @@ class Command(BaseCommand):
         self.stdout.write(f"Fetching {len(kw_list)} keywords from {start} to {end} ...")
 
         # ensure keywords exist in DB
-        have = set(Keyword.objects.values_list("name", flat=True))
-        for k in kw_list:
-            if k not in have:
-                Keyword.objects.create(name=k, enabled=True)
-                have.add(k)
+        kw_ids = ensure_keywords(kw_list)
 
-        start_iso, end_iso = start.isoformat(), end.isoformat()
         prop = settings.GSC_PROPERTY_URI
+        units = plan_fetch_units(start, end, kw_list, batched=False if opts.get("per_keyword") else None)
 
-        cnt = 0
-        for kw in kw_list:
-            rows = fetch_daily_impressions(prop, kw, start_iso, end_iso)
-            kobj = Keyword.objects.get(name=kw)
-            for r in rows:
-                ExposureSnapshot.objects.update_or_create(
-                    date=r["date"], keyword=kobj,
-                    defaults={"impressions": r["impressions"], "clicks": r["clicks"], "position": r["position"]}
-                )
-                cnt += 1
-        self.stdout.write(self.style.SUCCESS(f"Done. Upserted rows: {cnt}"))
+        res = run_pull(prop, units, kw_ids, workers=opts.get("workers"), batch_size=opts.get("batch_size"))
+        for unit, exc in res["errors"]:
+            who = ", ".join(unit.keywords) if unit else "database write"
+            self.stderr.write(self.style.ERROR(f"Failed: {who}: {exc}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Upserted rows: {res['inserted'] + res['updated']} "
+            f"(inserted {res['inserted']}, updated {res['updated']}, statements {res['statements']}, "
+            f"api calls {res['api_calls']})"
+        ))
@@ -0,0 +1,22 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from exposure.sync import incremental_sync
+
+class Command(BaseCommand):
+    help = "Incremental GSC sync based on per-keyword watermarks (same job celery-beat runs daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--today", type=str, help="YYYY-MM-DD (default: today)")
+        parser.add_argument("--only", type=str, help="Comma-separated subset of keywords (optional)")
+        parser.add_argument("--workers", type=int, default=None, help="Parallel GSC fetches")
+
+    def handle(self, *args, **opts):
+        today = date.fromisoformat(opts["today"]) if opts.get("today") else None
+        only = [k.strip() for k in opts["only"].split(",") if k.strip()] if opts.get("only") else None
+        res = incremental_sync(today=today, keywords=only, workers=opts.get("workers"))
+        for err in res["errors"]:
+            self.stderr.write(self.style.ERROR(err))
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {res['fetched_keywords']}/{res['keywords']} keywords: inserted {res['inserted']}, "
+            f"updated {res['updated']}, api calls {res['api_calls']}, watermark {res['watermark']}"
+        ))
@@ -0,0 +1,183 @@
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 儀表板一次載入會打的端點（dashboard_bundle 之外保留舊路徑，反映還沒更新的前端）
+DEFAULT_PATHS = [
+    "/api/exposure/dashboard_bundle?start={start}&end={end}&pull=true",
+    "/api/exposure/top5_timeseries_auto?start={start}&end={end}&pull=true",
+    "/api/exposure/top5_timeseries?start={start}&end={end}",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_ms: List[float], p: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, int(round(p / 100 * (len(sorted_ms) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ("HTTP load test of the exposure API: throughput and latency of the WSGI deployment "
+            "(gunicorn sync workers) vs. the ASGI one (uvicorn + async views). Either point it at running "
+            "servers with --target name=URL, or let it --spawn both locally with the same worker count.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", action="append", default=[],
+                            help="name=http://host:port (repeatable), e.g. wsgi=http://localhost:8000")
+        parser.add_argument("--spawn", action="store_true",
+                            help="Start gunicorn (loanserp.wsgi) and uvicorn (loanserp.asgi) on free local ports")
+        parser.add_argument("--workers", type=int, default=4, help="Server processes per spawned deployment")
+        parser.add_argument("--concurrency", type=str, default="1,16,64", help="Concurrent clients per run")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+        parser.add_argument("--path", action="append", default=[],
+                            help="Request path template ({start} / {end} filled in); default: dashboard mix")
+        parser.add_argument("--ranges", type=int, default=1,
+                            help="Distinct date ranges to rotate through (>1 spreads load over cache entries)")
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--timeout", type=float, default=60.0)
+
+    # --- servers -----------------------------------------------------------
+
+    def _spawn(self, workers: int) -> Tuple[Dict[str, str], List[subprocess.Popen]]:
+        procs, targets = [], {}
+        base_env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "loanserp.base"))
+        cmds = {
+            "wsgi": ([sys.executable, "-m", "gunicorn", "loanserp.wsgi:application", "--workers", str(workers),
+                      "--timeout", "120", "--bind"], {"EXPOSURE_ASYNC_VIEWS": "false"}),
+            "asgi": ([sys.executable, "-m", "uvicorn", "loanserp.asgi:application", "--workers", str(workers),
+                      "--log-level", "warning", "--host", "127.0.0.1", "--port"], {"EXPOSURE_ASYNC_VIEWS": "true"}),
+        }
+        for name, (cmd, env) in cmds.items():
+            port = _free_port()
+            arg = f"127.0.0.1:{port}" if name == "wsgi" else str(port)
+            procs.append(subprocess.Popen(cmd + [arg], cwd=settings.BASE_DIR, env={**base_env, **env},
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            targets[name] = f"http://127.0.0.1:{port}"
+        for name, url in targets.items():
+            if not self._wait_ready(url):
+                for p in procs:
+                    p.terminate()
+                raise CommandError(f"{name} server at {url} did not come up")
+        return targets, procs
+
+    def _wait_ready(self, url: str, timeout: float = 30.0) -> bool:
+        u = urllib.parse.urlsplit(url)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                conn = http.client.HTTPConnection(u.hostname, u.port, timeout=2)
+                conn.request("GET", "/api/health")
+                if conn.getresponse().status == 200:
+                    return True
+            except OSError:
+                pass
+            time.sleep(0.3)
+        return False
+
+    # --- load --------------------------------------------------------------
+
+    def _run(self, url: str, paths: List[str], concurrency: int, duration: float, timeout: float) -> Dict:
+        u = urllib.parse.urlsplit(url)
+        latencies: List[float] = []
+        statuses: Dict[int, int] = {}
+        errors = [0]
+        lock = threading.Lock()
+        stop_at = time.monotonic() + duration
+
+        def client(seed: int):
+            rnd = random.Random(seed)
+            conn = http.client.HTTPConnection(u.hostname, u.port, timeout=timeout)
+            mine, codes, errs = [], {}, 0
+            while time.monotonic() < stop_at:
+                t0 = time.perf_counter()
+                try:
+                    conn.request("GET", rnd.choice(paths), headers={"Connection": "keep-alive"})
+                    resp = conn.getresponse()
+                    resp.read()
+                    codes[resp.status] = codes.get(resp.status, 0) + 1
+                    mine.append((time.perf_counter() - t0) * 1000)
+                except (OSError, http.client.HTTPException):
+                    errs += 1
+                    conn.close()
+                    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=timeout)
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+                errors[0] += errs
+                for k, v in codes.items():
+                    statuses[k] = statuses.get(k, 0) + v
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        latencies.sort()
+        return {
+            "requests": len(latencies), "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50": _percentile(latencies, 50), "p95": _percentile(latencies, 95), "p99": _percentile(latencies, 99),
+            "errors": errors[0], "statuses": statuses,
+        }
+
+    def handle(self, *args, **opts):
+        targets: Dict[str, str] = {}
+        for t in opts["target"]:
+            name, sep, url = t.partition("=")
+            if not sep:
+                raise CommandError(f"--target must be name=URL, got {t!r}")
+            targets[name] = url.rstrip("/")
+        procs: List[subprocess.Popen] = []
+        if opts["spawn"]:
+            spawned, procs = self._spawn(opts["workers"])
+            targets.update(spawned)
+        if not targets:
+            raise CommandError("give at least one --target name=URL, or --spawn")
+
+        end = date.today() - timedelta(days=1)
+        templates = opts["path"] or DEFAULT_PATHS
+        paths = []
+        for i in range(max(1, opts["ranges"])):
+            e = end - timedelta(days=i)
+            s = e - timedelta(days=opts["days"] - 1)
+            paths.extend(p.format(start=s.isoformat(), end=e.isoformat()) for p in templates)
+        levels = [int(x) for x in opts["concurrency"].split(",") if x.strip()]
+
+        try:
+            # 先各打一輪暖身（填 response cache、建立連線），結果不列入
+            for url in targets.values():
+                self._run(url, paths, 1, min(2.0, opts["duration"]), opts["timeout"])
+            self.stdout.write(f"{len(paths)} URL(s), {opts['duration']:.0f}s per run")
+            self.stdout.write(f"{'target':>8} | {'clients':>7} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | "
+                              f"{'p99 ms':>8} | {'errors':>6} | statuses")
+            for c in levels:
+                for name, url in targets.items():
+                    r = self._run(url, paths, c, opts["duration"], opts["timeout"])
+                    codes = ",".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+                    self.stdout.write(f"{name:>8} | {c:7d} | {r['rps']:8.1f} | {r['p50']:8.1f} | {r['p95']:8.1f} | "
+                                      f"{r['p99']:8.1f} | {r['errors']:6d} | {codes}")
+        finally:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                try:
+                    p.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    p.kill()
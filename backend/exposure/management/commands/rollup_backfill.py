@@ -0,0 +1,16 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from exposure.rollups import backfill_rollups
+
+class Command(BaseCommand):
+    help = "Rebuild weekly/monthly ExposureRollup rows from ExposureSnapshot (default: whole table)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=str, help="YYYY-MM-DD (default: first snapshot date)")
+        parser.add_argument("--end", type=str, help="YYYY-MM-DD (default: last snapshot date)")
+
+    def handle(self, *args, **opts):
+        start = date.fromisoformat(opts["start"]) if opts.get("start") else None
+        end = date.fromisoformat(opts["end"]) if opts.get("end") else None
+        n = backfill_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt ({n} statements)."))
@@ -1,7 +1,7 @@
 from datetime import date, timedelta
 from django.core.management.base import BaseCommand
-from django.db.models import Sum
-from exposure.models import ExposureSnapshot, TrendAnalysisJob
+from exposure.models import TrendAnalysisJob
+from exposure.ranking import METRICS, rank_keywords
 
 class Command(BaseCommand):
     help = "Compute Top-5 keywords by total impressions in the period, restricted to tracked keywords."
@@ -10,6 +10,8 @@ class Command(BaseCommand):
         parser.add_argument("--start", type=str, help="YYYY-MM-DD")
         parser.add_argument("--end", type=str, help="YYYY-MM-DD")
         parser.add_argument("--days", type=int, default=7, help="If no start/end, use last N days (max 90)")
+        parser.add_argument("--n", type=int, default=5, help="How many keywords to rank (max 100)")
+        parser.add_argument("--metric", choices=METRICS, default="impressions")
 
     def handle(self, *args, **opts):
         if opts.get("start") and opts.get("end"):
@@ -19,14 +21,12 @@ class Command(BaseCommand):
             end = date.today()
             start = end - timedelta(days=min(int(opts["days"]),90)-1)
 
-        qs = (ExposureSnapshot.objects
-              .filter(date__gte=start, date__lte=end)
-              .values("keyword__name")
-              .annotate(total_impr=Sum("impressions"))
-              .order_by("-total_impr")[:5])
-
-        top5 = [r["keyword__name"] for r in qs]
+        ranked = rank_keywords(start, end, opts["n"], opts["metric"])
+        top = [name for _, name, _ in ranked]
+        meta = {"top5": top[:5]}
+        if opts["n"] != 5 or opts["metric"] != "impressions":
+            meta.update(top=top, n=opts["n"], metric=opts["metric"])
         job = TrendAnalysisJob.objects.create(
-            days=(end-start).days+1, start_date=start, end_date=end, meta={"top5": top5}
+            days=(end-start).days+1, start_date=start, end_date=end, meta=meta
         )
-        self.stdout.write(self.style.SUCCESS(f"Top-5: {top5} (job_id={job.id})"))
+        self.stdout.write(self.style.SUCCESS(f"Top-{len(top)} by {opts['metric']}: {top} (job_id={job.id})"))
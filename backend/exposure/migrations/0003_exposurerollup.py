@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exposure', '0002_syncwatermark'),
+    ]
+
+    # 既有資料直接彙總一次（之後由 ingest 維護，或以 rollup_backfill 重建）
+    backfill = """
+        INSERT INTO exposure_exposurerollup (grain, period_start, keyword_id, impressions, clicks, position_weighted, days)
+        SELECT '{grain}', date_trunc('{grain}', date)::date, keyword_id, SUM(impressions),
+               COALESCE(SUM(clicks), 0), COALESCE(SUM(position * impressions), 0), COUNT(*)
+        FROM exposure_exposuresnapshot
+        GROUP BY 2, 3
+    """
+
+    operations = [
+        migrations.CreateModel(
+            name='ExposureRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('week', 'week'), ('month', 'month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('impressions', models.BigIntegerField(default=0)),
+                ('clicks', models.BigIntegerField(default=0)),
+                ('position_weighted', models.FloatField(default=0)),
+                ('days', models.SmallIntegerField(default=0)),
+                ('keyword', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exposure.keyword')),
+            ],
+            options={
+                'unique_together': {('grain', 'period_start', 'keyword')},
+            },
+        ),
+        migrations.RunSQL(backfill.format(grain='week'), migrations.RunSQL.noop),
+        migrations.RunSQL(backfill.format(grain='month'), migrations.RunSQL.noop),
+    ]
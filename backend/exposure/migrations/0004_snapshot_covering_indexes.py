@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exposure', '0003_exposurerollup'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='exposurerollup',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='exposuresnapshot',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='exposuresnapshot',
+            name='keyword',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='exposure.keyword'),
+        ),
+        migrations.AddIndex(
+            model_name='exposuresnapshot',
+            index=models.Index(fields=['keyword', 'date'], include=('impressions', 'clicks', 'position'), name='exposure_snap_kw_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='exposurerollup',
+            constraint=models.UniqueConstraint(fields=('grain', 'period_start', 'keyword'), include=('impressions', 'clicks', 'position_weighted', 'days'), name='exposure_rollup_grain_period_kw_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='exposuresnapshot',
+            constraint=models.UniqueConstraint(fields=('date', 'keyword'), include=('impressions', 'clicks', 'position'), name='exposure_snap_date_kw_uniq'),
+        ),
+    ]
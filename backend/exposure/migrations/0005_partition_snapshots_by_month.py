@@ -0,0 +1,112 @@
+from datetime import date
+
+from django.db import migrations
+
+TABLE = "exposure_exposuresnapshot"
+COLUMNS = "id, date, keyword_id, impressions, clicks, position"
+# 與 exposure.partitions 的預設一致：遷移時先建好目前月份之後 3 個月
+PREMAKE_MONTHS = 3
+
+
+def _next_month(d):
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _create_table(execute, partitioned):
+    # 欄位 / 索引 / 約束名稱與 0001-0004 建出的一致，Django 的 model state 不變
+    pk = "PRIMARY KEY (id, date)" if partitioned else "PRIMARY KEY (id)"
+    execute(
+        f'CREATE TABLE "{TABLE}" ('
+        '"id" bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY, "date" date NOT NULL, '
+        '"impressions" integer NOT NULL, "clicks" integer NULL, "position" double precision NULL, '
+        f'"keyword_id" bigint NOT NULL, CONSTRAINT "{TABLE}_pkey" {pk})'
+        + (' PARTITION BY RANGE ("date")' if partitioned else "")
+    )
+
+
+def _keyword_fk(schema_editor, table):
+    """keyword_id 外鍵的實際名稱（由 Django 自動產生，各資料庫可能不同），從 pg_constraint 查"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f' "
+            "AND confrelid = 'exposure_keyword'::regclass",
+            [f'"{table}"'],
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+
+def _finish_table(execute, old, fk):
+    execute(f'INSERT INTO "{TABLE}" ({COLUMNS}) SELECT {COLUMNS} FROM "{old}"')
+    execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f'COALESCE((SELECT MAX(id) FROM "{old}"), 0) + 1, false)')
+    execute(f'DROP TABLE "{old}"')
+    execute(f'CREATE UNIQUE INDEX "exposure_snap_date_kw_uniq" ON "{TABLE}" '
+            '("date", "keyword_id") INCLUDE ("impressions", "clicks", "position")')
+    execute(f'CREATE INDEX "exposure_snap_kw_date_idx" ON "{TABLE}" '
+            '("keyword_id", "date") INCLUDE ("impressions", "clicks", "position")')
+    execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{fk}" FOREIGN KEY ("keyword_id") '
+            'REFERENCES "exposure_keyword" ("id") DEFERRABLE INITIALLY DEFERRED')
+    execute(f'ANALYZE "{TABLE}"')
+
+
+def _rename_away(schema_editor, old):
+    """Move the current table out of the way; returns the keyword FK name to recreate."""
+    execute = schema_editor.execute
+    fks = _keyword_fk(schema_editor, TABLE)
+    execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+    execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{old}_pkey"')
+    execute(f'ALTER SEQUENCE "{TABLE}_id_seq" RENAME TO "{old}_id_seq"')
+    for fk in fks:
+        execute(f'ALTER TABLE "{old}" DROP CONSTRAINT "{fk}"')
+    execute('DROP INDEX "exposure_snap_date_kw_uniq"')
+    execute('DROP INDEX "exposure_snap_kw_date_idx"')
+    # 沒有外鍵時（先前被手動移除）以 Django 的命名規則重建
+    return fks[0] if fks else schema_editor._create_index_name(TABLE, ["keyword_id"], suffix="_fk_exposure_keyword_id")
+
+
+def partition(apps, schema_editor):
+    execute = schema_editor.execute
+    old = f"{TABLE}_unpartitioned"
+    fk = _rename_away(schema_editor, old)
+    _create_table(execute, partitioned=True)
+    execute(f'CREATE TABLE "{TABLE}_pdefault" PARTITION OF "{TABLE}" DEFAULT')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(date) FROM "{old}"')
+        first = cursor.fetchone()[0]
+    today = date.today()
+    m = date((first or today).year, (first or today).month, 1)
+    last = date(today.year, today.month, 1)
+    for _ in range(PREMAKE_MONTHS):
+        last = _next_month(last)
+    while m <= last:
+        nxt = _next_month(m)
+        execute(f'CREATE TABLE "{TABLE}_p{m:%Y%m}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{m.isoformat()}') TO ('{nxt.isoformat()}')")
+        m = nxt
+    _finish_table(execute, old, fk)
+
+
+def unpartition(apps, schema_editor):
+    execute = schema_editor.execute
+    old = f"{TABLE}_partitioned"
+    fk = _rename_away(schema_editor, old)
+    _create_table(execute, partitioned=False)
+    # DROP TABLE 會連同所有 partition 一起刪除
+    _finish_table(execute, old, fk)
+
+
+class Migration(migrations.Migration):
+
+    # 先前以 0006 名稱套用過的資料庫視為已套用
+    replaces = [
+        ('exposure', '0006_partition_snapshots_by_month'),
+    ]
+
+    dependencies = [
+        ('exposure', '0004_snapshot_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -7,12 +7,47 @@ class Keyword(models.Model):
 
 class ExposureSnapshot(models.Model):
     date = models.DateField()
-    keyword = models.ForeignKey(Keyword, on_delete=models.CASCADE)
+    # FK 查詢由 (keyword, date) 複合索引涵蓋，不另建單欄索引
+    keyword = models.ForeignKey(Keyword, on_delete=models.CASCADE, db_index=False)
     impressions = models.IntegerField(default=0)
     clicks = models.IntegerField(null=True, blank=True)
     position = models.FloatField(null=True, blank=True)
     class Meta:
-        unique_together = ('date','keyword')
+        constraints = [
+            # 區間掃描 + 依關鍵字彙總可走 index-only scan（ON CONFLICT (date, keyword_id) 仍以此為準）
+            models.UniqueConstraint(fields=['date','keyword'], include=['impressions','clicks','position'],
+                                    name='exposure_snap_date_kw_uniq'),
+        ]
+        indexes = [
+            # 指定關鍵字的每日序列
+            models.Index(fields=['keyword','date'], include=['impressions','clicks','position'],
+                         name='exposure_snap_kw_date_idx'),
+        ]
+
+class ExposureRollup(models.Model):
+    """週/月彙總（由 ingest 維護），期間合計 = 完整月 + 完整週 + 頭尾零散日"""
+    GRAIN_WEEK = "week"
+    GRAIN_MONTH = "month"
+    GRAIN_CHOICES = [(GRAIN_WEEK, "week"), (GRAIN_MONTH, "month")]
+    grain = models.CharField(max_length=5, choices=GRAIN_CHOICES)
+    period_start = models.DateField()
+    keyword = models.ForeignKey(Keyword, on_delete=models.CASCADE)
+    impressions = models.BigIntegerField(default=0)
+    clicks = models.BigIntegerField(default=0)
+    position_weighted = models.FloatField(default=0)  # sum(position * impressions)
+    days = models.SmallIntegerField(default=0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['grain','period_start','keyword'],
+                                    include=['impressions','clicks','position_weighted','days'],
+                                    name='exposure_rollup_grain_period_kw_uniq'),
+        ]
+
+class SyncWatermark(models.Model):
+    """每個關鍵字已確定（GSC 不再修正）的最後日期，供增量同步使用"""
+    keyword = models.OneToOneField(Keyword, on_delete=models.CASCADE, primary_key=True)
+    last_complete_date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
 
 class TrendAnalysisJob(models.Model):
     days = models.IntegerField()
@@ -0,0 +1,200 @@
+"""
+Monthly range partitions of ExposureSnapshot (Postgres declarative partitioning).
+
+Since migration 0005, exposure_exposuresnapshot is PARTITION BY RANGE (date).
+It has one partition per calendar month, named exposure_exposuresnapshot_pYYYYMM,
+plus a DEFAULT partition that catches any date no month covers, so inserts never
+fail. Date-range filters prune to the overlapping months. Vacuum and index
+maintenance also run per month instead of over the whole history. The model and
+the queries are unchanged.
+
+- ensure_partitions(): create the months a write is about to touch. ingest calls
+  it per batch (memoized per process). Rows already sitting in DEFAULT for such a
+  month are moved into the new partition.
+- ensure_future_partitions(): premake the next EXPOSURE_PARTITION_PREMAKE_MONTHS
+  months (celery-beat, daily).
+- split_default(): move whatever landed in DEFAULT into monthly partitions.
+- detach_old_partitions(): when EXPOSURE_PARTITION_RETAIN_MONTHS is set, archive
+  months older than that (archive.write_month) and DETACH them. ExposureRollup
+  keeps their weekly and monthly totals. Detached tables are renamed
+  *_detached_pYYYYMM and are dropped only with EXPOSURE_PARTITION_DROP_DETACHED.
+"""
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from django.conf import settings
+from django.db import connection, transaction
+from .cache import bump_dates
+from .models import ExposureSnapshot
+from .rollups import month_start, next_month
+
+PARENT = ExposureSnapshot._meta.db_table
+DEFAULT = f"{PARENT}_pdefault"
+COLUMNS = "id, date, keyword_id, impressions, clicks, position"
+# GSC keeps 16 months of data; detaching newer months would make coverage re-pull them
+MIN_RETAIN_MONTHS = 16
+# pg_advisory_xact_lock key serializing partition DDL across workers
+_LOCK_KEY = 0x45585053
+_BOUND = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+# months known to have a partition in this process
+_known: Set[date] = set()
+_partitioned: Dict[str, bool] = {}
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def detached_name(month: date) -> str:
+    return f"{PARENT}_detached_p{month:%Y%m}"
+
+
+def is_partitioned() -> bool:
+    if PARENT not in _partitioned:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                           [PARENT])
+            _partitioned[PARENT] = cursor.fetchone()[0]
+    return _partitioned[PARENT]
+
+
+def list_partitions() -> List[Dict]:
+    """
+    Returns: [{'name': str, 'month': date | None (DEFAULT), 'rows': int (estimate), 'bytes': int}, ...]
+    ordered by month, DEFAULT first.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, "
+            "pg_total_relation_size(c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [PARENT],
+        )
+        rows = cursor.fetchall()
+    out = []
+    for name, bound, tuples, size in rows:
+        m = _BOUND.search(bound or "")
+        out.append({"name": name, "month": date.fromisoformat(m.group(1)) if m else None,
+                    "rows": max(0, tuples), "bytes": size})
+    return sorted(out, key=lambda p: (p["month"] is not None, p["month"] or date.min))
+
+
+def _create(cursor, month: date) -> int:
+    """Create one monthly partition; returns how many rows were moved out of DEFAULT."""
+    q = connection.ops.quote_name
+    name, lo, hi = partition_name(month), month, next_month(month)
+    bound = f"FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {q(DEFAULT)} WHERE date >= %s AND date < %s)", [lo, hi])
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {q(name)} PARTITION OF {q(PARENT)} FOR VALUES {bound}")
+        return 0
+    # DEFAULT 已有該月資料時 PARTITION OF 會失敗：先建獨立表、把資料搬過去再 ATTACH
+    # （CHECK 讓 ATTACH 不必再掃一次新表）
+    cursor.execute(f"CREATE TABLE {q(name)} (LIKE {q(PARENT)} INCLUDING DEFAULTS)")
+    cursor.execute(f"ALTER TABLE {q(name)} ADD CONSTRAINT {q(name + '_bound')} "
+                   f"CHECK (date >= '{lo.isoformat()}' AND date < '{hi.isoformat()}')")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {q(DEFAULT)} WHERE date >= %s AND date < %s RETURNING {COLUMNS}) "
+        f"INSERT INTO {q(name)} ({COLUMNS}) SELECT {COLUMNS} FROM moved",
+        [lo, hi],
+    )
+    moved = cursor.rowcount
+    cursor.execute(f"ALTER TABLE {q(PARENT)} ATTACH PARTITION {q(name)} FOR VALUES {bound}")
+    cursor.execute(f"ALTER TABLE {q(name)} DROP CONSTRAINT {q(name + '_bound')}")
+    return moved
+
+
+def ensure_partitions(dates: Iterable[date]) -> List[str]:
+    """Create the monthly partitions covering `dates` that do not exist yet; returns their names."""
+    months = {month_start(d) for d in dates} - _known
+    if not months or not is_partitioned():
+        return []
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_LOCK_KEY])
+        existing = {p["month"] for p in list_partitions()}
+        for m in sorted(months - existing):
+            _create(cursor, m)
+            created.append(partition_name(m))
+    _known.update(months)
+    return created
+
+
+def ensure_future_partitions(today: Optional[date] = None, months: Optional[int] = None) -> List[str]:
+    """Current month + the next `months` (EXPOSURE_PARTITION_PREMAKE_MONTHS)."""
+    months = getattr(settings, "EXPOSURE_PARTITION_PREMAKE_MONTHS", 3) if months is None else months
+    m = month_start(today or date.today())
+    wanted = [m]
+    for _ in range(max(0, months)):
+        m = next_month(m)
+        wanted.append(m)
+    return ensure_partitions(wanted)
+
+
+def split_default() -> List[str]:
+    """Move rows that landed in DEFAULT (months written before their partition existed) into monthly partitions."""
+    if not is_partitioned():
+        return []
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', date)::date FROM {q(DEFAULT)}")
+        months = [r[0] for r in cursor.fetchall()]
+    _known.difference_update(months)
+    return ensure_partitions(months)
+
+
+def detach_old_partitions(retain_months: Optional[int] = None, today: Optional[date] = None,
+                          drop: Optional[bool] = None) -> List[Dict]:
+    """
+    Archive and detach monthly partitions older than `retain_months` (0 = keep everything).
+
+    Returns: [{'month': 'YYYY-MM', 'table': detached table | None, 'archive_written': bool, 'dropped': bool}, ...]
+    """
+    from .archive import load_manifest, write_month
+
+    retain = getattr(settings, "EXPOSURE_PARTITION_RETAIN_MONTHS", 0) if retain_months is None else retain_months
+    drop = getattr(settings, "EXPOSURE_PARTITION_DROP_DETACHED", False) if drop is None else drop
+    if not retain or not is_partitioned():
+        return []
+    cutoff = month_start(today or date.today())
+    for _ in range(max(int(retain), MIN_RETAIN_MONTHS)):
+        cutoff = month_start(cutoff - timedelta(days=1))
+
+    q = connection.ops.quote_name
+    out = []
+    for p in list_partitions():
+        month = p["month"]
+        if month is None or month >= cutoff:
+            continue
+        # 先確定該月已封存成檔案，才從線上表移除
+        written = f"{month:%Y-%m}" not in load_manifest()
+        if written:
+            write_month(month, getattr(settings, "EXPOSURE_ARCHIVE_FORMAT", "parquet"))
+        table = detached_name(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_LOCK_KEY])
+            cursor.execute(f"ALTER TABLE {q(PARENT)} DETACH PARTITION {q(p['name'])}")
+            if drop:
+                cursor.execute(f"DROP TABLE {q(p['name'])}")
+            else:
+                cursor.execute(f"ALTER TABLE {q(p['name'])} RENAME TO {q(table)}")
+        _known.discard(month)
+        bump_dates({month + timedelta(days=i) for i in range((next_month(month) - month).days)})
+        out.append({"month": f"{month:%Y-%m}", "table": None if drop else table,
+                    "archive_written": written, "dropped": bool(drop)})
+    return out
+
+
+def maintain_partitions(today: Optional[date] = None) -> Dict:
+    """
+    Daily upkeep (celery-beat): premake future months, empty DEFAULT, apply the retention policy.
+
+    Returns: {'created': [name, ...], 'split': [name, ...], 'detached': [...]}
+    """
+    return {
+        "created": ensure_future_partitions(today),
+        "split": split_default(),
+        "detached": detach_old_partitions(today=today),
+    }
@@ -0,0 +1,202 @@
+"""
+Concurrent GSC pull engine.
+
+Fetch units run on a bounded thread pool. Every Search Analytics request
+goes through a shared CallPolicy (token-bucket rate limit + exponential
+backoff on 429/5xx). Fetched rows are handed to the calling thread through
+a queue and written with ingest.upsert_snapshots, so network and DB work
+overlap and only the calling thread touches the Django connection.
+"""
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from django.conf import settings
+from googleapiclient.errors import HttpError
+from .ingest import after_write, upsert_snapshots, gsc_rows_to_snapshots
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    resp = getattr(exc, "resp", None)
+    try:
+        return float(resp.get("retry-after")) if resp is not None and resp.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, HttpError):
+        return int(getattr(exc.resp, "status", 0)) in RETRYABLE_STATUS
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+class CallPolicy:
+    """Rate limit + retry wrapper passed to gsc_client as `policy`."""
+
+    def __init__(self, bucket: Optional[TokenBucket] = None, retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 32.0, sleep=time.sleep):
+        self.bucket = bucket
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retried = 0
+
+    def call(self, fn):
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            with self._lock:
+                self.calls += 1
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    # full jitter 指數退避
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                with self._lock:
+                    self.retried += 1
+                self._sleep(delay)
+
+
+def default_policy() -> CallPolicy:
+    qps = getattr(settings, "GSC_QPS", 10)
+    bucket = TokenBucket(qps, capacity=getattr(settings, "GSC_QPS_BURST", qps)) if qps else None
+    return CallPolicy(bucket, retries=getattr(settings, "GSC_MAX_RETRIES", 5))
+
+
+def run_pull(property_uri: str, units: List, kw_ids: Dict[str, int],
+             start: date = None, end: date = None, workers: Optional[int] = None,
+             batch_size: Optional[int] = None, policy: Optional[CallPolicy] = None,
+             service=None, today: Optional[date] = None) -> dict:
+    """
+    Fetch `units` (gsc_auto_pull.FetchUnit) concurrently and upsert the rows.
+    Rows outside [start, end] are dropped when start/end are given.
+    Days a unit fetched without getting a row back are written as 0-impression
+    rows (up to today - GSC_SYNC_LAG_DAYS, GSC may still fill in later days),
+    so coverage treats them as present. `today` defaults to date.today();
+    sync.incremental_sync passes its own so a pinned day cuts off the same way.
+
+    Returns: {
+        'keywords_pulled': int,
+        'inserted': int,
+        'updated': int,
+        'statements': int,
+        'api_calls': int,
+        'dates': set of dates written,
+        'errors': [(unit or None for write errors, exception), ...],
+    }
+    """
+    from .gsc_auto_pull import fetch_unit
+
+    workers = max(1, int(workers or getattr(settings, "GSC_PULL_WORKERS", 4)))
+    size = batch_size or getattr(settings, "GSC_INGEST_BATCH_SIZE", 5000)
+    policy = policy or default_policy()
+    out_q: "queue.Queue" = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    # GSC 尚未出資料的最近幾天不補 0（之後抓到真值時才寫入）
+    zero_until = (today or date.today()) - timedelta(days=getattr(settings, "GSC_SYNC_LAG_DAYS", 1))
+
+    result = {"keywords_pulled": 0, "inserted": 0, "updated": 0, "statements": 0,
+              "api_calls": 0, "dates": set(), "errors": []}
+
+    def _work(unit):
+        if stop.is_set():
+            return
+        try:
+            out_q.put(("ok", unit, fetch_unit(property_uri, unit, service=service, policy=policy)))
+        except Exception as e:
+            out_q.put(("error", unit, e))
+
+    buf: List[dict] = []
+    written_kw_ids: set = set()
+
+    def _flush():
+        if not buf:
+            return
+        try:
+            written = upsert_snapshots(buf, batch_size=size, refresh=False)
+        except Exception as e:
+            # 寫入失敗不可中斷迴圈，否則 worker 會卡在滿的 queue 上
+            result["errors"].append((None, e))
+        else:
+            for k in ("inserted", "updated", "statements"):
+                result[k] += written[k]
+            result["dates"] |= written["dates"]
+            written_kw_ids.update(written["keyword_ids"])
+        buf.clear()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gsc-pull") as pool:
+        futures = [pool.submit(_work, unit) for unit in units]
+        try:
+            for _ in range(len(units)):
+                status, unit, payload = out_q.get()
+                if status == "error":
+                    result["errors"].append((unit, payload))
+                    continue
+                for kw_name, rows in payload.items():
+                    kw_id = kw_ids.get(kw_name)
+                    if kw_id is None:
+                        # GSC 回了不在追蹤清單的關鍵字（空字串 / 名稱不符）：略過
+                        continue
+                    lo = max(unit.start, start) if start else unit.start
+                    hi = min(unit.end, end) if end else unit.end
+                    buf.extend(gsc_rows_to_snapshots(kw_id, rows, lo, hi, zero_fill_until=zero_until))
+                result["keywords_pulled"] += len(payload)
+                if len(buf) >= size:
+                    _flush()
+            _flush()
+        finally:
+            # 迴圈提早離開（例外）時，worker 可能卡在滿的 queue 上：
+            # 停掉還沒開始的 unit，並把 queue 清到所有 worker 結束，executor 才關得掉
+            stop.set()
+            for f in futures:
+                f.cancel()
+            while not all(f.done() for f in futures):
+                try:
+                    out_q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    try:
+        after_write(result["dates"], written_kw_ids)
+    except Exception as e:
+        result["errors"].append((None, e))
+    result["api_calls"] = policy.calls
+    return result
@@ -0,0 +1,88 @@
+"""
+Top-N keyword ranking over the rollup tables.
+
+Scoring, the eligibility floor, ordering and LIMIT all run in one SQL
+statement over rollups.period_totals_sql, so Postgres keeps only the top N
+(top-N heapsort) and N rows come back to Python whatever the keyword count.
+The per-keyword SUM over the range still visits every keyword with data,
+so the query cost grows with K; only the transfer and selection are O(N).
+
+Metrics:
+- impressions / clicks: period totals
+- ctr: clicks / impressions
+- position_gain: average position of the previous period of equal length
+  minus that of [start, end] (positive = moved up)
+
+Ratio metrics ignore keywords below `min_impressions` in the period so a
+single lucky click on a long-tail query does not top the chart.
+Ties: lower keyword_id first.
+"""
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.db import connection
+from .models import Keyword
+from .rollups import period_totals_sql
+
+METRICS = ("impressions", "clicks", "ctr", "position_gain")
+MAX_N = 100
+
+_SCORE_SQL = {
+    "impressions": "impressions::float8",
+    "clicks": "clicks::float8",
+    "ctr": "clicks::float8 / impressions",
+}
+
+
+def _min_impressions(metric: str, min_impressions: Optional[int]) -> int:
+    if min_impressions is not None:
+        return max(0, int(min_impressions))
+    if metric in ("ctr", "position_gain"):
+        return int(getattr(settings, "EXPOSURE_RANK_MIN_IMPRESSIONS", 10))
+    return 0
+
+
+def _top_sql(metric: str, start: date, end: date, floor: int, n: int) -> Optional[Tuple[str, list]]:
+    """(sql, params) returning (keyword_id, score) rows, best first, at most n."""
+    cur = period_totals_sql(start, end)
+    if cur is None:
+        return None
+    cur_sql, params = cur
+    if metric == "position_gain":
+        span = (end - start).days + 1
+        prev = period_totals_sql(start - timedelta(days=span), start - timedelta(days=1))
+        if prev is None:
+            return None
+        prev_sql, prev_params = prev
+        sql = (f"SELECT c.keyword_id, p.position_weighted / p.impressions - c.position_weighted / c.impressions "
+               f"AS score FROM ({cur_sql}) c JOIN ({prev_sql}) p ON p.keyword_id = c.keyword_id "
+               "WHERE c.impressions > 0 AND c.impressions >= %s AND p.impressions > 0")
+        params = params + prev_params + [floor]
+    else:
+        positive = " AND impressions > 0" if metric == "ctr" else ""
+        sql = (f"SELECT keyword_id, {_SCORE_SQL[metric]} AS score FROM ({cur_sql}) t "
+               f"WHERE impressions >= %s{positive}")
+        params = params + [floor]
+    return f"{sql} ORDER BY score DESC, keyword_id LIMIT %s", params + [n]
+
+
+def rank_keywords(start: date, end: date, n: int = 5, metric: str = "impressions",
+                  min_impressions: Optional[int] = None) -> List[Tuple[int, str, float]]:
+    """期間排名 Top-N，回傳 [(keyword_id, name, score), ...]（score 由大到小）"""
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+    n = max(1, min(int(n), MAX_N))
+    query = _top_sql(metric, start, end, _min_impressions(metric, min_impressions), n)
+    if query is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(*query)
+        top = [(float(score), kid) for kid, score in cursor.fetchall()]
+    names = dict(Keyword.objects.filter(id__in=[k for _, k in top]).values_list("id", "name"))
+    return [(k, names[k], s) for s, k in top if k in names]
+
+
+def top_keywords(start: date, end: date, n: int = 5) -> List[Tuple[int, str]]:
+    """期間合計曝光 Top-N，回傳 [(keyword_id, name), ...]"""
+    return [(k, name) for k, name, _ in rank_keywords(start, end, n, "impressions")]
+
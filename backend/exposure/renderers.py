@@ -0,0 +1,28 @@
+"""
+Extra DRF renderers for the exposure API.
+
+MsgPackRenderer serves application/msgpack (Accept header or ?format=msgpack).
+msgpack is optional: views only offer the renderer when it is installed.
+"""
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on deployment
+    msgpack = None
+
+
+class MsgPackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    @staticmethod
+    def available() -> bool:
+        return msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, use_bin_type=True)
@@ -0,0 +1,271 @@
+"""
+Weekly / monthly rollups of ExposureSnapshot.
+
+ExposureRollup holds per-keyword totals for each ISO week (Monday start) and
+calendar month. Period totals for any [start, end] are assembled from the
+full months inside the range, the full weeks left at its edges and at most
+six stray days per side from the daily table, so a 2-year range touches
+~24 + a few rows per keyword instead of ~730.
+
+The same rollups serve coarse time series: iter_bucket_totals() returns one
+row per keyword per ISO week or calendar month, reading whole periods from
+ExposureRollup and only the clipped edge periods from the daily table.
+
+Rollups are refreshed by the ingestion path (ingest.after_write) and can be
+rebuilt with the rollup_backfill command.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from django.db import connection
+from .models import ExposureRollup, ExposureSnapshot
+
+GRAINS = (ExposureRollup.GRAIN_WEEK, ExposureRollup.GRAIN_MONTH)
+
+
+class Totals(NamedTuple):
+    impressions: int
+    clicks: int
+    position_weighted: float  # sum(position * impressions)
+    days: int
+
+    @property
+    def ctr(self) -> float:
+        return self.clicks / self.impressions if self.impressions else 0.0
+
+    @property
+    def position(self) -> Optional[float]:
+        return self.position_weighted / self.impressions if self.impressions else None
+
+
+def week_start(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def period_start(grain: str, d: date) -> date:
+    return week_start(d) if grain == ExposureRollup.GRAIN_WEEK else month_start(d)
+
+
+def period_end(grain: str, start: date) -> date:
+    """Last day of the period beginning at `start`."""
+    if grain == ExposureRollup.GRAIN_WEEK:
+        return start + timedelta(days=6)
+    return next_month(start) - timedelta(days=1)
+
+
+def _tables():
+    q = connection.ops.quote_name
+    return q(ExposureRollup._meta.db_table), q(ExposureSnapshot._meta.db_table)
+
+
+def _clusters(starts: Iterable[date], grain: str) -> List[Tuple[date, date]]:
+    """把相鄰的 period 合併成連續日期區間，減少 statement 數"""
+    out: List[Tuple[date, date]] = []
+    for s in sorted(set(starts)):
+        e = period_end(grain, s)
+        if out and s <= out[-1][1] + timedelta(days=1):
+            out[-1] = (out[-1][0], max(out[-1][1], e))
+        else:
+            out.append((s, e))
+    return out
+
+
+def refresh_rollups(dates: Iterable[date], keyword_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the week and month rollups that contain any of `dates`
+    (restricted to keyword_ids when given). Returns statements executed.
+    """
+    dates = set(dates)
+    if not dates:
+        return 0
+    kw = sorted(set(keyword_ids)) if keyword_ids is not None else None
+    rollup, snap = _tables()
+    n = 0
+    with connection.cursor() as cursor:
+        for grain in GRAINS:
+            trunc = "week" if grain == ExposureRollup.GRAIN_WEEK else "month"
+            for lo, hi in _clusters((period_start(grain, d) for d in dates), grain):
+                params = [grain, lo, hi]
+                kw_sql = ""
+                if kw is not None:
+                    kw_sql = " AND keyword_id = ANY(%s)"
+                    params.append(kw)
+                cursor.execute(
+                    f"INSERT INTO {rollup} (grain, period_start, keyword_id, impressions, clicks, position_weighted, days) "
+                    f"SELECT %s, date_trunc('{trunc}', date)::date, keyword_id, SUM(impressions), "
+                    "COALESCE(SUM(clicks), 0), COALESCE(SUM(position * impressions), 0), COUNT(*) "
+                    f"FROM {snap} WHERE date >= %s AND date <= %s{kw_sql} "
+                    "GROUP BY 2, 3 "
+                    "ON CONFLICT (grain, period_start, keyword_id) DO UPDATE SET "
+                    "impressions = EXCLUDED.impressions, clicks = EXCLUDED.clicks, "
+                    "position_weighted = EXCLUDED.position_weighted, days = EXCLUDED.days",
+                    params,
+                )
+                n += 1
+    return n
+
+
+def backfill_rollups(start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Rebuild rollups for [start, end] (default: whole table) for all keywords."""
+    _, snap = _tables()
+    if start is None or end is None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(date), MAX(date) FROM {snap}")
+            lo, hi = cursor.fetchone()
+        if lo is None:
+            return 0
+        start, end = start or lo, end or hi
+    # 一次只給每個 period 一個代表日期即可
+    reps = [month_start(start)]
+    while reps[-1] < end:
+        reps.append(next_month(reps[-1]))
+    weeks = [week_start(start)]
+    while weeks[-1] + timedelta(days=7) <= end:
+        weeks.append(weeks[-1] + timedelta(days=7))
+    return refresh_rollups(reps + weeks)
+
+
+def decompose(start: date, end: date) -> Tuple[List[date], List[date], List[Tuple[date, date]]]:
+    """
+    Split [start, end] into (full month starts, full week starts, leftover day ranges).
+    """
+    months: List[date] = []
+    m = month_start(start)
+    if m < start:
+        m = next_month(m)
+    head_end, tail_start = end, end + timedelta(days=1)
+    while next_month(m) - timedelta(days=1) <= end:
+        months.append(m)
+        m = next_month(m)
+    if months:
+        head_end = months[0] - timedelta(days=1)
+        tail_start = next_month(months[-1])
+
+    weeks: List[date] = []
+    days: List[Tuple[date, date]] = []
+
+    def _edge(lo: date, hi: date):
+        if lo > hi:
+            return
+        w = week_start(lo)
+        if w < lo:
+            w += timedelta(days=7)
+        first_w = w
+        while w + timedelta(days=6) <= hi:
+            weeks.append(w)
+            w += timedelta(days=7)
+        if w == first_w:
+            days.append((lo, hi))
+            return
+        if lo < first_w:
+            days.append((lo, first_w - timedelta(days=1)))
+        if w <= hi:
+            days.append((w, hi))
+
+    _edge(start, head_end)
+    if months:
+        _edge(tail_start, end)
+    return months, weeks, days
+
+
+def period_totals_sql(start: date, end: date,
+                      keyword_ids: Optional[Iterable[int]] = None) -> Optional[Tuple[str, list]]:
+    """
+    (sql, params) of one query over rollups + edge days with columns
+    keyword_id, impressions, clicks, position_weighted, days (one row per
+    keyword); None when the range is empty. Callers can wrap it to filter /
+    order / limit in SQL (ranking).
+    """
+    months, weeks, days = decompose(start, end)
+    rollup, snap = _tables()
+    parts, params = [], []
+    kw = sorted(set(keyword_ids)) if keyword_ids is not None else None
+    kw_sql = " AND keyword_id = ANY(%s)" if kw is not None else ""
+
+    for grain, starts in ((ExposureRollup.GRAIN_MONTH, months), (ExposureRollup.GRAIN_WEEK, weeks)):
+        if starts:
+            parts.append(f"SELECT keyword_id, impressions, clicks, position_weighted, days FROM {rollup} "
+                         f"WHERE grain = %s AND period_start = ANY(%s){kw_sql}")
+            params += [grain, starts] + ([kw] if kw is not None else [])
+    for lo, hi in days:
+        parts.append(f"SELECT keyword_id, impressions, COALESCE(clicks, 0) AS clicks, "
+                     f"COALESCE(position, 0) * impressions AS position_weighted, 1 AS days FROM {snap} "
+                     f"WHERE date >= %s AND date <= %s{kw_sql}")
+        params += [lo, hi] + ([kw] if kw is not None else [])
+    if not parts:
+        return None
+
+    sql = ("SELECT keyword_id, SUM(impressions) AS impressions, SUM(clicks) AS clicks, "
+           "SUM(position_weighted) AS position_weighted, SUM(days) AS days "
+           f"FROM ({' UNION ALL '.join(parts)}) t GROUP BY keyword_id")
+    return sql, params
+
+
+def iter_period_totals(start: date, end: date,
+                       keyword_ids: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Totals]]:
+    """Stream (keyword_id, Totals) for [start, end] from one query over rollups + edge days."""
+    query = period_totals_sql(start, end, keyword_ids)
+    if query is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(*query)
+        for r in cursor:
+            yield r[0], Totals(int(r[1] or 0), int(r[2] or 0), float(r[3] or 0), int(r[4] or 0))
+
+
+def period_totals(start: date, end: date, keyword_ids: Optional[Iterable[int]] = None) -> Dict[int, Totals]:
+    """{keyword_id: Totals} for [start, end] in one query over rollups + edge days."""
+    return dict(iter_period_totals(start, end, keyword_ids))
+
+
+def buckets(start: date, end: date, grain: str) -> List[Tuple[date, date]]:
+    """[start, end] split into day / week / month buckets, the edge buckets clipped to the range."""
+    if grain == "day":
+        return [(start + timedelta(days=i),) * 2 for i in range((end - start).days + 1)]
+    out: List[Tuple[date, date]] = []
+    s = period_start(grain, start)
+    while s <= end:
+        e = period_end(grain, s)
+        out.append((max(s, start), min(e, end)))
+        s = e + timedelta(days=1)
+    return out
+
+
+def iter_bucket_totals(start: date, end: date, grain: str,
+                       keyword_ids: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, date, Totals]]:
+    """
+    Stream (keyword_id, bucket start, Totals) for the week / month buckets of
+    [start, end] from one query: whole periods from the rollups, clipped edge
+    buckets summed from the daily table. Bucket start = first day inside the range.
+    """
+    rollup, snap = _tables()
+    kw = sorted(set(keyword_ids)) if keyword_ids is not None else None
+    kw_sql = " AND keyword_id = ANY(%s)" if kw is not None else ""
+    kw_params = [kw] if kw is not None else []
+    full, parts, params = [], [], []
+    for lo, hi in buckets(start, end, grain):
+        if lo == period_start(grain, lo) and hi == period_end(grain, lo):
+            full.append(lo)
+            continue
+        parts.append("SELECT keyword_id, %s::date AS bucket, SUM(impressions) AS impressions, "
+                     "COALESCE(SUM(clicks), 0) AS clicks, COALESCE(SUM(position * impressions), 0) AS position_weighted, "
+                     f"COUNT(*) AS days FROM {snap} WHERE date >= %s AND date <= %s{kw_sql} GROUP BY keyword_id")
+        params += [lo, lo, hi] + kw_params
+    if full:
+        parts.insert(0, "SELECT keyword_id, period_start AS bucket, impressions, clicks, position_weighted, days "
+                        f"FROM {rollup} WHERE grain = %s AND period_start = ANY(%s){kw_sql}")
+        params = [grain, full] + kw_params + params
+    if not parts:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(parts), params)
+        for r in cursor:
+            yield r[0], r[1], Totals(int(r[2] or 0), int(r[3] or 0), float(r[4] or 0), int(r[5] or 0))
@@ -0,0 +1,107 @@
+"""
+Compact keywords x days container for exposure series.
+
+SeriesGrid keeps one contiguous NumPy row per keyword with one column per
+bucket. At daily resolution cells are filled by (date - start).days; at
+weekly / monthly resolution by the bucket's start date (the first day of
+the ISO week or month inside the range). Date strings are only produced
+once, when the grid is serialized.
+
+pick_resolution() chooses the bucket size from the range length so a
+series never has more than ~90 points: daily up to EXPOSURE_DAILY_MAX_DAYS,
+weekly up to EXPOSURE_WEEKLY_MAX_DAYS, monthly beyond.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from django.conf import settings
+from .rollups import buckets
+
+RESOLUTIONS = ("day", "week", "month")
+
+
+def pick_resolution(days: int, requested: Optional[str] = None) -> str:
+    """
+    Resolution for a range of `days`. An explicit `requested` resolution is
+    honoured when it is at least as coarse as the automatic one.
+    """
+    if days <= int(getattr(settings, "EXPOSURE_DAILY_MAX_DAYS", 90)):
+        auto = "day"
+    elif days <= int(getattr(settings, "EXPOSURE_WEEKLY_MAX_DAYS", 366)):
+        auto = "week"
+    else:
+        auto = "month"
+    if requested in RESOLUTIONS and RESOLUTIONS.index(requested) > RESOLUTIONS.index(auto):
+        return requested
+    return auto
+
+
+class SeriesGrid:
+    def __init__(self, start: date, end: date, names: Sequence[str],
+                 dtype=np.int64, fill=0, resolution: str = "day"):
+        self.start = start
+        self.end = end
+        self.names = list(names)
+        self.resolution = resolution
+        self.n_days = max(0, (end - start).days + 1)
+        # 日解析度用日期位移定位，週 / 月則以 bucket 起日查表
+        self.buckets = None if resolution == "day" else buckets(start, end, resolution)
+        self._col = None if self.buckets is None else {lo: i for i, (lo, _) in enumerate(self.buckets)}
+        n_cols = self.n_days if self.buckets is None else len(self.buckets)
+        self.values = np.full((len(self.names), n_cols), fill, dtype=dtype)
+        self._row = {name: i for i, name in enumerate(self.names)}
+        self._dates: Optional[List[str]] = None
+
+    @property
+    def dates(self) -> List[str]:
+        """Column labels: each day, or the first day of each bucket inside the range."""
+        if self._dates is None:
+            if self.buckets is None:
+                self._dates = [(self.start + timedelta(days=i)).isoformat() for i in range(self.n_days)]
+            else:
+                self._dates = [lo.isoformat() for lo, _ in self.buckets]
+        return self._dates
+
+    @property
+    def bucket_days(self) -> List[int]:
+        """Days covered by each column (edge weeks / months may be partial)."""
+        if self.buckets is None:
+            return [1] * self.n_days
+        return [(hi - lo).days + 1 for lo, hi in self.buckets]
+
+    def row(self, name: str) -> np.ndarray:
+        return self.values[self._row[name]]
+
+    def fill_rows(self, rows: Iterable[Tuple[int, date, object]]) -> None:
+        """rows: (row index, date or bucket start, value); dates outside the grid are ignored."""
+        idx, off, vals = [], [], []
+        start, n, col = self.start, self.n_days, self._col
+        for i, d, v in rows:
+            o = (d - start).days if col is None else col.get(d, -1)
+            if 0 <= o < n and v is not None:
+                idx.append(i)
+                off.append(o)
+                vals.append(v)
+        if idx:
+            self.values[idx, off] = vals
+
+    def as_float(self) -> np.ndarray:
+        return self.values.astype(np.float64, copy=False)
+
+    def data(self) -> List[List]:
+        """Rows as JSON-ready lists (NaN -> None for float grids)."""
+        rows = self.values.tolist()
+        if self.values.dtype.kind == "f" and np.isnan(self.values).any():
+            rows = [[None if v != v else v for v in row] for row in rows]
+        return rows
+
+    def series(self) -> List[Dict]:
+        """[{'name': kw, 'data': [...]}, ...] in rank order."""
+        return [{"name": name, "data": row} for name, row in zip(self.names, self.data())]
+
+    def csv_rows(self) -> Iterator[List]:
+        """Header + one row per date: [date, kw1, kw2, ...]."""
+        yield ["date"] + self.names
+        cols = self.values.T.tolist()
+        for dt, row in zip(self.dates, cols):
+            yield [dt] + ["" if v != v else v for v in row]
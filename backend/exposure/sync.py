@@ -0,0 +1,88 @@
+"""
+Incremental, watermark-based GSC sync (run daily by celery-beat).
+
+Each keyword keeps a SyncWatermark: the last date whose data GSC will no
+longer revise. A run fetches from the day after the watermark (or the last
+GSC_SYNC_REFETCH_DAYS days, whichever is earlier) up to yesterday, bulk
+writes the rows and moves the watermark to (yesterday - refetch window).
+Keywords without a watermark start GSC_SYNC_INITIAL_DAYS back.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+from django.conf import settings
+from .gsc_auto_pull import plan_fetch_units
+from .ingest import ensure_keywords
+from .models import Keyword, SyncWatermark
+from .pull_engine import run_pull
+
+
+def sync_keywords() -> List[str]:
+    """Enabled keywords in the DB plus the configured track list."""
+    names = list(Keyword.objects.filter(enabled=True).values_list("name", flat=True))
+    return list(dict.fromkeys(names + list(settings.KEYWORD_TRACK_LIST)))
+
+
+def plan_spans(keywords: List[str], kw_ids: Dict[str, int], today: date) -> Tuple[Dict[str, Tuple[date, date]], date]:
+    """{keyword: (fetch_start, fetch_end)} and the watermark to store after success."""
+    fetch_end = today - timedelta(days=getattr(settings, "GSC_SYNC_LAG_DAYS", 1))
+    refetch = max(0, getattr(settings, "GSC_SYNC_REFETCH_DAYS", 3))
+    initial = max(1, getattr(settings, "GSC_SYNC_INITIAL_DAYS", 30))
+    new_watermark = fetch_end - timedelta(days=refetch)
+
+    marks = dict(SyncWatermark.objects
+                 .filter(keyword_id__in=kw_ids.values())
+                 .values_list("keyword_id", "last_complete_date"))
+    refetch_start = fetch_end - timedelta(days=refetch - 1) if refetch else fetch_end + timedelta(days=1)
+    spans = {}
+    for kw in keywords:
+        wm = marks.get(kw_ids[kw])
+        start = fetch_end - timedelta(days=initial - 1) if wm is None else min(wm + timedelta(days=1), refetch_start)
+        if start <= fetch_end:
+            spans[kw] = (start, fetch_end)
+    return spans, new_watermark
+
+
+def incremental_sync(today: date = None, keywords: List[str] = None, workers: int = None) -> dict:
+    """
+    Returns: {
+        'keywords': int, 'fetched_keywords': int, 'inserted': int, 'updated': int,
+        'api_calls': int, 'watermark': 'YYYY-MM-DD', 'errors': [str, ...]
+    }
+    """
+    today = today or date.today()
+    keywords = keywords or sync_keywords()
+    kw_ids = ensure_keywords(keywords)
+    spans, new_watermark = plan_spans(keywords, kw_ids, today)
+
+    result = {"keywords": len(keywords), "fetched_keywords": len(spans), "inserted": 0, "updated": 0,
+              "api_calls": 0, "watermark": new_watermark.isoformat(), "errors": []}
+    if not spans:
+        return result
+
+    first = min(s for s, _ in spans.values())
+    last = max(e for _, e in spans.values())
+    units = plan_fetch_units(first, last, list(spans), spans)
+    pulled = run_pull(settings.GSC_PROPERTY_URI, units, kw_ids, workers=workers, today=today)
+    for k in ("inserted", "updated", "api_calls"):
+        result[k] = pulled[k]
+
+    failed = set()
+    for unit, exc in pulled["errors"]:
+        if unit is None:
+            # 寫入失敗：這次不推進任何 watermark
+            failed.update(spans)
+            result["errors"].append(f"write: {exc}")
+        else:
+            failed.update(unit.keywords)
+            result["errors"].append(f"{', '.join(unit.keywords[:3])}: {exc}")
+
+    # 只推進成功的關鍵字，且不倒退
+    advance = {kw_ids[kw] for kw in spans if kw not in failed}
+    advance -= set(SyncWatermark.objects
+                   .filter(keyword_id__in=advance, last_complete_date__gte=new_watermark)
+                   .values_list("keyword_id", flat=True))
+    SyncWatermark.objects.bulk_create(
+        [SyncWatermark(keyword_id=i, last_complete_date=new_watermark) for i in advance],
+        update_conflicts=True, unique_fields=["keyword"], update_fields=["last_complete_date", "updated_at"],
+    )
+    return result
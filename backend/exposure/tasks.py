@@ -1,4 +1,43 @@
+from datetime import date
 from celery import shared_task
+from django.conf import settings
+
 @shared_task
 def ping():
     return "pong"
+
+@shared_task(time_limit=settings.GSC_PULL_TASK_TIME_LIMIT,
+             soft_time_limit=settings.GSC_PULL_TASK_TIME_LIMIT - 30)
+def pull_gsc_range(start: str, end: str, keywords, spans=None):
+    """背景拉取 GSC：spans = {keyword: [start_iso, end_iso]}（由 jobs.request_pull 排入）"""
+    from .gsc_auto_pull import pull_gsc_data_for_range
+    from .jobs import release_job
+    try:
+        spans = {kw: (date.fromisoformat(s), date.fromisoformat(e)) for kw, (s, e) in (spans or {}).items()}
+        return pull_gsc_data_for_range(date.fromisoformat(start), date.fromisoformat(end), keywords,
+                                       spans=spans or None)
+    finally:
+        release_job(pull_gsc_range.request.id)
+
+@shared_task(time_limit=settings.GSC_PULL_TASK_TIME_LIMIT,
+             soft_time_limit=settings.GSC_PULL_TASK_TIME_LIMIT - 30)
+def incremental_gsc_sync():
+    """celery-beat 每日排程：依 watermark 只抓新日期 + 重抓尚未定案的最近幾天"""
+    from .sync import incremental_sync
+    return incremental_sync()
+
+@shared_task(time_limit=settings.GSC_PULL_TASK_TIME_LIMIT,
+             soft_time_limit=settings.GSC_PULL_TASK_TIME_LIMIT - 30)
+def archive_exposure_months(start: str = None, end: str = None, fmt: str = None, force: bool = False):
+    """把已定案的月份寫成 Parquet / Arrow 檔（已封存的月份跳過）"""
+    from .archive import archive_months
+    return archive_months(date.fromisoformat(start) if start else None,
+                          date.fromisoformat(end) if end else None,
+                          fmt or settings.EXPOSURE_ARCHIVE_FORMAT, force=force)
+
+@shared_task(time_limit=settings.GSC_PULL_TASK_TIME_LIMIT,
+             soft_time_limit=settings.GSC_PULL_TASK_TIME_LIMIT - 30)
+def maintain_exposure_partitions():
+    """celery-beat 每日：預建未來月份 partition、把 DEFAULT 內的資料移到月份 partition、依保留期限 detach"""
+    from .partitions import maintain_partitions
+    return maintain_partitions()
@@ -0,0 +1,107 @@
+import importlib.util
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from django.test import TestCase, override_settings
+from exposure import archive
+from exposure.ingest import ensure_keywords, upsert_snapshots
+from exposure.models import ExposureSnapshot
+
+START, END = date(2025, 1, 1), date(2025, 3, 31)
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow not installed")
+class ArchiveRoundTripTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="exposure-archive-"))
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        override = override_settings(EXPOSURE_ARCHIVE_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        kw = ensure_keywords(["信貸", "房貸", "車貸"])
+        rows = []
+        for i in range((END - START).days + 1):
+            d = START + timedelta(days=i)
+            for j, name in enumerate(kw):
+                rows.append({"date": d, "keyword_id": kw[name], "impressions": i * 3 + j,
+                             "clicks": None if i % 7 == 0 else j, "position": None if i % 5 == 0 else 1.0 + j / 4})
+        upsert_snapshots(rows)
+
+    def _db_rows(self, start=START, end=END, keywords=None):
+        qs = ExposureSnapshot.objects.filter(date__gte=start, date__lte=end).order_by("date", "keyword_id")
+        if keywords:
+            qs = qs.filter(keyword__name__in=keywords)
+        return [(d, name, impr, clicks, pos) for d, name, impr, clicks, pos in
+                qs.values_list("date", "keyword__name", "impressions", "clicks", "position")]
+
+    def _table_rows(self, t):
+        cols = t.select(["date", "keyword", "impressions", "clicks", "position"]).to_pydict()
+        return list(zip(*cols.values()))
+
+    def _round_trip(self, fmt, compression="zstd"):
+        written = archive.archive_months(START, END, fmt, compression=compression)
+        self.assertEqual([w["month"] for w in written], ["2025-01", "2025-02", "2025-03"])
+        self.assertEqual([w["rows"] for w in written], [31 * 3, 28 * 3, 31 * 3])
+        for w in written:
+            self.assertTrue((self.root / w["file"]).exists())
+        t = archive.read_archive(START, END)
+        self.assertEqual(t.schema, archive.schema())
+        self.assertEqual(self._table_rows(t), self._db_rows())
+
+    def test_parquet_round_trip(self):
+        self._round_trip("parquet")
+
+    def test_arrow_round_trip(self):
+        self._round_trip("arrow")
+
+    def test_uncompressed_arrow_round_trip(self):
+        self._round_trip("arrow", compression=None)
+
+    def test_manifest_and_skip(self):
+        archive.archive_months(START, END)
+        manifest = archive.load_manifest()
+        self.assertEqual(sorted(manifest), ["2025-01", "2025-02", "2025-03"])
+        self.assertEqual(manifest["2025-02"]["file"], "exposure_2025-02.parquet")
+        self.assertEqual(manifest["2025-02"]["rows"], 84)
+        self.assertEqual(manifest["2025-02"]["bytes"], (self.root / "exposure_2025-02.parquet").stat().st_size)
+        # 已封存的月份預設略過，force 才重寫
+        self.assertEqual(archive.archive_months(START, END), [])
+        self.assertEqual(len(archive.archive_months(START, date(2025, 1, 31), force=True)), 1)
+
+    def test_changing_format_replaces_the_old_file(self):
+        archive.archive_months(START, date(2025, 1, 31), "parquet")
+        archive.archive_months(START, date(2025, 1, 31), "arrow", force=True)
+        self.assertEqual(sorted(p.name for p in self.root.glob("exposure_*")), ["exposure_2025-01.arrow"])
+        self.assertEqual(archive.read_archive().num_rows, 93)
+
+    def test_read_filters(self):
+        archive.archive_months(START, END)
+        t = archive.read_archive(date(2025, 1, 30), date(2025, 2, 2), keywords=["房貸"])
+        self.assertEqual(self._table_rows(t), self._db_rows(date(2025, 1, 30), date(2025, 2, 2), ["房貸"]))
+        self.assertEqual(archive.read_archive(columns=["date", "impressions"]).column_names, ["date", "impressions"])
+        self.assertEqual(archive.read_archive(date(2024, 1, 1), date(2024, 12, 31)).num_rows, 0)
+
+    def test_months_still_revised_are_not_archived(self):
+        today = date.today()
+        kw = ensure_keywords(["信貸"])["信貸"]
+        upsert_snapshots([{"date": today - timedelta(days=1), "keyword_id": kw, "impressions": 1}])
+        archive.archive_months(START)
+        last = archive.last_archivable_month()
+        self.assertLess(last, today.replace(day=1))
+        self.assertNotIn(f"{today:%Y-%m}", archive.load_manifest())
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            archive.write_month(START, "csv")
+
+    def test_download_view(self):
+        archive.archive_months(START, date(2025, 1, 31), "arrow")
+        resp = self.client.get("/api/exposure/archive/2025-01")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/vnd.apache.arrow.file")
+        self.assertEqual(b"".join(resp.streaming_content), (self.root / "exposure_2025-01.arrow").read_bytes())
+        self.assertEqual(self.client.get("/api/exposure/archive/2025-02").status_code, 404)
+        self.assertIn("2025-01", self.client.get("/api/exposure/archive").json())
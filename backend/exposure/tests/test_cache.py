@@ -0,0 +1,120 @@
+import time
+from datetime import date
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from exposure import cache as response_cache
+from exposure.ingest import ensure_keywords, upsert_snapshots
+from exposure.models import ExposureSnapshot
+
+
+class BumpDatesTests(TestCase):
+    def test_ingest_survives_cache_outage(self):
+        # Redis 掛掉時資料已寫入，不可讓 ingest 回報失敗
+        kw = ensure_keywords(["信貸"])["信貸"]
+        with mock.patch("exposure.cache.cache.set_many", side_effect=ConnectionError("redis down")), \
+                self.assertLogs("exposure.cache", "WARNING") as logs:
+            result = upsert_snapshots([{"date": date(2025, 3, 1), "keyword_id": kw, "impressions": 5}])
+        self.assertEqual(result["inserted"], 1)
+        self.assertEqual(ExposureSnapshot.objects.count(), 1)
+        self.assertIn("could not bump generation", logs.output[0])
+
+
+class RangeGenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_long_ranges_read_month_keys(self):
+        keys = response_cache._generation_keys(date(2015, 1, 15), date(2025, 3, 10))
+        # 頭尾零散日 + 中間整月；十年的範圍不會變成數千個 key
+        self.assertEqual(len(keys), 17 + 121 + 10)
+        self.assertEqual(response_cache._generation_keys(date(2025, 3, 1), date(2025, 3, 31)),
+                         ["exposure:gen:m:2025-03"])
+
+    def test_generation_is_newest_stamp_in_range(self):
+        with mock.patch("exposure.cache.time.time_ns", return_value=1_000_000):
+            response_cache.bump_dates([date(2025, 1, 20)])
+        with mock.patch("exposure.cache.time.time_ns", return_value=2_000_000):
+            response_cache.bump_dates([date(2025, 3, 5)])
+        gen = response_cache.range_generation
+        self.assertEqual(gen(date(2025, 1, 1), date(2025, 3, 31)), 2000)  # 整月讀 month key
+        self.assertEqual(gen(date(2025, 1, 15), date(2025, 2, 28)), 1000)  # 1 月為零散日
+        self.assertEqual(gen(date(2025, 1, 21), date(2025, 3, 4)), 0)
+        self.assertEqual(gen(date(2025, 3, 5), date(2025, 3, 4)), 0)
+
+
+class CachedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kw = ensure_keywords(["信貸"])["信貸"]
+        self.calls = 0
+
+    def _compute(self):
+        self.calls += 1
+        return {"n": self.calls}
+
+    def _get(self, start, end):
+        return response_cache.cached("top5_compare", start, end, {"smooth": 0}, self._compute)
+
+    def _ingest(self, d):
+        upsert_snapshots([{"date": d, "keyword_id": self.kw, "impressions": 5}])
+
+    def test_second_call_is_a_hit(self):
+        self._ingest(date(2025, 3, 2))
+        self.assertEqual(self._get(date(2025, 3, 1), date(2025, 3, 7)), ({"n": 1}, False))
+        self.assertEqual(self._get(date(2025, 3, 1), date(2025, 3, 7)), ({"n": 1}, True))
+        self.assertEqual(self.calls, 1)
+        stats = response_cache.stats(["top5_compare"])["top5_compare"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_params_are_part_of_the_key(self):
+        self._get(date(2025, 3, 1), date(2025, 3, 7))
+        _, hit = response_cache.cached("top5_compare", date(2025, 3, 1), date(2025, 3, 7), {"smooth": 7}, self._compute)
+        self.assertFalse(hit)
+
+    def test_ingest_invalidates_only_ranges_containing_the_date(self):
+        march, april = (date(2025, 3, 1), date(2025, 3, 31)), (date(2025, 4, 1), date(2025, 4, 30))
+        self._get(*march)
+        self._get(*april)
+        self.assertEqual(self.calls, 2)
+
+        self._ingest(date(2025, 3, 15))
+        self.assertEqual(self._get(*march), ({"n": 3}, False))
+        self.assertEqual(self._get(*april), ({"n": 2}, True))
+        # 重寫同一天（update）也要讓快取失效
+        with mock.patch("exposure.cache.time.time_ns", return_value=time.time_ns() + 10**9):
+            self._ingest(date(2025, 3, 15))
+        self.assertFalse(self._get(*march)[1])
+
+    def test_disabled_cache_always_computes(self):
+        with self.settings(EXPOSURE_CACHE_ENABLED=False):
+            self._get(date(2025, 3, 1), date(2025, 3, 7))
+            self.assertEqual(self._get(date(2025, 3, 1), date(2025, 3, 7)), ({"n": 2}, False))
+
+    def test_view_reports_hit_and_miss(self):
+        self._ingest(date(2025, 3, 2))
+        params = {"start": "2025-03-01", "end": "2025-03-07"}
+        url = "/api/exposure/top5_timeseries"
+        self.assertEqual(self.client.get(url, params)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url, params)["X-Cache"], "HIT")
+        self._ingest(date(2025, 3, 3))
+        resp = self.client.get(url, params)
+        self.assertEqual(resp["X-Cache"], "MISS")
+        self.assertEqual(resp.json()["dates"][:3], ["2025-03-01", "2025-03-02", "2025-03-03"])
+
+
+class CacheStatsViewTests(TestCase):
+    URL = "/api/exposure/cache_stats"
+
+    def setUp(self):
+        cache.clear()
+        response_cache._count("top5_compare", "hit")
+
+    def test_get_does_not_reset(self):
+        self.client.get(self.URL, {"reset": "true"})
+        self.assertEqual(self.client.get(self.URL).json()["top5_compare"]["hits"], 1)
+
+    def test_delete_resets(self):
+        resp = self.client.delete(self.URL)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["top5_compare"]["hits"], 0)
@@ -0,0 +1,108 @@
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from exposure.context import Period, PeriodError, parse_period
+from exposure.ingest import ensure_keywords, upsert_snapshots
+
+
+class ParsePeriodTests(SimpleTestCase):
+    def test_explicit_range(self):
+        self.assertEqual(parse_period({"start": "2025-03-01", "end": "2025-03-07"}, max_days=0),
+                         Period(date(2025, 3, 1), date(2025, 3, 7), 7))
+
+    def test_last_n_days(self):
+        p = parse_period({"days": "3"}, max_days=0)
+        self.assertEqual((p.end, p.days), (date.today(), 3))
+        self.assertEqual(p.start, date.today() - timedelta(days=2))
+        # days 非數字時退回預設
+        self.assertEqual(parse_period({"days": "abc"}, default_days=5, max_days=0).days, 5)
+
+    def test_malformed_dates(self):
+        for q in ({"start": "2025-3-1x", "end": "2025-03-07"}, {"start": "2025-03-01", "end": "nope"}):
+            with self.assertRaisesMessage(PeriodError, "YYYY-MM-DD"):
+                parse_period(q, max_days=0)
+
+    def test_end_before_start(self):
+        with self.assertRaisesMessage(PeriodError, "before start"):
+            parse_period({"start": "2025-03-07", "end": "2025-03-01"}, max_days=0)
+
+    def test_long_ranges_are_capped(self):
+        self.assertEqual(parse_period({"start": "2024-01-01", "end": "2025-12-31"}, max_days=30),
+                         Period(date(2024, 1, 1), date(2024, 1, 30), 30))
+        self.assertEqual(parse_period({"days": "5000"}, max_days=30).days, 30)
+
+
+class ConditionalGetTests(TestCase):
+    URL = "/api/exposure/top5_timeseries"
+    PARAMS = {"start": "2025-03-01", "end": "2025-03-07"}
+
+    def setUp(self):
+        cache.clear()
+        self.kw = ensure_keywords(["信貸"])["信貸"]
+        self._ingest(date(2025, 3, 2), 5)
+
+    def _ingest(self, d, impressions):
+        upsert_snapshots([{"date": d, "keyword_id": self.kw, "impressions": impressions}])
+
+    def test_bad_period_returns_400(self):
+        resp = self.client.get(self.URL, {"start": "2025-03-07", "end": "2025-03-01"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("before start", resp.json()["error"])
+        self.assertEqual(self.client.get(self.URL, {"start": "x", "end": "2025-03-01"}).status_code, 400)
+
+    def test_response_carries_validators(self):
+        resp = self.client.get(self.URL, self.PARAMS)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", resp)
+        self.assertIn("no-cache", resp["Cache-Control"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.URL, self.PARAMS)["ETag"]
+        resp = self.client.get(self.URL, self.PARAMS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+        self.assertEqual(resp.content, b"")
+
+    def test_etag_depends_on_params(self):
+        etag = self.client.get(self.URL, self.PARAMS)["ETag"]
+        resp = self.client.get(self.URL, {**self.PARAMS, "resolution": "week"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_ingest_in_range_changes_the_etag(self):
+        etag = self.client.get(self.URL, self.PARAMS)["ETag"]
+        self._ingest(date(2025, 3, 3), 9)
+        resp = self.client.get(self.URL, self.PARAMS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.json()["series"][0]["data"][1:3], [5, 9])
+
+    def test_ingest_outside_range_keeps_the_etag(self):
+        etag = self.client.get(self.URL, self.PARAMS)["ETag"]
+        self._ingest(date(2025, 4, 3), 9)
+        self.assertEqual(self.client.get(self.URL, self.PARAMS, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_if_modified_since_only_for_explicit_ranges(self):
+        last_modified = self.client.get(self.URL, self.PARAMS)["Last-Modified"]
+        resp = self.client.get(self.URL, self.PARAMS, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)
+
+        today = date.today()
+        self._ingest(today, 1)
+        last_modified = self.client.get(self.URL, {"days": 3})["Last-Modified"]
+        resp = self.client.get(self.URL, {"days": 3}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_no_validators_without_a_stamp(self):
+        cache.clear()
+        resp = self.client.get(self.URL, self.PARAMS)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("ETag", resp)
+
+    def test_disabled_conditional_get(self):
+        etag = self.client.get(self.URL, self.PARAMS)["ETag"]
+        with self.settings(EXPOSURE_CONDITIONAL_GET=False):
+            resp = self.client.get(self.URL, self.PARAMS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("ETag", resp)
@@ -0,0 +1,103 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from exposure import export
+from exposure.ingest import ensure_keywords, upsert_snapshots
+
+URL = "/api/exposure/export"
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        kw = ensure_keywords(["信貸", "房貸"])
+        upsert_snapshots([
+            {"date": date(2025, 3, d), "keyword_id": kw[name], "impressions": d * 10 + i, "clicks": i,
+             "position": None if d == 2 else 1.5}
+            for d in (1, 2, 3) for i, name in enumerate(["信貸", "房貸"])
+        ])
+
+    def _get(self, **params):
+        resp = self.client.get(URL, {"start": "2025-03-01", "end": "2025-03-03", "gzip": "false", **params})
+        self.assertEqual(resp.status_code, 200)
+        return resp, b"".join(resp.streaming_content)
+
+    def test_csv(self):
+        resp, body = self._get()
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="exposure_2025-03-01_2025-03-03.csv"', resp["Content-Disposition"])
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+        self.assertEqual(rows[0], export.COLUMNS)
+        self.assertEqual(rows[1:], [
+            ["2025-03-01", "信貸", "10", "0", "1.5"], ["2025-03-01", "房貸", "11", "1", "1.5"],
+            ["2025-03-02", "信貸", "20", "0", ""], ["2025-03-02", "房貸", "21", "1", ""],
+            ["2025-03-03", "信貸", "30", "0", "1.5"], ["2025-03-03", "房貸", "31", "1", "1.5"],
+        ])
+
+    def test_ndjson(self):
+        resp, body = self._get(format="ndjson", keywords="房貸")
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson; charset=utf-8")
+        lines = body.decode("utf-8").splitlines()
+        self.assertEqual([json.loads(l) for l in lines], [
+            {"date": f"2025-03-0{d}", "keyword": "房貸", "impressions": d * 10 + 1, "clicks": 1,
+             "position": None if d == 2 else 1.5}
+            for d in (1, 2, 3)
+        ])
+        self.assertIn("房貸", lines[0])  # ensure_ascii=False
+
+    def test_missing_clicks_are_empty(self):
+        kw = ensure_keywords(["車貸"])["車貸"]
+        upsert_snapshots([{"date": date(2025, 3, 2), "keyword_id": kw, "impressions": 7}])
+        _, body = self._get(keywords="車貸")
+        self.assertEqual(body.decode("utf-8").splitlines()[1:], ["2025-03-02,車貸,7,,"])
+        _, body = self._get(format="ndjson", keywords="車貸")
+        self.assertEqual(json.loads(body)["clicks"], None)
+
+    def test_gzip(self):
+        _, plain = self._get()
+        resp, body = self._get(gzip="true")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_gzip_auto_follows_accept_encoding(self):
+        resp = self.client.get(URL, {"start": "2025-03-01", "end": "2025-03-03"}, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        gzip.decompress(b"".join(resp.streaming_content))
+        resp = self.client.get(URL, {"start": "2025-03-01", "end": "2025-03-03"})
+        self.assertFalse(resp.has_header("Content-Encoding"))
+
+    def test_small_batches_give_the_same_bytes(self):
+        rows = list(export.iter_rows(date(2025, 3, 1), date(2025, 3, 3), chunk_size=1))
+        self.assertEqual(len(rows), 6)
+        for fmt in export.FORMATS:
+            self.assertEqual(b"".join(export.encode(rows, fmt, batch_size=1)),
+                             b"".join(export.encode(rows, fmt)))
+
+    def test_unknown_keywords_and_empty_range(self):
+        _, body = self._get(keywords="nope")
+        self.assertEqual(body.decode("utf-8").splitlines(), [",".join(export.COLUMNS)])
+        _, body = self._get(format="ndjson", start="2025-04-01", end="2025-04-30")
+        self.assertEqual(body, b"")
+
+    def test_bad_params_return_400(self):
+        resp = self.client.get(URL, {"format": "xml"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("format must be one of", resp.json()["error"])
+        resp = self.client.get(URL, {"start": "2025-03-03", "end": "2025-03-01"})
+        self.assertEqual(resp.status_code, 400)
+        with self.assertRaises(ValueError):
+            export.export_stream(date(2025, 3, 1), date(2025, 3, 3), "xml")
+
+    async def test_asgi_streams_through_an_async_iterator(self):
+        # ASGI 下同步 iterator 會被 sync_to_async(list) 整份讀進記憶體；應改為 async iterator
+        resp = await self.async_client.get(URL, {"start": "2025-03-01", "end": "2025-03-03", "gzip": "false"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.is_async)
+        body = b"".join([chunk async for chunk in resp.streaming_content])
+        _, expected = await sync_to_async(self._get)()
+        self.assertEqual(body, expected)
@@ -0,0 +1,82 @@
+import os
+import unittest
+from django.test import SimpleTestCase
+from exposure import gsc_client
+from exposure.gsc_client import GSC_MAX_REGEX_LEN, iter_batched_rows, keyword_regex_chunks
+from exposure.gsc_fake import FakeSearchConsoleService
+
+PROP = "sc-domain:example.com"
+
+
+def _rows(queries, days, impressions=5):
+    return [{"date": f"2025-03-{d:02d}", "query": q, "impressions": impressions, "clicks": 1, "position": 2.0}
+            for q in queries for d in days]
+
+
+def _filters(body):
+    return body["dimensionFilterGroups"][0]["filters"][0]
+
+
+class IterBatchedRowsTests(SimpleTestCase):
+    def _pull(self, keywords, service, **kwargs):
+        return list(iter_batched_rows(PROP, keywords, "2025-03-01", "2025-03-31", service=service, **kwargs))
+
+    def test_start_row_pagination_over_several_pages(self):
+        keywords = ["信貸", "房貸", "車貸"]
+        service = FakeSearchConsoleService(_rows(keywords, range(1, 11)))
+        got = self._pull(keywords, service, page_size=7)
+        # 30 列、每頁 7 列：5 次呼叫，最後一頁 2 列即停
+        self.assertEqual(len(got), 30)
+        self.assertEqual([b["startRow"] for b in service.calls], [0, 7, 14, 21, 28])
+        self.assertEqual({(kw, r["date"]) for kw, r in got},
+                         {(kw, f"2025-03-{d:02d}") for kw in keywords for d in range(1, 11)})
+
+    def test_full_last_page_costs_one_empty_call(self):
+        keywords = ["信貸", "房貸"]
+        service = FakeSearchConsoleService(_rows(keywords, range(1, 6)))
+        self.assertEqual(len(self._pull(keywords, service, page_size=5)), 10)
+        self.assertEqual([b["startRow"] for b in service.calls], [0, 5, 10])
+
+    def test_regex_chunks_stay_under_the_limit(self):
+        keywords = [f"keyword-{i:04d}-" + "x" * 40 for i in range(200)]
+        chunks = keyword_regex_chunks(keywords)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([k for c in chunks for k in c], keywords)
+
+        service = FakeSearchConsoleService(_rows(keywords, [1]))
+        got = self._pull(keywords, service)
+        self.assertEqual(len(service.calls), len(chunks))
+        for body in service.calls:
+            f = _filters(body)
+            self.assertEqual(f["operator"], "includingRegex")
+            self.assertLessEqual(len(f["expression"]), GSC_MAX_REGEX_LEN)
+        self.assertEqual(sorted(kw for kw, _ in got), sorted(keywords))
+
+    def test_regex_metacharacters_are_escaped(self):
+        keywords = ["c++ 貸款", "a.b", "(信貸)", "利率?", "x|y", "[房貸]", "$100"]
+        # 未跳脫時 a.b 會吃到 axb、利率? 會吃到 利、x|y 會吃到 x
+        decoys = ["axb", "利", "x", "y", "房", "c 貸款"]
+        service = FakeSearchConsoleService(_rows(keywords + decoys, [1, 2]))
+        got = self._pull(keywords, service)
+        self.assertEqual(len(service.calls), 1)
+        self.assertEqual(sorted(kw for kw, _ in got), sorted(keywords * 2))
+
+    def test_single_keyword_uses_equals(self):
+        service = FakeSearchConsoleService(_rows(["a.b", "axb"], [1]))
+        got = self._pull(["a.b"], service)
+        self.assertEqual(_filters(service.calls[0])["operator"], "EQUALS")
+        self.assertEqual([kw for kw, _ in got], ["a.b"])
+
+
+
+class ServiceHolderForkTests(SimpleTestCase):
+    @unittest.skipUnless(hasattr(os, "fork") and hasattr(os, "register_at_fork"), "needs os.fork")
+    def test_child_gets_an_unlocked_lock(self):
+        # fork 時 lock 被（其他 thread）持有：子行程第一次 service() 不可卡死
+        holder = gsc_client._holder
+        with holder._lock:
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover - child
+                os._exit(0 if gsc_client._holder._lock.acquire(timeout=2) else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
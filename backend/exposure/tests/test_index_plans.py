@@ -0,0 +1,18 @@
+import unittest
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from exposure.partitions import ensure_partitions
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN plan check needs PostgreSQL")
+class IndexPlanTests(TestCase):
+    def test_hot_queries_use_index_only_scans(self):
+        # 區間內的月份分區先建好，否則分區表沒有 scan 節點可檢查
+        end = date.today()
+        ensure_partitions(end - timedelta(days=i) for i in range(90))
+        out = StringIO()
+        call_command("check_index_plans", "--days", "90", stdout=out)
+        self.assertIn("all checked queries use index-only scans", out.getvalue())
@@ -0,0 +1,142 @@
+import importlib.util
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from exposure import archive, partitions
+from exposure import cache as response_cache
+from exposure.ingest import ensure_keywords, upsert_snapshots
+from exposure.models import ExposureRollup, ExposureSnapshot
+
+
+class PartitionTests(TestCase):
+    def setUp(self):
+        # DDL 隨測試 rollback，行程內的已建月份記錄也要跟著清掉
+        partitions._known.clear()
+        self.addCleanup(partitions._known.clear)
+        self.kw = ensure_keywords(["信貸"])["信貸"]
+
+    def _where(self, d: date) -> str:
+        """該日資料實際所在的 partition"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {partitions.PARENT} WHERE date = %s", [d])
+            return cursor.fetchone()[0]
+
+    def _months(self):
+        return [p["month"] for p in partitions.list_partitions() if p["month"]]
+
+    def test_table_is_partitioned(self):
+        self.assertTrue(partitions.is_partitioned())
+        self.assertIsNone(partitions.list_partitions()[0]["month"])  # DEFAULT 排第一
+
+    def test_ingest_creates_the_month(self):
+        upsert_snapshots([{"date": date(2025, 5, 17), "keyword_id": self.kw, "impressions": 3}])
+        self.assertIn(date(2025, 5, 1), self._months())
+        self.assertEqual(self._where(date(2025, 5, 17)), "exposure_exposuresnapshot_p202505")
+        # 同一行程內不再查 catalog
+        with self.assertNumQueries(0):
+            self.assertEqual(partitions.ensure_partitions([date(2025, 5, 2)]), [])
+
+    def test_split_default(self):
+        # 繞過 ingest：這幾個月還沒有 partition，資料落在 DEFAULT
+        for d in (date(2025, 6, 3), date(2025, 6, 30), date(2025, 7, 1)):
+            ExposureSnapshot.objects.create(date=d, keyword_id=self.kw, impressions=d.day)
+        self.assertEqual(self._where(date(2025, 6, 3)), partitions.DEFAULT)
+
+        created = partitions.split_default()
+        self.assertEqual(created, ["exposure_exposuresnapshot_p202506", "exposure_exposuresnapshot_p202507"])
+        self.assertEqual(self._where(date(2025, 6, 30)), "exposure_exposuresnapshot_p202506")
+        self.assertEqual(self._where(date(2025, 7, 1)), "exposure_exposuresnapshot_p202507")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {partitions.DEFAULT}")
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(sorted(ExposureSnapshot.objects.values_list("impressions", flat=True)), [1, 3, 30])
+        self.assertEqual(partitions.split_default(), [])
+
+    def test_ensure_partitions_moves_default_rows(self):
+        ExposureSnapshot.objects.create(date=date(2025, 8, 9), keyword_id=self.kw, impressions=4)
+        upsert_snapshots([{"date": date(2025, 8, 10), "keyword_id": self.kw, "impressions": 5}])
+        self.assertEqual(self._where(date(2025, 8, 9)), "exposure_exposuresnapshot_p202508")
+        self.assertEqual(self._where(date(2025, 8, 10)), "exposure_exposuresnapshot_p202508")
+
+    def test_future_partitions(self):
+        created = partitions.ensure_future_partitions(date(2031, 11, 20), months=2)
+        self.assertEqual(created, ["exposure_exposuresnapshot_p203111", "exposure_exposuresnapshot_p203112",
+                                   "exposure_exposuresnapshot_p203201"])
+        self.assertEqual(partitions.ensure_future_partitions(date(2031, 11, 20), months=2), [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command("exposure_partitions", "--today", "2031-03-05", "--premake", "1", stdout=out)
+        self.assertIn("created exposure_exposuresnapshot_p203103", out.getvalue())
+        self.assertIn("partitions up to date", out.getvalue())
+        out = StringIO()
+        call_command("exposure_partitions", "--list", stdout=out)
+        self.assertIn("DEFAULT", out.getvalue())
+        self.assertIn("2031-04", out.getvalue())
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow not installed")
+class DetachTests(TestCase):
+    TODAY = date(2025, 6, 15)
+
+    def setUp(self):
+        partitions._known.clear()
+        self.addCleanup(partitions._known.clear)
+        cache.clear()
+        self.root = Path(tempfile.mkdtemp(prefix="exposure-archive-"))
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        override = override_settings(EXPOSURE_ARCHIVE_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.kw = ensure_keywords(["信貸"])["信貸"]
+        # 2024-01 .. 2024-03 各兩天
+        upsert_snapshots([{"date": date(2024, m, d), "keyword_id": self.kw, "impressions": m * 10 + d}
+                          for m in (1, 2, 3) for d in (1, 2)])
+        # 測試全在同一個 transaction：先觸發延後的 FK 檢查，否則 DROP 會遇到 pending trigger events
+        connection.check_constraints()
+
+    def _tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname FROM pg_class WHERE relname LIKE %s AND relkind IN ('r', 'p')",
+                           [f"{partitions.PARENT}_detached_%"])
+            return sorted(r[0] for r in cursor.fetchall())
+
+    def test_retention_keeps_at_least_gsc_months(self):
+        # retain=1 仍保留 16 個月：2025-06 往前 16 個月 = 2024-02 起
+        detached = partitions.detach_old_partitions(retain_months=1, today=self.TODAY)
+        self.assertEqual([d["month"] for d in detached], ["2024-01"])
+        self.assertEqual(detached[0], {"month": "2024-01", "table": "exposure_exposuresnapshot_detached_p202401",
+                                       "archive_written": True, "dropped": False})
+        self.assertEqual(self._tables(), ["exposure_exposuresnapshot_detached_p202401"])
+        self.assertFalse(ExposureSnapshot.objects.filter(date__lt=date(2024, 2, 1)).exists())
+        self.assertEqual(ExposureSnapshot.objects.count(), 4)
+
+    def test_detached_month_is_archived_and_rolled_up(self):
+        gen = response_cache.range_generation(date(2024, 1, 1), date(2024, 1, 31))
+        partitions.detach_old_partitions(retain_months=16, today=self.TODAY)
+        self.assertEqual(archive.load_manifest()["2024-01"]["rows"], 2)
+        self.assertEqual(archive.read_archive(date(2024, 1, 1), date(2024, 1, 31))["impressions"].to_pylist(),
+                         [11, 12])
+        # 月彙總仍在，回應快取該月失效
+        rollup = ExposureRollup.objects.get(grain="month", period_start=date(2024, 1, 1), keyword_id=self.kw)
+        self.assertEqual(rollup.impressions, 23)
+        self.assertGreater(response_cache.range_generation(date(2024, 1, 1), date(2024, 1, 31)), gen)
+
+    def test_existing_archive_is_not_rewritten(self):
+        archive.write_month(date(2024, 1, 1), "arrow")
+        detached = partitions.detach_old_partitions(retain_months=16, today=self.TODAY, drop=True)
+        self.assertEqual(detached, [{"month": "2024-01", "table": None, "archive_written": False, "dropped": True}])
+        self.assertEqual(self._tables(), [])
+        self.assertEqual(archive.load_manifest()["2024-01"]["format"], "arrow")
+
+    def test_no_retention_detaches_nothing(self):
+        self.assertEqual(partitions.detach_old_partitions(retain_months=0, today=self.TODAY), [])
+        self.assertEqual(ExposureSnapshot.objects.count(), 6)
@@ -0,0 +1,91 @@
+import threading
+from datetime import date, timedelta
+from unittest import mock
+from django.test import TestCase
+from exposure.coverage import find_missing_cells
+from exposure.gsc_auto_pull import FetchUnit
+from exposure.gsc_fake import FakeSearchConsoleService
+from exposure.ingest import ensure_keywords
+from exposure.models import ExposureSnapshot
+from exposure.pull_engine import CallPolicy, run_pull
+
+
+def _rows(query, days, impressions=5):
+    return [{"date": f"2025-02-{d:02d}", "query": query, "impressions": impressions, "clicks": 1, "position": 3.0}
+            for d in days]
+
+
+class RunPullTests(TestCase):
+    def setUp(self):
+        self.kw_ids = ensure_keywords(["信貸"])
+
+    def _run(self, units, service, **kwargs):
+        return run_pull("sc-domain:example.com", units, self.kw_ids, service=service,
+                        policy=CallPolicy(retries=0), **kwargs)
+
+    def test_unknown_keyword_is_skipped(self):
+        # 「幽靈」不在 kw_ids：以前在 kw_ids[...] 丟 KeyError，整個 pull 卡住
+        service = FakeSearchConsoleService(_rows("信貸", [1, 2, 3]) + _rows("幽靈", [1, 2]))
+        units = [FetchUnit(["信貸", "幽靈"], date(2025, 2, 1), date(2025, 2, 3)), FetchUnit(["幽靈"], date(2025, 2, 1), date(2025, 2, 3))]
+        result = self._run(units, service)
+        self.assertEqual(result["errors"], [])
+        self.assertEqual(result["inserted"], 3)
+        self.assertEqual(set(ExposureSnapshot.objects.values_list("keyword_id", flat=True)), {self.kw_ids["信貸"]})
+
+    def test_days_without_rows_are_written_as_zero(self):
+        # GSC 對 0 曝光的日期不回 row：寫成 0 之後覆蓋率不再判定缺漏
+        service = FakeSearchConsoleService(_rows("信貸", [1, 3]))
+        start, end = date(2025, 2, 1), date(2025, 2, 5)
+        self.assertEqual(len(find_missing_cells(start, end, ["信貸"])["信貸"]), 5)
+        result = self._run([FetchUnit(["信貸"], start, end)], service)
+        self.assertEqual(result["inserted"], 5)
+        self.assertEqual(find_missing_cells(start, end, ["信貸"]), {})
+        zero = ExposureSnapshot.objects.get(keyword_id=self.kw_ids["信貸"], date=date(2025, 2, 2))
+        self.assertEqual((zero.impressions, zero.clicks, zero.position), (0, 0, None))
+
+    def test_recent_days_are_not_zero_filled(self):
+        # GSC 還沒出資料的最近幾天不補 0，之後的 pull 仍會抓
+        today = date.today()
+        start = today - timedelta(days=3)
+        service = FakeSearchConsoleService([{"date": today.isoformat(), "query": "信貸", "impressions": 2}])
+        with self.settings(GSC_SYNC_LAG_DAYS=2):
+            self._run([FetchUnit(["信貸"], start, today)], service)
+        self.assertEqual(find_missing_cells(start, today, ["信貸"]), {"信貸": [today - timedelta(days=1)]})
+
+    def test_zero_fill_uses_the_given_today(self):
+        # 回補 / 測試固定 today 時，截止日以它為準而非 date.today()
+        service = FakeSearchConsoleService(_rows("信貸", [1]))
+        start, end = date(2025, 2, 1), date(2025, 2, 10)
+        with self.settings(GSC_SYNC_LAG_DAYS=1):
+            self._run([FetchUnit(["信貸"], start, end)], service, today=date(2025, 2, 6))
+        self.assertEqual(find_missing_cells(start, end, ["信貸"])["信貸"],
+                         [date(2025, 2, d) for d in range(6, 11)])
+
+    def test_incremental_sync_passes_today(self):
+        from exposure import gsc_client, sync
+        service = FakeSearchConsoleService(_rows("信貸", [1]))
+        with mock.patch.object(gsc_client._holder, "service", return_value=service), \
+                mock.patch("exposure.sync.run_pull", wraps=sync.run_pull) as run:
+            sync.incremental_sync(today=date(2025, 2, 20), keywords=["信貸"], workers=1)
+        self.assertEqual(run.call_args.kwargs["today"], date(2025, 2, 20))
+
+    def test_consumer_error_does_not_hang(self):
+        # 消費端例外時 worker 不可卡在滿的 queue 上（workers=1 → queue 只放得下 2 筆）
+        service = FakeSearchConsoleService(_rows("信貸", range(1, 29)))
+        units = [FetchUnit(["信貸"], date(2025, 2, d), date(2025, 2, d)) for d in range(1, 29)]
+        outcome = {}
+
+        def target():
+            with mock.patch("exposure.pull_engine.gsc_rows_to_snapshots", side_effect=RuntimeError("bad row")):
+                try:
+                    self._run(units, service, workers=1)
+                except RuntimeError as e:
+                    outcome["error"] = e
+
+        t = threading.Thread(target=target)
+        t.start()
+        t.join(timeout=10)
+        self.assertFalse(t.is_alive(), "run_pull hung after a consumer-side error")
+        self.assertIn("error", outcome)
+        # 停止後剩下的 unit 不再呼叫 GSC
+        self.assertLess(len(service.calls), len(units))
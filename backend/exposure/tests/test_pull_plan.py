@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from exposure.context import RequestContext
+from exposure.views import _pull_plan
+
+
+@override_settings(GSC_SYNC_LAG_DAYS=2)
+class PullPlanTests(SimpleTestCase):
+    def _plan(self, start, end, pull="true"):
+        request = RequestFactory().get("/", {"start": start.isoformat(), "end": end.isoformat(), "pull": pull})
+        return _pull_plan(RequestContext.from_request(request))
+
+    def test_end_is_clamped_to_sync_lag(self):
+        today = date.today()
+        mode, start, end = self._plan(today - timedelta(days=10), today)
+        self.assertEqual(mode, "true")
+        self.assertEqual(start, today - timedelta(days=10))
+        self.assertEqual(end, today - timedelta(days=2))
+
+    def test_range_inside_sync_lag_is_not_pulled(self):
+        today = date.today()
+        mode, _, _ = self._plan(today - timedelta(days=1), today)
+        self.assertIsNone(mode)
+
+    def test_past_range_is_unchanged(self):
+        today = date.today()
+        mode, start, end = self._plan(today - timedelta(days=40), today - timedelta(days=30), pull="sync")
+        self.assertEqual((mode, start, end), ("sync", today - timedelta(days=40), today - timedelta(days=30)))
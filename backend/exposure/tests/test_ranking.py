@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+from django.test import TestCase
+from exposure.ingest import ensure_keywords, upsert_snapshots
+from exposure.ranking import rank_keywords
+
+START, END = date(2025, 3, 1), date(2025, 3, 31)
+
+
+class RankKeywordsTests(TestCase):
+    def setUp(self):
+        # 三月整月 + 二月（position_gain 的前一段）；每個關鍵字每天相同數值，方便手算
+        self.kw = ensure_keywords(["a", "b", "c", "d", "tiny"])
+        spec = {  # name: (impressions, clicks, position this month, position last month)
+            "a": (100, 10, 5.0, 9.0),
+            "b": (300, 3, 2.0, 2.5),
+            "c": (300, 30, 8.0, 8.0),
+            "d": (50, 25, 4.0, 10.0),
+            "tiny": (1, 1, 1.0, 20.0),
+        }
+        rows = []
+        for name, (impr, clicks, pos, prev_pos) in spec.items():
+            for i in range(59):
+                d = date(2025, 2, 1) + timedelta(days=i)
+                rows.append({"date": d, "keyword_id": self.kw[name], "impressions": impr, "clicks": clicks,
+                             "position": pos if d >= START else prev_pos})
+        upsert_snapshots(rows)
+
+    def _names(self, metric, n=5, min_impressions=None):
+        return [name for _, name, _ in rank_keywords(START, END, n, metric, min_impressions)]
+
+    def test_impressions_ties_break_on_lower_id(self):
+        ranked = rank_keywords(START, END, 3, "impressions")
+        self.assertEqual([name for _, name, _ in ranked], ["b", "c", "a"])
+        self.assertEqual(ranked[0][2], 300.0 * 31)
+
+    def test_clicks_and_limit(self):
+        self.assertEqual(self._names("clicks", n=2), ["c", "d"])
+
+    def test_ctr_respects_the_impression_floor(self):
+        # tiny 的 CTR 為 1，但曝光低於門檻；a、c 同為 0.1，id 小的在前
+        self.assertEqual(self._names("ctr", min_impressions=100), ["d", "a", "c", "b"])
+        self.assertEqual(self._names("ctr", min_impressions=0)[0], "tiny")
+
+    def test_position_gain_against_previous_period(self):
+        ranked = rank_keywords(START, END, 5, "position_gain", 100)
+        self.assertEqual([name for _, name, _ in ranked], ["d", "a", "b", "c"])
+        self.assertAlmostEqual(ranked[0][2], 6.0)
+
+    def test_empty_range(self):
+        self.assertEqual(rank_keywords(date(2024, 1, 1), date(2024, 1, 31), 5), [])
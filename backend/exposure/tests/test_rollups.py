@@ -0,0 +1,142 @@
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from exposure import rollups
+from exposure.ingest import ensure_keywords, upsert_snapshots
+from exposure.models import ExposureRollup, ExposureSnapshot
+
+START, END = date(2024, 12, 20), date(2025, 3, 31)
+
+
+def _row(i: int, d: date, kw: int) -> dict:
+    # clicks / position 偶爾為 None（GSC 沒回的日子）
+    return {
+        "date": d, "keyword_id": kw,
+        "impressions": (i * 37 + kw * 11) % 97,
+        "clicks": None if i % 9 == 0 else (i * 7) % 13,
+        "position": None if i % 11 == 0 else 1.0 + (i % 20) / 4,
+    }
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.kws = list(ensure_keywords(["信貸", "房貸", "車貸"]).values())
+        rows = []
+        for i in range((END - START).days + 1):
+            d = START + timedelta(days=i)
+            rows += [_row(i, d, kw) for kw in self.kws]
+        upsert_snapshots(rows)
+
+    def _raw(self, start, end, keyword_ids=None):
+        """參考值：直接從日表逐列加總"""
+        out = {}
+        qs = ExposureSnapshot.objects.filter(date__gte=start, date__lte=end)
+        if keyword_ids is not None:
+            qs = qs.filter(keyword_id__in=keyword_ids)
+        for s in qs:
+            t = out.setdefault(s.keyword_id, [0, 0, 0.0, 0])
+            t[0] += s.impressions
+            t[1] += s.clicks or 0
+            t[2] += (s.position or 0) * s.impressions
+            t[3] += 1
+        return out
+
+    def assertTotals(self, got, want):
+        self.assertEqual(sorted(got), sorted(want))
+        for kw, t in got.items():
+            w = want[kw]
+            self.assertEqual((t.impressions, t.clicks, t.days), (w[0], w[1], w[3]), kw)
+            self.assertAlmostEqual(t.position_weighted, w[2], places=6)
+
+    def test_period_totals_match_raw(self):
+        ranges = [
+            (START, END),
+            (date(2025, 1, 1), date(2025, 1, 31)),    # 整月
+            (date(2025, 1, 6), date(2025, 1, 12)),    # 整週
+            (date(2025, 1, 8), date(2025, 1, 10)),    # 只有零散日
+            (date(2024, 12, 23), date(2025, 3, 9)),   # 週 + 月 + 週
+            (date(2024, 12, 27), date(2025, 3, 4)),
+        ]
+        for start, end in ranges:
+            with self.subTest(start=start, end=end):
+                self.assertTotals(rollups.period_totals(start, end), self._raw(start, end))
+        self.assertTotals(rollups.period_totals(START, END, self.kws[:1]), self._raw(START, END, self.kws[:1]))
+
+    def test_decompose_covers_each_day_once(self):
+        for start, end in ((date(2024, 12, 27), date(2025, 3, 4)), (date(2025, 2, 3), date(2025, 2, 5)),
+                           (date(2024, 12, 30), date(2025, 2, 2))):
+            months, weeks, days = rollups.decompose(start, end)
+            covered = []
+            for m in months:
+                covered += [m + timedelta(days=i) for i in range((rollups.next_month(m) - m).days)]
+            for w in weeks:
+                covered += [w + timedelta(days=i) for i in range(7)]
+            for lo, hi in days:
+                covered += [lo + timedelta(days=i) for i in range((hi - lo).days + 1)]
+            self.assertEqual(sorted(covered), [start + timedelta(days=i) for i in range((end - start).days + 1)])
+            self.assertLessEqual(sum((hi - lo).days + 1 for lo, hi in days), 12)
+
+    def test_ingest_refreshes_touched_periods(self):
+        kw = self.kws[0]
+        upsert_snapshots([
+            {"date": date(2025, 2, 12), "keyword_id": kw, "impressions": 10_000, "clicks": 5, "position": 2.0},
+            {"date": date(2025, 4, 2), "keyword_id": kw, "impressions": 3, "clicks": None, "position": None},
+        ])
+        self.assertTotals(rollups.period_totals(date(2025, 2, 1), date(2025, 2, 28)),
+                          self._raw(date(2025, 2, 1), date(2025, 2, 28)))
+        self.assertTotals(rollups.period_totals(date(2025, 2, 10), date(2025, 2, 16)),
+                          self._raw(date(2025, 2, 10), date(2025, 2, 16)))
+        april = ExposureRollup.objects.get(grain="month", period_start=date(2025, 4, 1), keyword_id=kw)
+        self.assertEqual((april.impressions, april.clicks, april.days), (3, 0, 1))
+
+    def test_refresh_limited_to_keywords(self):
+        ExposureRollup.objects.all().delete()
+        rollups.refresh_rollups([date(2025, 1, 15)], keyword_ids=self.kws[1:2])
+        self.assertEqual(set(ExposureRollup.objects.values_list("keyword_id", flat=True)), {self.kws[1]})
+        self.assertEqual(set(ExposureRollup.objects.values_list("grain", "period_start")),
+                         {("week", date(2025, 1, 13)), ("month", date(2025, 1, 1))})
+
+    def test_backfill_rebuilds_from_raw(self):
+        want = set(ExposureRollup.objects.values_list(
+            "grain", "period_start", "keyword_id", "impressions", "clicks", "days"))
+        ExposureRollup.objects.all().delete()
+        out = StringIO()
+        call_command("rollup_backfill", stdout=out)
+        self.assertIn("Rollups rebuilt", out.getvalue())
+        got = set(ExposureRollup.objects.values_list(
+            "grain", "period_start", "keyword_id", "impressions", "clicks", "days"))
+        self.assertEqual(got, want)
+        # 4 個月 + 16 週（2024-12-16 那週起）
+        self.assertEqual(len({(g, p) for g, p, *_ in got}), 4 + 16)
+
+    def test_partial_backfill(self):
+        ExposureRollup.objects.all().delete()
+        rollups.backfill_rollups(date(2025, 2, 1), date(2025, 2, 28))
+        # 頭尾那週所在的月份也會一起重算；重算出來的每一列都要跟日表一致
+        self.assertTrue(ExposureRollup.objects.filter(grain="month", period_start=date(2025, 2, 1)).exists())
+        self.assertFalse(ExposureRollup.objects.filter(period_start__lt=date(2025, 1, 1)).exists())
+        for r in ExposureRollup.objects.all():
+            raw = self._raw(r.period_start, rollups.period_end(r.grain, r.period_start), [r.keyword_id])
+            self.assertEqual((r.impressions, r.clicks, r.days), tuple(raw[r.keyword_id][i] for i in (0, 1, 3)))
+        self.assertTotals(rollups.period_totals(date(2025, 2, 1), date(2025, 2, 28)),
+                          self._raw(date(2025, 2, 1), date(2025, 2, 28)))
+
+    def test_backfill_of_empty_table(self):
+        ExposureSnapshot.objects.all().delete()
+        self.assertEqual(rollups.backfill_rollups(), 0)
+
+    def test_bucket_totals_match_raw(self):
+        start, end = date(2024, 12, 27), date(2025, 3, 4)
+        for grain in ("week", "month"):
+            for lo, hi in rollups.buckets(start, end, grain):
+                self.assertGreaterEqual(lo, start)
+                self.assertLessEqual(hi, end)
+            got = {}
+            for kw, bucket, t in rollups.iter_bucket_totals(start, end, grain):
+                got.setdefault(bucket, {})[kw] = t
+            want_buckets = [lo for lo, _ in rollups.buckets(start, end, grain)]
+            self.assertEqual(sorted(got), want_buckets)
+            for lo, hi in rollups.buckets(start, end, grain):
+                with self.subTest(grain=grain, bucket=lo):
+                    self.assertTotals(got[lo], self._raw(lo, hi))
@@ -0,0 +1,176 @@
+import math
+import statistics
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from exposure import transforms
+
+NAN = float("nan")
+
+
+# ---- 參考實作：改寫前 top5_compare 的逐關鍵字、逐日迴圈（含 _sma） ----
+
+def _ref_sma(arr, w):
+    if w <= 1:
+        return arr
+    out, s = [], 0.0
+    for i, v in enumerate(arr):
+        s += v
+        if i >= w: s -= arr[i - w]
+        out.append(s / min(i + 1, w))
+    return out
+
+
+def _ref_normalize(rows):
+    totals = [sum(col) for col in zip(*rows)]
+    return [[(v / t) if t > 0 else 0.0 for v, t in zip(row, totals)] for row in rows]
+
+
+def _ref_cumulative(row):
+    c, out = 0.0, []
+    for v in row:
+        c += v
+        out.append(c)
+    return out
+
+
+def _ref_ema(row, span):
+    if span <= 1:
+        return row
+    alpha = 2.0 / (span + 1)
+    out = [row[0]]
+    for v in row[1:]:
+        out.append(alpha * v + (1 - alpha) * out[-1])
+    return out
+
+
+def _ref_wow(row, pct, lag=7):
+    out = []
+    for i, v in enumerate(row):
+        if i < lag:
+            out.append(NAN)
+        elif pct:
+            out.append((v - row[i - lag]) / row[i - lag] if row[i - lag] != 0 else NAN)
+        else:
+            out.append(v - row[i - lag])
+    return out
+
+
+def _ref_zscore(row, window=28, min_periods=7, std_floor=transforms.ZSCORE_STD_FLOOR):
+    out = []
+    for i, v in enumerate(row):
+        past = row[max(0, i - window):i]
+        if len(past) < min_periods:
+            out.append(NAN)
+            continue
+        std = max(statistics.pstdev(past), std_floor)
+        out.append((v - statistics.fmean(past)) / std)
+    return out
+
+
+# 五個關鍵字 x 40 天：含 0、整段為 0 的關鍵字、突波
+_ROWS = [
+    [float((i * 37) % 11) for i in range(40)],
+    [0.0] * 40,
+    [float(100 + i) for i in range(40)],
+    [0.0 if i % 5 == 0 else float(i * i % 23) for i in range(40)],
+    [5.0] * 20 + [500.0] + [5.0] * 19,
+]
+
+
+class TransformGoldenTests(SimpleTestCase):
+    def assertRowsClose(self, got, want):
+        got = np.asarray(got, dtype=np.float64)
+        want = np.asarray(want, dtype=np.float64)
+        self.assertEqual(got.shape, want.shape)
+        np.testing.assert_allclose(got, want, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+    def setUp(self):
+        self.m = np.array(_ROWS, dtype=np.float64)
+
+    def test_sma(self):
+        for w in (0, 1, 3, 7, 40, 60):
+            self.assertRowsClose(transforms.sma(self.m, w), [_ref_sma(r, w) for r in _ROWS])
+
+    def test_ema(self):
+        for span in (0, 1, 3, 7):
+            self.assertRowsClose(transforms.ema(self.m, span), [_ref_ema(r, span) for r in _ROWS])
+
+    def test_normalize_with_zero_day_totals(self):
+        m = np.array([[0.0, 1.0, 3.0], [0.0, 0.0, 1.0]])
+        self.assertRowsClose(transforms.normalize(m), _ref_normalize(m.tolist()))
+        self.assertRowsClose(transforms.normalize(self.m), _ref_normalize(_ROWS))
+
+    def test_cumulative(self):
+        self.assertRowsClose(transforms.cumulative(self.m), [_ref_cumulative(r) for r in _ROWS])
+
+    def test_wow_abs_and_pct_with_zero_bases(self):
+        self.assertRowsClose(transforms.wow(self.m), [_ref_wow(r, False) for r in _ROWS])
+        self.assertRowsClose(transforms.wow(self.m, pct=True), [_ref_wow(r, True) for r in _ROWS])
+        self.assertRowsClose(transforms.wow(self.m, pct=True, lag=1), [_ref_wow(r, True, lag=1) for r in _ROWS])
+        # 基期為 0 的百分比是 NaN，不是 inf
+        self.assertTrue(np.isnan(transforms.wow(self.m, pct=True)[1]).all())
+
+    def test_zscore(self):
+        for window in (7, 14, 28):
+            self.assertRowsClose(transforms.zscore(self.m, window), [_ref_zscore(r, window) for r in _ROWS])
+
+    def test_apply_matches_old_pipeline(self):
+        # 舊順序：占比 -> 累積 -> 平滑（累積時不平滑）
+        for normalized in (False, True):
+            for cum in (False, True):
+                for smooth in (0, 3, 7):
+                    rows = _ref_normalize(_ROWS) if normalized else [list(r) for r in _ROWS]
+                    if cum:
+                        rows = [_ref_cumulative(r) for r in rows]
+                    if smooth and not cum:
+                        rows = [_ref_sma(r, smooth) for r in rows]
+                    self.assertRowsClose(transforms.apply(self.m, normalized, cum, smooth), rows)
+
+    def test_nan_propagates(self):
+        m = np.array([[1.0, NAN, 3.0, 4.0]])
+        self.assertRowsClose(transforms.cumulative(m), [[1.0, NAN, NAN, NAN]])
+        self.assertRowsClose(transforms.wow(m, lag=1), [[NAN, NAN, NAN, 1.0]])
+        self.assertEqual(transforms.to_lists(transforms.wow(m, lag=1)), [[None, None, None, 1.0]])
+
+    def test_short_and_empty_series(self):
+        short = np.array([[1.0, 2.0, 3.0]])
+        self.assertRowsClose(transforms.sma(short, 7), [_ref_sma([1.0, 2.0, 3.0], 7)])
+        self.assertRowsClose(transforms.ema(short, 7), [_ref_ema([1.0, 2.0, 3.0], 7)])
+        self.assertTrue(np.isnan(transforms.wow(short)).all())
+        self.assertTrue(np.isnan(transforms.zscore(short)).all())
+        self.assertEqual(transforms.anomalies(short, ["a"], ["d1", "d2", "d3"]), [])
+        empty = np.zeros((2, 0))
+        for fn in (transforms.normalize, transforms.cumulative):
+            self.assertEqual(fn(empty).shape, (2, 0))
+        self.assertEqual(transforms.sma(empty, 3).shape, (2, 0))
+        self.assertEqual(transforms.ema(empty, 3).shape, (2, 0))
+        self.assertEqual(transforms.wow(empty).shape, (2, 0))
+        self.assertEqual(transforms.zscore(empty).shape, (2, 0))
+
+
+class ZscoreFloorTests(SimpleTestCase):
+    def test_jump_after_flat_window_is_flagged(self):
+        # 20 天都是 10（std = 0）後跳到 100：以前因 std > 1e-12 的條件被略過
+        m = np.array([[10.0] * 20 + [100.0]])
+        found = transforms.anomalies(m, ["信貸"], [f"d{i}" for i in range(21)], threshold=3.0)
+        self.assertEqual([(a["date"], a["value"]) for a in found], [("d20", 100.0)])
+        self.assertEqual(found[0]["z"], 90.0)
+
+    def test_flat_series_is_not_flagged(self):
+        m = np.array([[10.0] * 30])
+        z = transforms.zscore(m)
+        self.assertTrue(np.isnan(z[0, :7]).all())
+        self.assertEqual(np.abs(z[0, 7:]).max(), 0.0)
+        self.assertEqual(transforms.anomalies(m, ["a"], [str(i) for i in range(30)]), [])
+
+    def test_configurable_floor(self):
+        m = np.array([[10.0] * 20 + [100.0]])
+        self.assertTrue(math.isclose(transforms.zscore(m, std_floor=30.0)[0, 20], 3.0))
+
+
+class Top5CompareParamTests(TestCase):
+    def test_bad_number_params_return_400(self):
+        for param in ("smooth", "ema", "z", "z_window"):
+            resp = self.client.get("/api/exposure/top5_compare", {"days": 7, param: "abc"})
+            self.assertEqual(resp.status_code, 400, param)
+            self.assertIn("must be numbers", resp.json()["error"])
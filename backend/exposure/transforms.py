@@ -0,0 +1,132 @@
+"""
+Vectorized series transforms for top5_compare.
+
+Every function takes a keywords x buckets float ndarray (days, or weeks /
+months for long ranges) and works along the time axis for all keywords at
+once; windows and spans count buckets:
+
+- normalize: share of each day's total across the selected keywords
+- cumulative: running sum
+- sma: trailing simple moving average (partial window at the start,
+  same as the old per-keyword _sma)
+- ema: exponential moving average, alpha = 2 / (span + 1), seeded with day 0
+- wow: week-over-week delta (absolute or percent) against 7 days earlier;
+  at weekly / monthly resolution against the previous bucket
+- zscore: trailing z-score of each day against the previous `window` days,
+  used to flag anomalies; the std is floored at ZSCORE_STD_FLOOR so a jump
+  after a flat stretch is still flagged
+"""
+from typing import Dict, List, Optional
+import numpy as np
+
+WEEK = 7
+# z-score 分母下限（單位同序列，曝光為次數）：平穩期後的跳升仍可被標出
+ZSCORE_STD_FLOOR = 1.0
+
+
+def normalize(m: np.ndarray) -> np.ndarray:
+    totals = m.sum(axis=0, keepdims=True)
+    out = np.zeros_like(m)
+    np.divide(m, totals, out=out, where=totals > 0)
+    return out
+
+
+def cumulative(m: np.ndarray) -> np.ndarray:
+    return np.cumsum(m, axis=1)
+
+
+def sma(m: np.ndarray, window: int) -> np.ndarray:
+    if window <= 1 or m.shape[1] == 0:
+        return m
+    c = np.cumsum(m, axis=1)
+    out = c.copy()
+    out[:, window:] = c[:, window:] - c[:, :-window]
+    counts = np.minimum(np.arange(1, m.shape[1] + 1), window)
+    return out / counts
+
+
+def ema(m: np.ndarray, span: int) -> np.ndarray:
+    if span <= 1 or m.shape[1] == 0:
+        return m
+    alpha = 2.0 / (span + 1)
+    out = np.empty_like(m)
+    out[:, 0] = m[:, 0]
+    # 遞迴只沿日期軸，每一步對所有關鍵字一起算
+    for t in range(1, m.shape[1]):
+        out[:, t] = alpha * m[:, t] + (1 - alpha) * out[:, t - 1]
+    return out
+
+
+def wow(m: np.ndarray, pct: bool = False, lag: int = WEEK) -> np.ndarray:
+    """Delta against `lag` columns earlier; NaN for the first `lag` columns (and pct with a 0 base)."""
+    out = np.full_like(m, np.nan)
+    if m.shape[1] <= lag:
+        return out
+    cur, prev = m[:, lag:], m[:, :-lag]
+    if pct:
+        np.divide(cur - prev, prev, out=out[:, lag:], where=prev != 0)
+    else:
+        out[:, lag:] = cur - prev
+    return out
+
+
+def zscore(m: np.ndarray, window: int = 28, min_periods: int = WEEK,
+           std_floor: float = ZSCORE_STD_FLOOR) -> np.ndarray:
+    """z of each day against the mean/std (floored at std_floor) of the `window` days before it; NaN before min_periods."""
+    n_days = m.shape[1]
+    z = np.full_like(m, np.nan)
+    if n_days <= min_periods:
+        return z
+    pad = np.zeros((m.shape[0], 1))
+    c1 = np.concatenate([pad, np.cumsum(m, axis=1)], axis=1)
+    c2 = np.concatenate([pad, np.cumsum(m * m, axis=1)], axis=1)
+    t = np.arange(n_days)
+    lo = np.maximum(t - window, 0)
+    n = (t - lo).astype(np.float64)
+    s1 = c1[:, t] - c1[:, lo]
+    s2 = c2[:, t] - c2[:, lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s1 / n
+        var = np.maximum(s2 / n - mean * mean, 0.0)
+        std = np.maximum(np.sqrt(var), std_floor)
+        z = np.where(n >= min_periods, (m - mean) / std, np.nan)
+    return z
+
+
+def anomalies(m: np.ndarray, names: List[str], dates: List[str],
+              threshold: float = 3.0, window: int = 28) -> List[Dict]:
+    """[{'name', 'date', 'value', 'z'}, ...] for every |z| >= threshold, by date."""
+    z = zscore(m, window)
+    ki, ti = np.nonzero(np.abs(np.nan_to_num(z)) >= threshold)
+    order = np.lexsort((ki, ti))
+    return [{"name": names[k], "date": dates[t], "value": float(m[k, t]), "z": round(float(z[k, t]), 3)}
+            for k, t in zip(ki[order], ti[order])]
+
+
+def apply(m: np.ndarray, normalized: bool = False, cum: bool = False, smooth: int = 0,
+          ema_span: int = 0, wow_mode: Optional[str] = None, wow_lag: int = WEEK) -> np.ndarray:
+    """
+    top5_compare 的轉換順序：占比 -> 累積 -> 平滑（累積時不平滑；smooth 優先於 ema）-> 週增減
+    wow_lag：日資料為 7，週 / 月資料為 1（與前一個 bucket 比）
+    """
+    if normalized:
+        m = normalize(m)
+    if cum:
+        m = cumulative(m)
+    elif smooth:
+        m = sma(m, smooth)
+    elif ema_span:
+        m = ema(m, ema_span)
+    if wow_mode:
+        m = wow(m, pct=wow_mode == "pct", lag=wow_lag)
+    return m
+
+
+def to_lists(m: np.ndarray, as_int: bool = False) -> List[List]:
+    """ndarray -> JSON-ready rows (NaN -> None)."""
+    if as_int:
+        return m.astype(np.int64).tolist()
+    rows = m.tolist()
+    if np.isnan(m).any():
+        rows = [[None if v != v else v for v in row] for row in rows]
+    return rows
@@ -1,224 +1,535 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+import numpy as np
 from datetime import date, timedelta
-from typing import List, Tuple, Dict
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Sum
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
 from .models import ExposureSnapshot
-from .gsc_auto_pull import auto_pull_if_needed
+from . import cache as response_cache
+from . import transforms
+from .context import PeriodError, RequestContext, parse_period
+from .series import SeriesGrid
+from .renderers import MsgPackRenderer
+from .rollups import Totals, iter_bucket_totals, period_totals
+from . import export
+from . import archive
+from .ranking import METRICS, MAX_N, rank_keywords
+from .gsc_auto_pull import auto_pull_if_needed, gsc_history_start
+from .jobs import request_pull, job_status
 # from .crawler import search_and_collect  # Commented out - crawler module not needed for frontend
 @api_view(["GET"])
 def health(request):
     return Response({"ok": True})
 
-def _drange(start: date, end: date) -> List[date]:
-    d = start
-    out = []
-    while d <= end:
-        out.append(d)
-        d += timedelta(days=1)
-    return out
+def _with_context(view):
+    """解析期間一次（RequestContext 作為第二個參數傳入）；日期格式錯誤回 400"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            ctx = RequestContext.from_request(request)
+        except PeriodError as e:
+            return Response({"error": str(e)}, status=400)
+        return view(request, ctx, *args, **kwargs)
+    return wrapper
 
-def _parse_period(request) -> Tuple[date, date, int]:
-    q = request.query_params
-    try:
-        days = int(q.get("days", 7))
-    except Exception:
-        days = 7
-    days = max(1, min(days, 90))
-
-    if q.get("start") and q.get("end"):
-        start = date.fromisoformat(q["start"])
-        end = date.fromisoformat(q["end"])
-        total = (end - start).days + 1
-        if total > 90:
-            end = start + timedelta(days=89)
-            total = 90
+def _series_meta(grid: SeriesGrid) -> dict:
+    return {"resolution": grid.resolution, "bucket_days": grid.bucket_days}
+
+def _compute_topn_grid(start: date, end: date, n: int = 5, metric: str = "impressions",
+                       min_impressions: int = None,
+                       resolution: str = "day") -> Tuple[List[Tuple[int, str, float]], SeriesGrid]:
+    """回傳 (ranked, grid)，ranked = [(id, name, score)]，grid 每列 = 該關鍵字此指標每個 bucket 的值"""
+    # 1) 期間排名 Top-N（rollups + bounded heap）
+    ranked = rank_keywords(start, end, n, metric, min_impressions)
+    names = [name for _, name, _ in ranked]
+    row_of = {kid: i for i, (kid, _, _) in enumerate(ranked)}
+
+    if resolution != "day":
+        # 2') 週 / 月：整段 period 取 rollups，頭尾不完整的 bucket 才掃每日資料
+        totals = list(iter_bucket_totals(start, end, resolution, row_of))
+        if metric in ("ctr", "position_gain"):
+            grid = SeriesGrid(start, end, names, dtype=np.float64,
+                              fill=0.0 if metric == "ctr" else np.nan, resolution=resolution)
+            value = (lambda t: t.ctr) if metric == "ctr" else (lambda t: t.position)
+        else:
+            grid = SeriesGrid(start, end, names, resolution=resolution)
+            value = lambda t: getattr(t, metric)
+        grid.fill_rows((row_of[k], b, value(t)) for k, b, t in totals)
+        return ranked, grid
+
+    # 2) 取 Top-N 每日數值，依 (date - start).days 直接填入
+    qs = ExposureSnapshot.objects.filter(date__gte=start, date__lte=end, keyword_id__in=row_of)
+    if metric == "position_gain":
+        grid = SeriesGrid(start, end, names, dtype=np.float64, fill=np.nan)
+        grid.fill_rows((row_of[k], d, v) for k, d, v in qs.values_list("keyword_id", "date", "position"))
+    elif metric == "ctr":
+        impr = SeriesGrid(start, end, names)
+        clicks = SeriesGrid(start, end, names)
+        rows = list(qs.values_list("keyword_id", "date", "impressions", "clicks"))
+        impr.fill_rows((row_of[k], d, i) for k, d, i, _ in rows)
+        clicks.fill_rows((row_of[k], d, c) for k, d, _, c in rows)
+        grid = SeriesGrid(start, end, names, dtype=np.float64, fill=0.0)
+        np.divide(clicks.values, impr.values, out=grid.values, where=impr.values > 0)
     else:
-        end = date.today()
-        start = end - timedelta(days=days - 1)
-        total = days
-    return start, end, total
-def _sma(arr: List[float], w: int) -> List[float]:
-    if w <= 1:
-        return arr
-    out, s = [], 0.0
-    for i, v in enumerate(arr):
-        s += v
-        if i >= w: s -= arr[i - w]
-        out.append(s / min(i + 1, w))
-    return out
-def _compute_top5_grid(start: date, end: date) -> Tuple[List[str], List[str], Dict[str, Dict[str, int]]]:
-    """回傳 (top5, dates, grid)，grid[kw][date_iso] = impressions"""
-    # 1) 先找期間合計曝光 Top-5
-    agg = (ExposureSnapshot.objects
-           .filter(date__gte=start, date__lte=end)
-           .values("keyword__name")
-           .annotate(total=Sum("impressions"))
-           .order_by("-total")[:5])
-    top5 = [a["keyword__name"] for a in agg]
-
-    # 2) 取 Top-5 每日曝光
-    rows = (ExposureSnapshot.objects
-            .filter(date__gte=start, date__lte=end, keyword__name__in=top5)
-            .values("date", "keyword__name")
-            .annotate(impr=Sum("impressions")))
-
-    dates = [d.isoformat() for d in _drange(start, end)]
-    grid = {kw: {dt: 0 for dt in dates} for kw in top5}
-    for r in rows:
-        kw = r["keyword__name"]
-        dt = r["date"].isoformat()
-        if kw in grid and dt in grid[kw]:
-            grid[kw][dt] = int(r["impr"] or 0)
-
-    return top5, dates, grid
+        grid = SeriesGrid(start, end, names)
+        grid.fill_rows((row_of[k], d, v) for k, d, v in qs.values_list("keyword_id", "date", metric))
+    return ranked, grid
+
+def _compute_top5_grid(start: date, end: date, resolution: str = "day") -> SeriesGrid:
+    """期間曝光 Top-5 每個 bucket 的曝光（grid.names 依排名）"""
+    return _compute_topn_grid(start, end, 5, "impressions", resolution=resolution)[1]
+
+def _with_cache_header(resp, hit: bool):
+    resp["X-Cache"] = "HIT" if hit else "MISS"
+    return resp
+
+def _timeseries_job(ctx: RequestContext) -> Tuple[str, dict, Callable[[], dict]]:
+    """top5_timeseries 的 (endpoint, cache params, compute)，同步 / async view 共用"""
+    resolution = ctx.resolution
+
+    def compute():
+        grid = _compute_top5_grid(ctx.start, ctx.end, resolution)
+        return {
+            "period": ctx.period(),
+            "keywords": grid.names,
+            "dates": grid.dates,
+            "series": grid.series(),
+            "meta": _series_meta(grid),
+        }
+    return "top5_timeseries", {"resolution": resolution}, compute
+
+def _timeseries_payload(ctx: RequestContext) -> Tuple[dict, bool]:
+    """top5_timeseries 的回應內容（經 response cache），回傳 (payload, hit)"""
+    return ctx.cached(*_timeseries_job(ctx))
 
 @api_view(["GET"])
-def top5_timeseries(request):
-    """JSON：前端畫 5 條線用"""
-    start, end, total = _parse_period(request)
-    top5, dates, grid = _compute_top5_grid(start, end)
-    series = [{"name": kw, "data": [grid[kw][dt] for dt in dates]} for kw in top5]
-    return Response({
-        "period": {"start": start.isoformat(), "end": end.isoformat(), "days": total},
-        "keywords": top5,
-        "dates": dates,
-        "series": series
-    })
+@_with_context
+def top5_timeseries(request, ctx: RequestContext):
+    """
+    JSON：前端畫 5 條線用
+    長區間自動改用週 / 月 bucket（dates = 每個 bucket 在區間內的第一天），見 meta.resolution
+    回應帶 ETag / Last-Modified，If-None-Match 相符時直接 304
+    """
+    def build():
+        payload, hit = _timeseries_payload(ctx)
+        return _with_cache_header(Response(payload), hit)
+    return ctx.conditional("top5_timeseries", {"resolution": ctx.resolution}, build)
 
 @api_view(["GET"])
-def top5_timeseries_csv(request):
-    """CSV 下載：date, kw1, kw2, kw3, kw4, kw5"""
-    start, end, _ = _parse_period(request)
-    top5, dates, grid = _compute_top5_grid(start, end)
-
-    import csv, io
-    buf = io.StringIO()
-    w = csv.writer(buf)
-    w.writerow(["date"] + top5)
-    for dt in dates:
-        w.writerow([dt] + [grid[kw][dt] for kw in top5])
-
-    resp = HttpResponse(buf.getvalue(), content_type="text/csv; charset=utf-8")
-    resp["Content-Disposition"] = f'attachment; filename="top5_timeseries_{start}_{end}.csv"'
-    return resp
+@_with_context
+def topn_timeseries(request, ctx: RequestContext):
+    """
+    GET /api/exposure/topn_timeseries?days=30&n=20&metric=clicks&min_impressions=10&resolution=auto
+    metric: impressions | clicks | ctr | position_gain（與前一個等長期間相比的排名進步）
+    回傳結構同 top5_timeseries，另附 scores 與 meta
+    （position_gain 的 series 為每個 bucket 的平均排名）
+    """
+    resolution = ctx.resolution
+    q = request.query_params
+    metric = q.get("metric", "impressions")
+    if metric not in METRICS:
+        return Response({"error": f"metric must be one of {', '.join(METRICS)}"}, status=400)
+    try:
+        n = int(q.get("n", 5))
+        min_impressions = int(q["min_impressions"]) if q.get("min_impressions") else None
+    except ValueError:
+        return Response({"error": "n and min_impressions must be integers"}, status=400)
+    n = max(1, min(n, MAX_N))
+
+    def compute():
+        ranked, grid = _compute_topn_grid(ctx.start, ctx.end, n, metric, min_impressions, resolution)
+        return {
+            "period": ctx.period(),
+            "keywords": grid.names,
+            "dates": grid.dates,
+            "series": grid.series(),
+            "scores": {name: score for _, name, score in ranked},
+            "meta": {"n": n, "metric": metric, "min_impressions": min_impressions, **_series_meta(grid)},
+        }
+
+    params = {"n": n, "metric": metric, "min_impressions": min_impressions, "resolution": resolution}
+
+    def build():
+        payload, hit = ctx.cached("topn_timeseries", params, compute)
+        return _with_cache_header(Response(payload), hit)
+    return ctx.conditional("topn_timeseries", params, build)
+
+@api_view(["GET"])
+@_with_context
+def top5_timeseries_csv(request, ctx: RequestContext):
+    """CSV 下載：date, kw1, kw2, kw3, kw4, kw5（解析度同 top5_timeseries，見 X-Resolution header）"""
+    params = {"resolution": ctx.resolution}
+
+    def compute():
+        import csv, io
+        buf = io.StringIO()
+        csv.writer(buf).writerows(_compute_top5_grid(ctx.start, ctx.end, params["resolution"]).csv_rows())
+        return buf.getvalue()
+
+    def build():
+        body, hit = ctx.cached("top5_timeseries_csv", params, compute)
+        resp = HttpResponse(body, content_type="text/csv; charset=utf-8")
+        resp["Content-Disposition"] = f'attachment; filename="top5_timeseries_{ctx.start}_{ctx.end}.csv"'
+        resp["X-Resolution"] = params["resolution"]
+        return _with_cache_header(resp, hit)
+    return ctx.conditional("top5_timeseries_csv", params, build)
+@require_GET
+def export_snapshots(request):
+    """
+    GET /api/exposure/export?start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|ndjson&keywords=a,b&gzip=auto
+    串流匯出每日 snapshot（所有關鍵字、不限天數）：date, keyword, impressions, clicks, position
+    gzip=auto 依 Accept-Encoding 決定是否以 Content-Encoding: gzip 傳送
+    （純 Django view：DRF 會把 ?format= 當成 renderer 選擇）
+    """
+    q = request.GET
+    fmt = q.get("format", "csv").lower()
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(export.FORMATS)}"}, status=400)
+    try:
+        ctx = RequestContext(request, parse_period(q, default_days=30, max_days=0))
+    except PeriodError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    start, end = ctx.start, ctx.end
+    keywords = [k.strip() for k in q.get("keywords", "").split(",") if k.strip()] or None
+
+    gz = q.get("gzip", "auto").lower()
+    if gz == "auto":
+        use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    else:
+        use_gzip = gz in ("1", "true", "yes")
+
+    def build():
+        body = export.export_stream(start, end, fmt, keywords, gzip=use_gzip)
+        if isinstance(request, ASGIRequest):
+            # ASGI 會以 sync_to_async(list) 讀完同步 iterator（整份匯出進記憶體）：改用 async iterator
+            body = export.aiter_chunks(body)
+        resp = StreamingHttpResponse(body, content_type=export.CONTENT_TYPES[fmt])
+        resp["Content-Disposition"] = f'attachment; filename="exposure_{start}_{end}.{fmt}"'
+        resp["Vary"] = "Accept-Encoding"
+        if use_gzip:
+            resp["Content-Encoding"] = "gzip"
+        return resp
+    return ctx.conditional("export", {"format": fmt, "keywords": keywords, "gzip": use_gzip}, build)
+
 @api_view(["GET"])
-def top5_compare(request):
+@_with_context
+def top5_compare(request, ctx: RequestContext):
     """
     GET /api/exposure/top5_compare?days=7&normalized=false&cum=false&smooth=0
+        &ema=0&wow=false|true|pct&anomalies=false&z=3&z_window=28&resolution=auto
     回傳結構：
     {
       "period":{"start","end","days"},
       "keywords":["kw1",...,"kw5"],
       "dates":["YYYY-MM-DD",...],
-      "series":[{"name":"kw1","data":[...]}, ...]  # 五條線一起
+      "series":[{"name":"kw1","data":[...]}, ...],  # 五條線一起
+      "anomalies":[{"name","date","value","z"}, ...]  # anomalies=true 時
     }
+    轉換順序：占比 -> 累積 -> 平滑（smooth=SMA 視窗，ema=EMA span；累積時不平滑）-> 週增減（wow）
+    anomalies 以原始曝光、前 z_window 個 bucket 的 z-score 判定 |z| >= z
+    週 / 月解析度時 smooth、ema、z_window 以 bucket 計，wow 與前一個 bucket 比較
     """
-    start, end, total = _parse_period(request)
-    top5, dates, grid = _compute_top5_grid(start, end)
+    resolution = ctx.resolution
 
-    # 參數：占比 / 累積 / 平滑
+    # 參數：占比 / 累積 / 平滑 / 週增減 / 異常
     q = request.query_params
     normalized = q.get("normalized", "false").lower() in ("1","true","yes")
     cumulative = q.get("cum", "false").lower() in ("1","true","yes")
-    smooth = int(q.get("smooth", "0") or 0)
-
-    # 每日總量（供占比）
-    day_totals = {dt: sum(grid[kw][dt] for kw in top5) for dt in dates}
-
-    series = []
-    for kw in top5:
-        y = [grid[kw][dt] for dt in dates]
-        if normalized:
-            y = [ (v / day_totals[dt]) if day_totals[dt] > 0 else 0.0 for v, dt in zip(y, dates) ]
-        if cumulative:
-            c, yy = 0.0, []
-            for v in y:
-                c += v
-                yy.append(c)
-            y = yy
-        if smooth and not cumulative:
-            y = _sma([float(v) for v in y], smooth)
-        series.append({"name": kw, "data": y})
-
-    return Response({
-        "period": {"start": start.isoformat(), "end": end.isoformat(), "days": total},
-        "keywords": top5,
-        "dates": dates,
-        "series": series,
-        "meta": {"normalized": normalized, "cumulative": cumulative, "smooth": smooth}
-    })
-
-def _parse_period_from_request(q):
-    # 共用：解析期間，預設 days=7，上限 90
+    wow = q.get("wow", "false").lower()
+    wow_mode = "pct" if wow == "pct" else ("abs" if wow in ("1","true","yes") else None)
+    flag_anomalies = q.get("anomalies", "false").lower() in ("1","true","yes")
     try:
-        days = int(q.get("days", 7))
-    except Exception:
-        days = 7
-    days = max(1, min(days, 90))
-
-    if q.get("start") and q.get("end"):
-        start = date.fromisoformat(q["start"])
-        end = date.fromisoformat(q["end"])
-        total = (end - start).days + 1
-        if total > 90:
-            end = start + timedelta(days=89)
-            total = 90
-    else:
-        end = date.today()
-        start = end - timedelta(days=days - 1)
-        total = days
-    return start, end, total
+        smooth = int(q.get("smooth", "0") or 0)
+        ema_span = int(q.get("ema", "0") or 0)
+        z_threshold = float(q.get("z", "3") or 3)
+        z_window = max(2, int(q.get("z_window", "28") or 28))
+    except ValueError:
+        return Response({"error": "smooth, ema, z and z_window must be numbers"}, status=400)
+
+    def compute():
+        grid = _compute_top5_grid(ctx.start, ctx.end, resolution)
+        top5, dates = grid.names, grid.dates
+        raw = grid.as_float()
+        m = transforms.apply(raw, normalized, cumulative, smooth, ema_span, wow_mode,
+                             wow_lag=transforms.WEEK if resolution == "day" else 1)
+        # 沒有任何轉換時維持整數輸出
+        as_int = not (normalized or cumulative or smooth or ema_span or wow_mode)
+        rows = transforms.to_lists(m, as_int=as_int)
+
+        meta = {"normalized": normalized, "cumulative": cumulative, "smooth": smooth}
+        meta.update(ema=ema_span, wow=wow_mode or False, **_series_meta(grid))
+        out = {
+            "period": ctx.period(),
+            "keywords": top5,
+            "dates": dates,
+            "series": [{"name": kw, "data": row} for kw, row in zip(top5, rows)],
+            "meta": meta,
+        }
+        if flag_anomalies:
+            meta.update(anomalies=True, z=z_threshold, z_window=z_window)
+            out["anomalies"] = transforms.anomalies(raw, top5, dates, z_threshold, z_window)
+        return out
+
+    params = {"normalized": normalized, "cum": cumulative, "smooth": smooth, "ema": ema_span, "wow": wow_mode,
+              "resolution": resolution}
+    if flag_anomalies:
+        params.update(anomalies=True, z=z_threshold, z_window=z_window)
+
+    def build():
+        payload, hit = ctx.cached("top5_compare", params, compute)
+        return _with_cache_header(Response(payload), hit)
+    return ctx.conditional("top5_compare", params, build)
 
 # Note: crawl_top5_news_csv and crawl_top5_news_json functions removed
 # They require the crawler module which is not available
 # These endpoints are not used by the Angular frontend
 
+def _pull_plan(ctx: RequestContext) -> Tuple[Optional[str], date, date]:
+    """(?pull 模式，不補抓時 None；補抓起日；補抓迄日)"""
+    # Check if auto-pull is enabled (default: true)
+    pull_mode = ctx.query.get("pull", "true").lower()
+    # GSC 只保留約 16 個月：更早的日期不必（也無法）補抓
+    pull_start = max(ctx.start, gsc_history_start())
+    # 最近 GSC_SYNC_LAG_DAYS 天 GSC 還沒有資料（同 sync.plan_spans）：抓了也是空的，只會一直判定缺漏
+    pull_end = min(ctx.end, date.today() - timedelta(days=getattr(settings, "GSC_SYNC_LAG_DAYS", 1)))
+    if pull_mode not in ("true", "1", "yes", "sync") or pull_start > pull_end:
+        return None, pull_start, pull_end
+    return pull_mode, pull_start, pull_end
+
+def _queued(status: dict) -> dict:
+    status['pulled'] = False
+    status['state'] = 'PENDING' if status['job_id'] else None
+    return status
+
+def _pull_failed(e: Exception) -> dict:
+    # If scheduling fails, continue with existing data
+    return {
+        'had_data': False,
+        'pulled': False,
+        'error': str(e)
+    }
+
+def _maybe_pull(request, ctx: RequestContext) -> Tuple[dict, str]:
+    """
+    ?pull=true|sync|false 的共用處理（top5_timeseries_auto / dashboard_bundle）
+    回傳 (pull_status 或 None, 用於 ETag 的 pull 模式)
+    """
+    pull_mode, pull_start, pull_end = _pull_plan(ctx)
+    if pull_mode is None:
+        return None, None
+    try:
+        keywords = getattr(settings, 'KEYWORD_TRACK_LIST', [])
+        if pull_mode == "sync":
+            pull_status = auto_pull_if_needed(pull_start, pull_end, keywords)
+        else:
+            pull_status = _queued(request_pull(pull_start, pull_end, keywords))
+    except Exception as e:
+        pull_status = _pull_failed(e)
+    return pull_status, pull_mode
+
 @api_view(["GET"])
-def top5_timeseries_auto(request):
+@_with_context
+def top5_timeseries_auto(request, ctx: RequestContext):
     """
-    Same as top5_timeseries, but automatically pulls from GSC if data is missing.
+    Same as top5_timeseries, but schedules a background GSC pull if data is missing.
 
     GET /api/exposure/top5_timeseries_auto?start=YYYY-MM-DD&end=YYYY-MM-DD&pull=true
 
     Query params:
-    - start, end: Date range
-    - pull: 'true' to enable auto-pull (default: 'true')
+    - start, end: Date range (long ranges come back as weekly / monthly buckets, see meta.resolution)
+    - pull: 'true' to enqueue a Celery pull for missing cells (default: 'true');
+            'sync' to pull inline before answering (blocks the worker; scripts only)
+
+    The response always carries the data currently in the database. When a pull
+    was scheduled, pull_status.job_id can be polled at /api/exposure/pull_status.
+    Concurrent requests for the same range share one job.
+
+    When the range needs no pull the response carries ETag / Last-Modified
+    like top5_timeseries and a matching If-None-Match gets a 304.
     """
-    start, end, total = _parse_period(request)
+    pull_status, pull_key = _maybe_pull(request, ctx)
 
-    # Check if auto-pull is enabled (default: true)
-    enable_pull = request.query_params.get("pull", "true").lower() in ("true", "1", "yes")
+    def build():
+        # 與 top5_timeseries 共用快取；pull 寫入後 generation 會變，自然失效
+        payload, _ = _timeseries_payload(ctx)
+        response = dict(payload)
 
-    pull_status = None
-    if enable_pull:
-        try:
-            # Check and pull if needed
-            from django.conf import settings
-            keywords = getattr(settings, 'KEYWORD_TRACK_LIST', [])
-            pull_status = auto_pull_if_needed(start, end, keywords)
-        except Exception as e:
-            # If auto-pull fails, continue with existing data
-            pull_status = {
-                'had_data': False,
-                'pulled': False,
-                'error': str(e)
-            }
-
-    # Get the data (whether pulled or not)
-    top5, dates, grid = _compute_top5_grid(start, end)
-    series = [{"name": kw, "data": [grid[kw][dt] for dt in dates]} for kw in top5]
-
-    response = {
-        "period": {"start": start.isoformat(), "end": end.isoformat(), "days": total},
-        "keywords": top5,
-        "dates": dates,
-        "series": series
+        # Add pull status if auto-pull was attempted
+        if pull_status:
+            response["pull_status"] = pull_status
+
+        return Response(response)
+
+    if pull_status and not pull_status.get("had_data"):
+        # 回應帶著這次排入 / 共用的 job 狀態，不能讓瀏覽器沿用
+        return build()
+    return ctx.conditional("top5_timeseries_auto", {"resolution": ctx.resolution, "pull": pull_key}, build)
+
+# dashboard_bundle 未指定 smooth 時的 SMA 視窗（以 bucket 計）
+BUNDLE_SMOOTH = {"day": 7, "week": 4, "month": 3}
+_BUNDLE_RENDERERS = [JSONRenderer] + ([MsgPackRenderer] if MsgPackRenderer.available() else [])
+
+def _bundle_job(ctx: RequestContext, smooth: int) -> Tuple[str, dict, Callable[[], dict]]:
+    """一次查詢 Top-5 grid，算出四種序列 + 期間統計；series / stats 以 keywords 順序的陣列存放"""
+    resolution = ctx.resolution
+
+    def compute():
+        ranked, grid = _compute_topn_grid(ctx.start, ctx.end, 5, "impressions", resolution=resolution)
+        raw = grid.as_float()
+        totals = period_totals(ctx.start, ctx.end, [kid for kid, _, _ in ranked])
+        rows = [totals.get(kid, Totals(0, 0, 0.0, 0)) for kid, _, _ in ranked]
+        return {
+            "period": ctx.period(),
+            "keywords": grid.names,
+            "dates": grid.dates,
+            "series": {
+                "raw": grid.data(),
+                "normalized": transforms.to_lists(transforms.normalize(raw)),
+                "cumulative": transforms.to_lists(transforms.cumulative(grid.values), as_int=True),
+                "smoothed": transforms.to_lists(transforms.sma(raw, smooth)),
+            },
+            "stats": {
+                "impressions": [t.impressions for t in rows],
+                "clicks": [t.clicks for t in rows],
+                "ctr": [t.ctr for t in rows],
+                "position": [t.position for t in rows],
+            },
+            "meta": {**_series_meta(grid), "smooth": smooth},
+        }
+    return "dashboard_bundle", {"resolution": resolution, "smooth": smooth}, compute
+
+def _bundle_options(ctx: RequestContext) -> Tuple[int, bool]:
+    """(smooth, compact)；smooth 不是整數時 ValueError"""
+    smooth = int(ctx.query.get("smooth") or BUNDLE_SMOOTH[ctx.resolution])
+    compact = ctx.query.get("compact", "false").lower() in ("1", "true", "yes")
+    return max(1, smooth), compact
+
+def _compact_value(v, ndigits: int = 4):
+    # 整數值的 float 以 int 輸出：JSON 少 ".0"，msgpack 1-3 bytes 取代 9 bytes 的 float64
+    if v is None or isinstance(v, int):
+        return v
+    v = round(v, ndigits)
+    return int(v) if v.is_integer() else v
+
+def _round_rows(rows: List[List]) -> List[List]:
+    return [[_compact_value(v) for v in row] for row in rows]
+
+def _bundle_body(bundle: dict, compact: bool) -> dict:
+    """compact：series 為與 keywords 對齊的二維陣列、stats 為欄位陣列、小數取 4 位；否則展開成物件"""
+    names = bundle["keywords"]
+    if compact:
+        return {**bundle,
+                "series": {k: _round_rows(rows) for k, rows in bundle["series"].items()},
+                "stats": {k: _round_rows([col])[0] for k, col in bundle["stats"].items()}}
+    stats = bundle["stats"]
+    return {**bundle,
+            "series": {k: [{"name": n, "data": row} for n, row in zip(names, rows)]
+                       for k, rows in bundle["series"].items()},
+            "stats": [{"name": n, **{k: stats[k][i] for k in stats}} for i, n in enumerate(names)]}
+
+@api_view(["GET"])
+@renderer_classes(_BUNDLE_RENDERERS)
+@_with_context
+def dashboard_bundle(request, ctx: RequestContext):
+    """
+    GET /api/exposure/dashboard_bundle?start=YYYY-MM-DD&end=YYYY-MM-DD&pull=true&smooth=7&compact=false
+    儀表板一次取得：Top-5 的原始 / 占比 / 累積 / 平滑序列 + 每個關鍵字的期間曝光、點擊、CTR、平均排名
+    （Top-5 grid 只查一次；pull 同 top5_timeseries_auto）
+    compact=true：series / stats 改為與 keywords 對齊的陣列
+    Accept: application/msgpack 或 ?format=msgpack：以 MessagePack 編碼（需安裝 msgpack）
+    {
+      "period", "keywords", "dates",
+      "series": {"raw"|"normalized"|"cumulative"|"smoothed": [{"name","data"}, ...]},
+      "stats": [{"name","impressions","clicks","ctr","position"}, ...],
+      "meta": {"resolution","bucket_days","smooth"},
+      "pull_status": {...}  # 有嘗試補抓時
     }
+    """
+    try:
+        smooth, compact = _bundle_options(ctx)
+    except ValueError:
+        return Response({"error": "smooth must be an integer"}, status=400)
+    pull_status, pull_key = _maybe_pull(request, ctx)
+
+    def build():
+        bundle, hit = ctx.cached(*_bundle_job(ctx, smooth))
+        body = _bundle_body(bundle, compact)
+        if pull_status:
+            body["pull_status"] = pull_status
+        resp = _with_cache_header(Response(body), hit)
+        patch_vary_headers(resp, ["Accept"])
+        return resp
+
+    if pull_status and not pull_status.get("had_data"):
+        return build()
+    params = {"resolution": ctx.resolution, "smooth": smooth, "compact": compact, "pull": pull_key,
+              "format": request.accepted_renderer.format}
+    return ctx.conditional("dashboard_bundle", params, build)
+
+@api_view(["GET"])
+def pull_status(request):
+    """
+    GET /api/exposure/pull_status?job_id=<id>
+    回傳 {job_id, state, ready, start, end, keywords, result|error}
+    """
+    job_id = request.query_params.get("job_id")
+    if not job_id:
+        return Response({"error": "job_id is required"}, status=400)
+    status = job_status(job_id)
+    if status is None:
+        return Response({"error": "unknown job_id"}, status=404)
+    return Response(status)
+
+@api_view(["GET", "DELETE"])
+def cache_stats(request):
+    """
+    GET    /api/exposure/cache_stats -> {endpoint: {hits, misses, hit_ratio}}
+    DELETE /api/exposure/cache_stats -> 計數歸零（回傳歸零後的統計）
+    """
+    if request.method == "DELETE":
+        response_cache.reset_stats()
+    return Response(response_cache.stats())
 
-    # Add pull status if auto-pull was attempted
-    if pull_status:
-        response["pull_status"] = pull_status
+@api_view(["GET", "POST"])
+def archive_index(request):
+    """
+    GET  /api/exposure/archive  -> 已封存月份清單 {"YYYY-MM": {format, file, rows, bytes, written_at}}
+    POST /api/exposure/archive  body: {"start","end","format","force"} -> 排入背景封存 {"task_id"}
+    """
+    if request.method == "GET":
+        return Response(archive.load_manifest())
 
-    return Response(response)
+    from django.conf import settings
+    from .tasks import archive_exposure_months
+    body = request.data or {}
+    fmt = body.get("format") or settings.EXPOSURE_ARCHIVE_FORMAT
+    if fmt not in archive.FORMATS:
+        return Response({"error": f"format must be one of {', '.join(archive.FORMATS)}"}, status=400)
+    try:
+        for k in ("start", "end"):
+            if body.get(k):
+                date.fromisoformat(body[k])
+    except ValueError:
+        return Response({"error": "start/end must be YYYY-MM-DD"}, status=400)
+    res = archive_exposure_months.delay(body.get("start"), body.get("end"), fmt, bool(body.get("force")))
+    return Response({"task_id": res.id}, status=202)
+
+@api_view(["GET"])
+def archive_file(request, month: str):
+    """GET /api/exposure/archive/YYYY-MM -> 下載該月的 Parquet / Arrow 檔"""
+    entry = archive.load_manifest().get(month)
+    if entry is None:
+        raise Http404("month not archived")
+    path = archive.archive_dir() / entry["file"]
+    if not path.exists():
+        raise Http404("archive file missing")
+    content_type = "application/vnd.apache.parquet" if entry["format"] == "parquet" \
+        else "application/vnd.apache.arrow.file"
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=entry["file"], content_type=content_type)
@@ -0,0 +1,6 @@
+import os
+from django.core.asgi import get_asgi_application
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loanserp.base')
+# ASGI 部署預設改用 exposure.async_views
+os.environ.setdefault('EXPOSURE_ASYNC_VIEWS', 'true')
+application = get_asgi_application()
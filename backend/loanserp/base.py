@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "dev-secret")
@@ -87,6 +88,25 @@ CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", REDIS_URL)
 CELERY_TASK_TIME_LIMIT = int(os.getenv("CELERY_TASK_TIME_LIMIT","120"))
 CELERY_TASK_SOFT_TIME_LIMIT = int(os.getenv("CELERY_TASK_SOFT_TIME_LIMIT","90"))
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "incremental-gsc-sync": {
+        "task": "exposure.tasks.incremental_gsc_sync",
+        "schedule": crontab(hour=int(os.getenv("GSC_SYNC_HOUR","6")), minute=0),
+    },
+    # 每月初把已定案的月份封存成 Parquet / Arrow（已封存的跳過）
+    "archive-exposure-months": {
+        "task": "exposure.tasks.archive_exposure_months",
+        "schedule": crontab(day_of_month=os.getenv("EXPOSURE_ARCHIVE_DAY","6"), hour=7, minute=0),
+    },
+    # 每日預建未來月份的 partition、清空 DEFAULT partition、依保留期限 detach 舊月份
+    "maintain-exposure-partitions": {
+        "task": "exposure.tasks.maintain_exposure_partitions",
+        "schedule": crontab(hour=int(os.getenv("EXPOSURE_PARTITION_HOUR","5")), minute=30),
+    },
+}
+# Background GSC pulls (exposure.tasks.pull_gsc_range) may run longer than ordinary tasks
+GSC_PULL_TASK_TIME_LIMIT = int(os.getenv("GSC_PULL_TASK_TIME_LIMIT","1800"))
 
 # Business settings
 KEYWORD_TRACK_LIST = [k.strip() for k in os.getenv(
@@ -104,3 +124,47 @@ GSC_PROPERTY_URI = os.getenv("GSC_PROPERTY_URI","sc-domain:alphaloan.co")
 GSC_CLIENT_SECRETS_FILE = os.getenv("GSC_CLIENT_SECRETS_FILE", str(BASE_DIR / "credentials" / "client_secret.json"))
 GSC_TOKEN_FILE = os.getenv("GSC_TOKEN_FILE", str(BASE_DIR / "credentials" / "token.json"))
 GSC_SCOPES = ["https://www.googleapis.com/auth/webmasters.readonly"]
+# Refresh the cached OAuth token when it expires within this many seconds
+GSC_TOKEN_REFRESH_MARGIN_SEC = int(os.getenv("GSC_TOKEN_REFRESH_MARGIN_SEC","300"))
+GSC_HTTP_TIMEOUT = int(os.getenv("GSC_HTTP_TIMEOUT","60"))
+# Fetch many keywords per Search Analytics call (DATE x QUERY + includingRegex, paginated)
+GSC_BATCHED_FETCH = os.getenv("GSC_BATCHED_FETCH","true").lower() == "true"
+# Concurrent pull engine: parallel fetches, Search Analytics QPS budget (quota is 1200 QPM per site), retries on 429/5xx
+GSC_PULL_WORKERS = int(os.getenv("GSC_PULL_WORKERS","4"))
+GSC_QPS = float(os.getenv("GSC_QPS","10"))
+GSC_QPS_BURST = float(os.getenv("GSC_QPS_BURST", str(GSC_QPS)))
+GSC_MAX_RETRIES = int(os.getenv("GSC_MAX_RETRIES","5"))
+# Incremental sync: GSC revises the last few days, so re-fetch them every run
+GSC_SYNC_REFETCH_DAYS = int(os.getenv("GSC_SYNC_REFETCH_DAYS","3"))
+GSC_SYNC_LAG_DAYS = int(os.getenv("GSC_SYNC_LAG_DAYS","1"))
+GSC_SYNC_INITIAL_DAYS = int(os.getenv("GSC_SYNC_INITIAL_DAYS","30"))
+# Search Analytics keeps about 16 months; pulls never reach further back than this
+GSC_MAX_HISTORY_DAYS = int(os.getenv("GSC_MAX_HISTORY_DAYS","486"))
+# Rows per INSERT ... ON CONFLICT statement when ingesting snapshots
+GSC_INGEST_BATCH_SIZE = int(os.getenv("GSC_INGEST_BATCH_SIZE","5000"))
+
+# Exposure response cache: finalized ranges keep long, ranges inside GSC's revision window expire quickly
+EXPOSURE_CACHE_ENABLED = os.getenv("EXPOSURE_CACHE_ENABLED","true").lower() == "true"
+EXPOSURE_CACHE_TTL = int(os.getenv("EXPOSURE_CACHE_TTL","86400"))
+EXPOSURE_CACHE_TTL_RECENT = int(os.getenv("EXPOSURE_CACHE_TTL_RECENT","300"))
+# ETag / Last-Modified on exposure responses (from the per-date ingestion stamps); If-None-Match -> 304
+EXPOSURE_CONDITIONAL_GET = os.getenv("EXPOSURE_CONDITIONAL_GET","true").lower() == "true"
+# Route the hot exposure endpoints to exposure.async_views (on by default under loanserp.asgi / uvicorn)
+EXPOSURE_ASYNC_VIEWS = os.getenv("EXPOSURE_ASYNC_VIEWS","false").lower() == "true"
+# Time series resolution: daily buckets up to EXPOSURE_DAILY_MAX_DAYS, ISO weeks up to EXPOSURE_WEEKLY_MAX_DAYS,
+# calendar months beyond (served from ExposureRollup); ranges are capped at EXPOSURE_MAX_RANGE_DAYS
+EXPOSURE_DAILY_MAX_DAYS = int(os.getenv("EXPOSURE_DAILY_MAX_DAYS","90"))
+EXPOSURE_WEEKLY_MAX_DAYS = int(os.getenv("EXPOSURE_WEEKLY_MAX_DAYS","366"))
+EXPOSURE_MAX_RANGE_DAYS = int(os.getenv("EXPOSURE_MAX_RANGE_DAYS","1096"))
+# Top-N ranking by ctr / position_gain skips keywords with fewer impressions than this in the period
+EXPOSURE_RANK_MIN_IMPRESSIONS = int(os.getenv("EXPOSURE_RANK_MIN_IMPRESSIONS","10"))
+# Rows fetched per server-side cursor round trip by the streaming export
+EXPOSURE_EXPORT_CHUNK_SIZE = int(os.getenv("EXPOSURE_EXPORT_CHUNK_SIZE","5000"))
+# Columnar monthly archive of snapshots (Parquet / Arrow IPC) for offline analytics
+EXPOSURE_ARCHIVE_DIR = os.getenv("EXPOSURE_ARCHIVE_DIR", str(BASE_DIR / "archive"))
+EXPOSURE_ARCHIVE_FORMAT = os.getenv("EXPOSURE_ARCHIVE_FORMAT","parquet")
+# Monthly partitions of ExposureSnapshot: months created ahead of time, and how many months stay attached
+# (0 = keep everything; otherwise at least 16, GSC's own retention). Older months are archived, then detached.
+EXPOSURE_PARTITION_PREMAKE_MONTHS = int(os.getenv("EXPOSURE_PARTITION_PREMAKE_MONTHS","3"))
+EXPOSURE_PARTITION_RETAIN_MONTHS = int(os.getenv("EXPOSURE_PARTITION_RETAIN_MONTHS","0"))
+EXPOSURE_PARTITION_DROP_DETACHED = os.getenv("EXPOSURE_PARTITION_DROP_DETACHED","false").lower() == "true"
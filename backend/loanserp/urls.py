@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from exposure.views import health, top5_timeseries, top5_timeseries_csv, top5_compare, top5_timeseries_auto
+from exposure.views import health, top5_timeseries, topn_timeseries, top5_timeseries_csv, top5_compare, top5_timeseries_auto, dashboard_bundle, pull_status, cache_stats, export_snapshots, archive_index, archive_file
+
+if settings.EXPOSURE_ASYNC_VIEWS:
+    # ASGI 部署：最常用的端點改走 async view（回應格式相同）
+    from exposure.async_views import top5_timeseries, top5_timeseries_auto, dashboard_bundle, pull_status
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/health", health),
     path("api/exposure/top5_timeseries", top5_timeseries),            # JSON 給前端畫圖 (no auto-pull)
-    path("api/exposure/top5_timeseries_auto", top5_timeseries_auto),  # JSON with auto-pull from GSC
+    path("api/exposure/top5_timeseries_auto", top5_timeseries_auto),  # JSON + 背景 GSC 拉取 (Celery)
+    path("api/exposure/dashboard_bundle", dashboard_bundle),          # 儀表板一次取得四種序列 + 統計（JSON / msgpack）
+    path("api/exposure/pull_status", pull_status),                    # 查詢背景拉取 job 狀態
     path("api/exposure/top5_timeseries.csv", top5_timeseries_csv),    # 仍保留 CSV 下載
+    path("api/exposure/export", export_snapshots),                    # 全量串流匯出 CSV / NDJSON（可 gzip）
+    path("api/exposure/archive", archive_index),                      # Parquet / Arrow 月封存：清單 / 排程
+    path("api/exposure/archive/<str:month>", archive_file),           # 下載某月封存檔
     path("api/exposure/top5_compare", top5_compare),
+    path("api/exposure/topn_timeseries", topn_timeseries),            # Top-N（n<=100，可選排名指標）
+    path("api/exposure/cache_stats", cache_stats),                    # response cache 命中統計
 ]
@@ -1,11 +1,12 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnDestroy, OnInit } from '@angular/core';
 import { CommonModule } from '@angular/common';
-import { forkJoin } from 'rxjs';
+import { Subscription, timer } from 'rxjs';
+import { filter, switchMap, take } from 'rxjs/operators';
 import { DateRangePickerComponent } from '../date-range-picker/date-range-picker.component';
 import { ChartCardComponent } from '../chart-card/chart-card.component';
 import { BackendApiService } from '../../services/backend-api.service';
 import { LlmApiService } from '../../services/llm-api.service';
-import { DateRange, TimeseriesResponse, TrendRequest, SeriesItem } from '../../models/api.models';
+import { DashboardBundle, DateRange, KeywordStats, TimeseriesResponse, TrendRequest, SeriesItem } from '../../models/api.models';
 
 interface ChartWithExplanation {
   title: string;
@@ -21,7 +22,7 @@ interface ChartWithExplanation {
   templateUrl: './dashboard.component.html',
   styleUrls: ['./dashboard.component.css']
 })
-export class DashboardComponent implements OnInit {
+export class DashboardComponent implements OnInit, OnDestroy {
   loading = false;
   error = '';
   dates: string[] = [];
@@ -30,6 +31,10 @@ export class DashboardComponent implements OnInit {
   // 6 charts: 1 comparison + 5 individual keyword charts
   charts: ChartWithExplanation[] = [];
 
+  // Set while a background GSC pull for the current range is running
+  pullPending = false;
+  private pullWatch?: Subscription;
+
   constructor(
     private backendApi: BackendApiService,
     private llmApi: LlmApiService
@@ -40,6 +45,10 @@ export class DashboardComponent implements OnInit {
     this.initializeCharts();
   }
 
+  ngOnDestroy(): void {
+    this.pullWatch?.unsubscribe();
+  }
+
   private initializeCharts(): void {
     this.charts = [
       { title: 'Top 5 關鍵字曝光比較', data: null, explanation: '', loading: false },
@@ -54,6 +63,8 @@ export class DashboardComponent implements OnInit {
   onDateRangeSelected(dateRange: DateRange): void {
     this.error = '';
     this.loading = true;
+    this.pullWatch?.unsubscribe();
+    this.pullPending = false;
     this.initializeCharts();
 
     const startStr = this.formatDate(dateRange.start);
@@ -61,9 +72,10 @@ export class DashboardComponent implements OnInit {
 
     console.log('Fetching data for date range:', startStr, 'to', endStr);
 
-    // Fetch data from backend with auto-pull enabled
-    this.backendApi.getTop5TimeseriesAuto(startStr, endStr, true).subscribe({
-      next: (response: TimeseriesResponse) => {
+    // Fetch data from backend with auto-pull enabled (series + stats in one request)
+    this.backendApi.getDashboardBundle(startStr, endStr, true).subscribe({
+      next: (bundle: DashboardBundle) => {
+        const response = this.toTimeseries(bundle);
         console.log('Received response from backend:', response);
         console.log('Response series:', response.series);
         console.log('Response keywords:', response.keywords);
@@ -73,8 +85,17 @@ export class DashboardComponent implements OnInit {
         this.dates = response.dates;
         this.keywords = response.keywords;
 
+        // Missing data is pulled in the background; reload once the job is done
+        const jobId = response.pull_status?.job_id;
+        if (jobId) {
+          this.watchPullJob(jobId, startStr, endStr);
+        }
+
         // Check if we have data
         if (!response.series || response.series.length === 0) {
+          if (jobId) {
+            return;  // 等待背景拉取完成後再顯示
+          }
           console.warn('No series data received from backend');
           this.error = '後端返回的資料為空，請檢查資料庫是否有資料';
           return;
@@ -87,7 +108,7 @@ export class DashboardComponent implements OnInit {
         }
 
         // Update chart data
-        this.updateChartData(response);
+        this.updateChartData(response, bundle.stats);
 
         // Fetch LLM explanations for all charts simultaneously
         this.fetchAllLLMExplanations(response);
@@ -103,7 +124,56 @@ export class DashboardComponent implements OnInit {
     });
   }
 
-  private updateChartData(response: TimeseriesResponse): void {
+  private watchPullJob(jobId: string, startStr: string, endStr: string): void {
+    this.pullPending = true;
+    this.pullWatch = timer(2000, 3000).pipe(
+      switchMap(() => this.backendApi.getPullStatus(jobId)),
+      filter(status => status.ready),
+      take(1),
+      switchMap(() => this.backendApi.getDashboardBundle(startStr, endStr, false))
+    ).subscribe({
+      next: (bundle: DashboardBundle) => {
+        const response = this.toTimeseries(bundle);
+        this.pullPending = false;
+        if (!response.series || response.series.length === 0) {
+          this.error = '後端返回的資料為空，請檢查資料庫是否有資料';
+          return;
+        }
+        this.error = '';
+        this.dates = response.dates;
+        this.keywords = response.keywords;
+        this.updateChartData(response, bundle.stats);
+        this.fetchAllLLMExplanations(response);
+      },
+      error: (err) => {
+        this.pullPending = false;
+        console.error('Pull status error:', err);
+      }
+    });
+  }
+
+  // Charts and LLM requests use the raw series; the bundle's other shapes stay available on the response
+  private toTimeseries(bundle: DashboardBundle): TimeseriesResponse {
+    return {
+      period: bundle.period,
+      keywords: bundle.keywords,
+      dates: bundle.dates,
+      series: bundle.series.raw,
+      meta: bundle.meta,
+      pull_status: bundle.pull_status
+    };
+  }
+
+  private statsLabel(stats?: KeywordStats): string {
+    if (!stats) {
+      return '';
+    }
+    const position = stats.position === null ? '-' : stats.position.toFixed(1);
+    return `（曝光 ${stats.impressions.toLocaleString()}・點擊 ${stats.clicks.toLocaleString()}・` +
+      `CTR ${(stats.ctr * 100).toFixed(2)}%・平均排名 ${position}）`;
+  }
+
+  private updateChartData(response: TimeseriesResponse, stats: KeywordStats[] = []): void {
     console.log('updateChartData called with response:', response);
 
     // Chart 0: Comparison chart with all 5 keywords
@@ -114,7 +184,7 @@ export class DashboardComponent implements OnInit {
     // Charts 1-5: Individual keyword charts
     response.series.forEach((series, index) => {
       if (index < 5) {
-        this.charts[index + 1].title = `${series.name} - 曝光趨勢`;
+        this.charts[index + 1].title = `${series.name} - 曝光趨勢${this.statsLabel(stats[index])}`;
         this.charts[index + 1].data = series.data;
         console.log(`Set charts[${index + 1}].data (${series.name}) to:`, series.data);
       }
@@ -133,7 +203,7 @@ export class DashboardComponent implements OnInit {
     ) + 1;
 
     // Prepare LLM requests for each chart
-    const llmRequests = this.charts.map((chart, index) => {
+    const llmRequests: TrendRequest[] = this.charts.map((chart, index) => {
       const request: TrendRequest = {
         period: {
           start: period.start,
@@ -149,19 +219,19 @@ export class DashboardComponent implements OnInit {
         use_cache: true
       };
 
-      return this.llmApi.summarizeTrend(request);
+      return request;
     });
 
-    // Execute all LLM requests in parallel (synchronously from UI perspective)
-    forkJoin(llmRequests).subscribe({
-      next: (responses) => {
-        responses.forEach((response, index) => {
+    // All charts in one batch call (the broker dedupes and packs them into one prompt per provider)
+    this.llmApi.summarizeTrendBatch(llmRequests).subscribe({
+      next: (batch) => {
+        batch.results.forEach((response, index) => {
           this.charts[index].loading = false;
 
           // Format the LLM explanation
           let explanation = '';
 
-          if (response.provider_outputs && response.provider_outputs.length > 0) {
+          if (response && response.provider_outputs && response.provider_outputs.length > 0) {
             const output = response.provider_outputs[0];
 
             explanation = `${output.summary}\n\n`;
@@ -3,6 +3,9 @@ import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { DateRange } from '../../models/api.models';
 
+// Matches EXPOSURE_MAX_RANGE_DAYS; the backend switches to weekly / monthly buckets past 90 days / a year
+const MAX_RANGE_DAYS = 1096;
+
 @Component({
   selector: 'app-date-range-picker',
   standalone: true,
@@ -34,9 +37,9 @@ export class DateRangePickerComponent {
     this.startDate = this.formatDate(defaultStart);
     this.endDate = this.formatDate(today);
 
-    // Min date: 90 days ago from today
+    // Min date: MAX_RANGE_DAYS ago from today
     const minDate = new Date(today);
-    minDate.setDate(today.getDate() - 90);
+    minDate.setDate(today.getDate() - MAX_RANGE_DAYS);
     this.minDate = this.formatDate(minDate);
   }
 
@@ -78,17 +81,17 @@ export class DateRangePickerComponent {
       return;
     }
 
-    // Validate maximum 90 days
-    if (daysDiff > 90) {
-      this.errorMessage = '日期範圍最多 90 天';
+    // Validate maximum range (about 3 years)
+    if (daysDiff > MAX_RANGE_DAYS) {
+      this.errorMessage = `日期範圍最多 ${MAX_RANGE_DAYS} 天`;
       return;
     }
 
-    // Validate start date is within 90 days from today
+    // Validate start date is within MAX_RANGE_DAYS from today
     const minAllowedDate = new Date(today);
-    minAllowedDate.setDate(today.getDate() - 90);
+    minAllowedDate.setDate(today.getDate() - MAX_RANGE_DAYS);
     if (start < minAllowedDate) {
-      this.errorMessage = '開始日期不能早於 90 天前';
+      this.errorMessage = `開始日期不能早於 ${MAX_RANGE_DAYS} 天前`;
       return;
     }
 
@@ -11,11 +11,68 @@ export interface SeriesItem {
   data: number[];
 }
 
+// Ranges over 90 days come back in weekly, and over a year in monthly, buckets;
+// dates[i] is the first day of bucket i inside the period, bucket_days[i] its length
+export type Resolution = 'day' | 'week' | 'month';
+
+export interface SeriesMeta {
+  resolution: Resolution;
+  bucket_days: number[];
+}
+
 export interface TimeseriesResponse {
   period: Period;
   keywords: string[];
   dates: string[];
   series: SeriesItem[];
+  meta?: SeriesMeta;
+  pull_status?: PullStatus;
+}
+
+// dashboard_bundle: the Top-5 grid in four shapes plus per-keyword period totals, in one request
+export interface KeywordStats {
+  name: string;
+  impressions: number;
+  clicks: number;
+  ctr: number;
+  position: number | null;
+}
+
+export interface DashboardBundle {
+  period: Period;
+  keywords: string[];
+  dates: string[];
+  series: {
+    raw: SeriesItem[];
+    normalized: SeriesItem[];
+    cumulative: SeriesItem[];
+    smoothed: SeriesItem[];
+  };
+  stats: KeywordStats[];
+  meta: SeriesMeta & { smooth: number };
+  pull_status?: PullStatus;
+}
+
+// Background GSC pull scheduled by top5_timeseries_auto / dashboard_bundle
+export interface PullStatus {
+  had_data: boolean;
+  pulled: boolean;
+  job_id?: string | null;
+  shared?: boolean;
+  state?: string | null;
+  missing_cells_count?: number;
+  error?: string;
+}
+
+export interface PullJobStatus {
+  job_id: string;
+  state: string;
+  ready: boolean;
+  start?: string;
+  end?: string;
+  keywords?: number;
+  result?: any;
+  error?: string;
 }
 
 export interface CompareResponse {
@@ -23,13 +80,29 @@ export interface CompareResponse {
   keywords: string[];
   dates: string[];
   series: SeriesItem[];
-  meta: {
+  meta: SeriesMeta & {
     normalized: boolean;
     cumulative: boolean;
     smooth: number;
   };
 }
 
+export type RankMetric = 'impressions' | 'clicks' | 'ctr' | 'position_gain';
+
+// Top-N (n <= 100); series data is the per-bucket value of the ranking metric
+export interface TopNResponse {
+  period: Period;
+  keywords: string[];
+  dates: string[];
+  series: { name: string; data: (number | null)[] }[];
+  scores: Record<string, number>;
+  meta: SeriesMeta & {
+    n: number;
+    metric: RankMetric;
+    min_impressions: number | null;
+  };
+}
+
 // LLM Service Models
 export interface ProviderOutput {
   provider: string;
@@ -61,6 +134,24 @@ export interface TrendRequest {
   use_cache?: boolean;
 }
 
+// POST /v1/summarize/trend:batch — results / cached are aligned with the request list;
+// a result is null when every provider failed for that entry
+export interface TrendBatchResponse {
+  results: (TrendResponse | null)[];
+  cached: boolean[];
+  llm_calls: number;
+}
+
+// POST /v1/summarize/trend:stream — server-sent events, in arrival order
+export type TrendSection = 'summary' | 'actions_short' | 'actions_mid' | 'actions_long' | 'confidence';
+
+export type TrendStreamEvent =
+  | { event: 'section'; data: { provider: string; model: string; section: TrendSection; value: string | string[] | number | null } }
+  | { event: 'provider'; data: ProviderOutput }
+  | { event: 'provider_error'; data: { provider: string; error: string } }
+  | { event: 'done'; data: TrendResponse }
+  | { event: 'error'; data: { detail: string } };
+
 export interface DateRange {
   start: Date;
   end: Date;
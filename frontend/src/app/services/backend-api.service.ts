@@ -1,7 +1,7 @@
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpParams } from '@angular/common/http';
 import { Observable } from 'rxjs';
-import { TimeseriesResponse, CompareResponse } from '../models/api.models';
+import { TimeseriesResponse, CompareResponse, DashboardBundle, PullJobStatus, RankMetric, TopNResponse } from '../models/api.models';
 
 @Injectable({
   providedIn: 'root'
@@ -34,6 +34,27 @@ export class BackendApiService {
     return this.http.get<TimeseriesResponse>(`${this.baseUrl}/exposure/top5_timeseries_auto`, { params });
   }
 
+  /**
+   * Everything the dashboard draws (raw / normalized / cumulative / smoothed series + stats) in one request,
+   * with the same auto-pull behaviour as getTop5TimeseriesAuto
+   */
+  getDashboardBundle(start: string, end: string, enablePull: boolean = true): Observable<DashboardBundle> {
+    const params = new HttpParams()
+      .set('start', start)
+      .set('end', end)
+      .set('pull', enablePull.toString());
+
+    return this.http.get<DashboardBundle>(`${this.baseUrl}/exposure/dashboard_bundle`, { params });
+  }
+
+  /**
+   * Poll a background GSC pull job scheduled by the auto endpoint
+   */
+  getPullStatus(jobId: string): Observable<PullJobStatus> {
+    const params = new HttpParams().set('job_id', jobId);
+    return this.http.get<PullJobStatus>(`${this.baseUrl}/exposure/pull_status`, { params });
+  }
+
   /**
    * Get comparison data with all top 5 keywords
    */
@@ -62,4 +83,27 @@ export class BackendApiService {
 
     return this.http.get<CompareResponse>(`${this.baseUrl}/exposure/top5_compare`, { params });
   }
+
+  /**
+   * Get Top-N keywords (n <= 100) ranked by the given metric
+   */
+  getTopNTimeseries(
+    start: string,
+    end: string,
+    n: number = 5,
+    metric: RankMetric = 'impressions',
+    minImpressions?: number
+  ): Observable<TopNResponse> {
+    let params = new HttpParams()
+      .set('start', start)
+      .set('end', end)
+      .set('n', n.toString())
+      .set('metric', metric);
+
+    if (minImpressions !== undefined) {
+      params = params.set('min_impressions', minImpressions.toString());
+    }
+
+    return this.http.get<TopNResponse>(`${this.baseUrl}/exposure/topn_timeseries`, { params });
+  }
 }
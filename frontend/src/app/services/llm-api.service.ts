@@ -1,7 +1,7 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
 import { Observable } from 'rxjs';
-import { TrendRequest, TrendResponse } from '../models/api.models';
+import { TrendBatchResponse, TrendRequest, TrendResponse, TrendStreamEvent } from '../models/api.models';
 
 @Injectable({
   providedIn: 'root'
@@ -18,6 +18,55 @@ export class LlmApiService {
     return this.http.post<TrendResponse>(`${this.baseUrl}/summarize/trend`, request);
   }
 
+  /**
+   * Summarize several charts in one call (one Redis MGET, one combined prompt per provider)
+   */
+  summarizeTrendBatch(requests: TrendRequest[]): Observable<TrendBatchResponse> {
+    return this.http.post<TrendBatchResponse>(`${this.baseUrl}/summarize/trend:batch`, { requests });
+  }
+
+  /**
+   * Streaming variant: emits each provider's sections as they complete, then `done` with the full response.
+   * EventSource cannot POST, so the SSE body is read with fetch; unsubscribing aborts the request.
+   */
+  summarizeTrendStream(request: TrendRequest): Observable<TrendStreamEvent> {
+    return new Observable<TrendStreamEvent>(subscriber => {
+      const abort = new AbortController();
+      (async () => {
+        const resp = await fetch(`${this.baseUrl}/summarize/trend:stream`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+          body: JSON.stringify(request),
+          signal: abort.signal
+        });
+        if (!resp.ok || !resp.body) {
+          throw new Error(`LLM stream failed: HTTP ${resp.status}`);
+        }
+        const reader = resp.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let sep: number;
+          while ((sep = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            const event = /^event: (.*)$/m.exec(block)?.[1];
+            const data = /^data: (.*)$/m.exec(block)?.[1];
+            if (event && data) {
+              subscriber.next({ event, data: JSON.parse(data) } as TrendStreamEvent);
+            }
+          }
+        }
+        subscriber.complete();
+      })().catch(err => {
+        if (!abort.signal.aborted) subscriber.error(err);
+      });
+      return () => abort.abort();
+    });
+  }
+
   /**
    * Health check for LLM service
    */
@@ -5,15 +5,21 @@ LoanSERP LLM Broker (FastAPI)
 - 僅根據後端提供的 GSC Top-N 關鍵字曝光時序資料，產生「趨勢摘要 + 行動建議」
 - 不上網，不抓內容
 - 支援 Gemini 與 Claude（同時呼叫、回傳各自輸出與合併摘要）
-- 使用 Redis 以「請求 payload 雜湊」為鍵做結果快取
+- 以正規化後的請求雜湊為鍵做結果快取：行程內 L1（LRU + TTL）+ Redis L2
 """
 
 import os
 import re
 import json
 import hashlib
+import math
+import time
+import uuid
 import asyncio
-from typing import List, Optional, Dict, Any
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -21,6 +27,7 @@ load_dotenv()
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, ValidationError
 import redis.asyncio as redis
 
@@ -37,6 +44,17 @@ PORT = int(os.getenv("LLM_BROKER_PORT", "9001"))
 
 REDIS_URL = os.getenv("REDIS_URL")
 CACHE_TTL = int(os.getenv("LLM_CACHE_TTL_SEC", "259200"))  # 預設 3 天
+# 快取鍵正規化：數值先取 N 位有效數字再雜湊（0 = 不量化）
+CACHE_SIG_FIGS = int(os.getenv("LLM_CACHE_SIG_FIGS", "2"))
+# 相似度層：正規化鍵未命中時，沿用同一組期間 / 日期 / 關鍵字下序列距離 <= 此值的快取答案（0 = 關閉）
+CACHE_SIM_DISTANCE = float(os.getenv("LLM_CACHE_SIM_DISTANCE", "0"))
+# 行程內 L1 快取（Redis 之前；沒有 REDIS_URL 時也有作用）：筆數 / 位元組上限與 TTL
+L1_MAX_ENTRIES = int(os.getenv("LLM_L1_MAX_ENTRIES", "512"))
+L1_MAX_BYTES = int(os.getenv("LLM_L1_MAX_BYTES", str(32 * 1024 * 1024)))
+L1_TTL = min(int(os.getenv("LLM_L1_TTL_SEC", "600")), CACHE_TTL)
+# 各副本之間透過此 Redis pub/sub 頻道通知 L1 失效
+CACHE_CHANNEL = os.getenv("LLM_CACHE_CHANNEL", "llm:trend:invalidate")
+REPLICA_ID = uuid.uuid4().hex
 
 # 例如: "gemini-2.0-flash,claude-3-5-sonnet-20241022"
 PREFERRED_MODELS = [x.strip() for x in os.getenv(
@@ -45,9 +63,37 @@ PREFERRED_MODELS = [x.strip() for x in os.getenv(
 
 OUTPUT_LANG = os.getenv("OUTPUT_LANG", "zh-tw")
 
+# /v1/summarize/trend:batch：一次最多幾筆請求；每次合併呼叫最多放幾筆分析（超過就分多次呼叫）
+BATCH_MAX_REQUESTS = int(os.getenv("LLM_BATCH_MAX_REQUESTS", "20"))
+BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", "8"))
+# 合併呼叫時 Claude 每筆分析的 max_tokens（總量上限 BATCH_MAX_TOKENS）
+MAX_TOKENS = 1400
+BATCH_MAX_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", "8000"))
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
 
+# 供應商呼叫策略：
+#   all    全部並行，等全部完成（每個供應商各一份輸出）
+#   first  全部並行，第一個成功就回傳，其餘取消
+#   hedged 先只呼叫主要供應商（PREFERRED_MODELS 排第一的）；超過其 p95 延遲仍未回來，或失敗時，才呼叫其他供應商
+DISPATCH_MODES = ("all", "first", "hedged")
+DISPATCH_MODE = os.getenv("LLM_DISPATCH_MODE", "all").strip().lower()
+if DISPATCH_MODE not in DISPATCH_MODES:
+    print(f"[ERROR] LLM_DISPATCH_MODE={DISPATCH_MODE!r} is not one of {DISPATCH_MODES}; using 'all'")
+    DISPATCH_MODE = "all"
+# 每個供應商單次呼叫的 deadline（秒）；合併呼叫依筆數放寬
+PROVIDER_TIMEOUT = {
+    name: float(os.getenv(f"LLM_{name.upper()}_TIMEOUT_SEC", os.getenv("LLM_PROVIDER_TIMEOUT_SEC", "60")))
+    for name in ("gemini", "claude")
+}
+# hedged：延遲樣本少於 HEDGE_MIN_SAMPLES 筆時，先等 LLM_HEDGE_DELAY_SEC 秒
+HEDGE_DELAY_SEC = float(os.getenv("LLM_HEDGE_DELAY_SEC", "8"))
+HEDGE_MIN_SAMPLES = 20
+# 斷路器：連續失敗（含逾時）BREAKER_FAILURES 次後，BREAKER_COOLDOWN 秒內略過該供應商
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+
 # -------------------------
 # Redis client
 # -------------------------
@@ -106,6 +152,16 @@ class TrendResponse(BaseModel):
     notes: Optional[str] = None
 
 
+class TrendBatchRequest(BaseModel):
+    requests: List[TrendRequest] = Field(..., min_items=1, max_items=BATCH_MAX_REQUESTS)
+
+
+class TrendBatchResponse(BaseModel):
+    results: List[Optional[TrendResponse]]     # 與 requests 同順序；所有供應商都失敗的那筆為 null
+    cached: List[bool]                         # 每筆是否來自快取（L1 或 Redis）
+    llm_calls: int                             # 這次實際送出的供應商呼叫數
+
+
 # -------------------------
 # Helpers
 # -------------------------
@@ -113,6 +169,80 @@ def _hash_payload(obj: Any) -> str:
     return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
 
 
+def _quantize(x: float, sig: int = CACHE_SIG_FIGS) -> float:
+    """取 sig 位有效數字：1234 與 1236 落在同一格（1200）"""
+    if not sig or not x or not math.isfinite(x):
+        return float(x)
+    return float(f"{x:.{sig}g}")
+
+
+def _sorted_series(req: TrendRequest) -> List[SeriesItem]:
+    return sorted(req.series, key=lambda s: s.name)
+
+
+def _shape(req: TrendRequest) -> Dict[str, Any]:
+    """
+    請求中影響答案、但不含數值的部分。
+    關鍵字 / 序列依名稱排序；use_cache 等非語意欄位不列入。
+    """
+    return {
+        "period": req.period.model_dump(),
+        "top_keywords": sorted(req.top_keywords),
+        "dates": req.dates,
+        "names": [s.name for s in _sorted_series(req)],
+        "output_lang": req.output_lang.lower(),
+        "short_mid_long_base_days": req.short_mid_long_base_days,
+        "mode": req.mode,
+    }
+
+
+def _cache_key(req: TrendRequest) -> str:
+    """正規化後的請求雜湊：序列排序、數值量化，小幅變動 / 浮點格式 / 關鍵字順序不影響命中"""
+    canonical = dict(_shape(req), data=[[_quantize(v) for v in s.data] for s in _sorted_series(req)])
+    return "llm:trend:" + _hash_payload(canonical)
+
+
+def _sim_key(req: TrendRequest) -> str:
+    """相似度索引：同一個 shape 下各快取鍵的原始序列"""
+    return "llm:trend:sim:" + _hash_payload(_shape(req))
+
+
+def _series_vector(req: TrendRequest) -> List[float]:
+    return [v for s in _sorted_series(req) for v in s.data]
+
+
+def _distance(a: List[float], b: List[float]) -> float:
+    """
+    兩組序列的 RMS 差除以兩者的最大絕對值（0 = 相同）。
+    與量級無關：1000 上下的 ±10 和 10 上下的 ±0.1 距離相同；整體放大一倍則為 0.5。
+    """
+    if len(a) != len(b):
+        return math.inf
+    scale = max(max(map(abs, a), default=0.0), max(map(abs, b), default=0.0))
+    if not a or not scale:
+        return 0.0
+    return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)) / len(a)) / scale
+
+
+def _for_request(resp: Any, req: TrendRequest) -> Any:
+    """同一快取鍵的請求，關鍵字順序可能不同：回傳時換成該筆請求的 top_keywords"""
+    if resp is None:
+        return None
+    if isinstance(resp, TrendResponse):
+        return resp.model_copy(update={"top_keywords": req.top_keywords})
+    return dict(resp, top_keywords=req.top_keywords)
+
+
+def _context(req: TrendRequest) -> Dict[str, Any]:
+    """提供給模型的時序資料"""
+    return {
+        "period": req.period.model_dump(),
+        "top_keywords": req.top_keywords,
+        "dates": req.dates,
+        "series": [s.model_dump() for s in req.series],
+    }
+
+
 def _pick_model(prefix: str, fallback: str) -> str:
     """從 PREFERRED_MODELS 中選第一個以 prefix 開頭的型號，否則用 fallback。"""
     for m in PREFERRED_MODELS:
@@ -210,18 +340,7 @@ def _parse_sections(text: str) -> Dict[str, Any]:
     return result
 
 
-def build_prompt(req: TrendRequest) -> str:
-    """系統提示：要求模型根據曝光時序資料，輸出固定格式的摘要與建議。"""
-    return f"""
-你是一位專業的銀行貸款(個人信貸，與房屋貸款)理財分析師。請用 {req.output_lang} 回答。
-資料來源：請使用者提供的 Google Search Console 關鍵字「曝光」時間序列與上網檢索或引用外部新聞。
-目標：
-1) 描述在 {req.period.start} 至 {req.period.end} 期間的趨勢與變化與影響該變化的重大事件噢政策。
-2) 比較 Top-{len(req.top_keywords)} 關鍵字的相對表現（成長/衰退、彼此交叉）。
-3) 依據使用者定義的短/中/長期（短={req.short_mid_long_base_days}天；中=2x；長=3x），提出具體行動建議（行動關於用甚麼當作開頭讓使用者願意點進來我們的網站，與個人銀行貸款相關產品的推廣，如何達到最高效益）。
-4) 提供不超過一段的風險/不確定性說明（如資料天數不足、總量波動、季節性等）。
-
-請嚴格使用以下格式輸出（若無內容亦請保留標題）：
+OUTPUT_FORMAT = """
 [趨勢摘要]
 <多段落敘述>
 
@@ -242,80 +361,134 @@ def build_prompt(req: TrendRequest) -> str:
 """.strip()
 
 
+def build_prompt(req: TrendRequest) -> str:
+    """系統提示：要求模型根據曝光時序資料，輸出固定格式的摘要與建議。"""
+    return f"""
+你是一位專業的銀行貸款(個人信貸，與房屋貸款)理財分析師。請用 {req.output_lang} 回答。
+資料來源：請使用者提供的 Google Search Console 關鍵字「曝光」時間序列與上網檢索或引用外部新聞。
+目標：
+1) 描述在 {req.period.start} 至 {req.period.end} 期間的趨勢與變化與影響該變化的重大事件噢政策。
+2) 比較 Top-{len(req.top_keywords)} 關鍵字的相對表現（成長/衰退、彼此交叉）。
+3) 依據使用者定義的短/中/長期（短={req.short_mid_long_base_days}天；中=2x；長=3x），提出具體行動建議（行動關於用甚麼當作開頭讓使用者願意點進來我們的網站，與個人銀行貸款相關產品的推廣，如何達到最高效益）。
+4) 提供不超過一段的風險/不確定性說明（如資料天數不足、總量波動、季節性等）。
+
+請嚴格使用以下格式輸出（若無內容亦請保留標題）：
+{OUTPUT_FORMAT}
+""".strip()
+
+
+_ITEM_RE = re.compile(r"^\s*=+\s*分析\s*(\d+)\s*=+\s*$", re.M)
+
+
+def build_batch_prompt(reqs: List[TrendRequest]) -> str:
+    """多筆分析合併成一次呼叫：每筆輸出一個「=== 分析 <id> ===」區塊，區塊內格式同 build_prompt。"""
+    n = len(reqs)
+    return f"""
+你是一位專業的銀行貸款(個人信貸，與房屋貸款)理財分析師。請用 {reqs[0].output_lang} 回答。
+資料來源：請使用者提供的 Google Search Console 關鍵字「曝光」時間序列與上網檢索或引用外部新聞。
+[DATA] 是 {n} 組彼此獨立的分析（id 1~{n}），每組各有期間 period、Top 關鍵字 top_keywords、短期天數 short_mid_long_base_days 與曝光時間序列 series。
+請逐組分析，不要混用不同組的資料。每一組的目標：
+1) 描述該組期間內的趨勢與變化與影響該變化的重大事件或政策。
+2) 比較該組關鍵字的相對表現（成長/衰退、彼此交叉）；只有一個關鍵字時描述它本身的走勢。
+3) 依據該組的短/中/長期（短=short_mid_long_base_days 天；中=2x；長=3x），提出具體行動建議（行動關於用甚麼當作開頭讓使用者願意點進來我們的網站，與個人銀行貸款相關產品的推廣，如何達到最高效益）。
+4) 提供不超過一段的風險/不確定性說明（如資料天數不足、總量波動、季節性等）。
+
+請依 id 順序輸出 {n} 個區塊，每個區塊第一行為「=== 分析 <id> ===」，接著嚴格使用以下格式（若無內容亦請保留標題）：
+=== 分析 1 ===
+{OUTPUT_FORMAT}
+
+=== 分析 2 ===
+...
+""".strip()
+
+
+def _batch_data(reqs: List[TrendRequest]) -> str:
+    items = [{"id": i + 1, "short_mid_long_base_days": r.short_mid_long_base_days, **_context(r)}
+             for i, r in enumerate(reqs)]
+    return json.dumps(items, ensure_ascii=False)
+
+
+def _split_batch(text: str, n: int) -> Dict[int, str]:
+    """把合併輸出切回 {0-based index: 該筆的分段文字}；缺漏或空白的區塊不列入。"""
+    parts = list(_ITEM_RE.finditer(text))
+    out: Dict[int, str] = {}
+    for i, m in enumerate(parts):
+        k = int(m.group(1)) - 1
+        end = parts[i + 1].start() if i + 1 < len(parts) else len(text)
+        body = text[m.end():end].strip()
+        if 0 <= k < n and body and k not in out:
+            out[k] = body
+    return out
+
+
 # -------------------------
 # 供應商呼叫
 # -------------------------
-async def call_gemini(req: TrendRequest) -> Optional[ProviderOut]:
-    if not GEMINI_API_KEY:
-        return None
+def _provider_out(provider: str, model_name: str, parsed: Dict[str, Any], default_confidence: float) -> ProviderOut:
+    return ProviderOut(
+        provider=provider,
+        model=model_name,
+        summary=parsed["summary"],
+        actions_short=parsed["short"],
+        actions_mid=parsed["mid"],
+        actions_long=parsed["long"],
+        confidence=parsed["confidence"] if parsed["confidence"] is not None else default_confidence,
+    )
+
+
+async def gemini_text(prompt: str, data: str) -> Tuple[str, str]:
+    """回傳 (model_name, text)"""
     model_name = _pick_model("gemini", "gemini-2.5-flash")
     model = genai.GenerativeModel(model_name)
-    prompt = build_prompt(req)
-
-    # 把時序資料以 JSON 一起提供
-    context = {
-        "period": req.period.model_dump(),
-        "top_keywords": req.top_keywords,
-        "dates": req.dates,
-        "series": [s.model_dump() for s in req.series],
-    }
 
     # google-generativeai 是同步；改在執行緒避免阻塞事件圈
     import functools
     loop = asyncio.get_event_loop()
     resp = await loop.run_in_executor(
-        None, functools.partial(model.generate_content, [{"text": prompt}, {"text": json.dumps(context, ensure_ascii=False)}])
+        None, functools.partial(model.generate_content, [{"text": prompt}, {"text": data}])
     )
-    text = (getattr(resp, "text", "") or "").strip()
-    parsed = _parse_sections(text)
+    return model_name, (getattr(resp, "text", "") or "").strip()
 
-    return ProviderOut(
-        provider="gemini",
-        model=model_name,
-        summary=parsed["summary"],
-        actions_short=parsed["short"],
-        actions_mid=parsed["mid"],
-        actions_long=parsed["long"],
-        confidence=parsed["confidence"] if parsed["confidence"] is not None else 0.65,
-    )
 
+CLAUDE_SYSTEM = "You are an expert SEO analyst. Do NOT browse the web. Only use provided data."
 
-async def call_claude(req: TrendRequest) -> Optional[ProviderOut]:
-    if not anthropic_client:
-        return None
-    model_name = _pick_model("claude", "claude-3-5-sonnet-20241022")
-    prompt = build_prompt(req)
-    context = {
-        "period": req.period.model_dump(),
-        "top_keywords": req.top_keywords,
-        "dates": req.dates,
-        "series": [s.model_dump() for s in req.series],
-    }
 
-    msg = await anthropic_client.messages.create(
-        model=model_name,
-        max_tokens=1400,
+def _claude_params(prompt: str, data: str, max_tokens: int) -> Dict[str, Any]:
+    return dict(
+        model=_pick_model("claude", "claude-3-5-sonnet-20241022"),
+        max_tokens=max_tokens,
         temperature=0.4,
-        system="You are an expert SEO analyst. Do NOT browse the web. Only use provided data.",
-        messages=[{"role": "user", "content": f"{prompt}\n\n[DATA]\n{json.dumps(context, ensure_ascii=False)}"}],
+        system=CLAUDE_SYSTEM,
+        messages=[{"role": "user", "content": f"{prompt}\n\n[DATA]\n{data}"}],
     )
+
+
+async def claude_text(prompt: str, data: str, max_tokens: int = MAX_TOKENS) -> Tuple[str, str]:
+    """回傳 (model_name, text)"""
+    params = _claude_params(prompt, data, max_tokens)
+    model_name = params["model"]
+    msg = await anthropic_client.messages.create(**params)
     # 取出文字片段
     chunks = []
     for b in getattr(msg, "content", []):
         if getattr(b, "type", "") == "text":
             chunks.append(getattr(b, "text", ""))
-    text = "\n".join(chunks).strip()
-    parsed = _parse_sections(text)
+    return model_name, "\n".join(chunks).strip()
 
-    return ProviderOut(
-        provider="claude",
-        model=model_name,
-        summary=parsed["summary"],
-        actions_short=parsed["short"],
-        actions_mid=parsed["mid"],
-        actions_long=parsed["long"],
-        confidence=parsed["confidence"] if parsed["confidence"] is not None else 0.7,
-    )
+
+async def call_gemini(req: TrendRequest) -> Optional[ProviderOut]:
+    if not GEMINI_API_KEY:
+        return None
+    # 把時序資料以 JSON 一起提供
+    model_name, text = await gemini_text(build_prompt(req), json.dumps(_context(req), ensure_ascii=False))
+    return _provider_out("gemini", model_name, _parse_sections(text), 0.65)
+
+
+async def call_claude(req: TrendRequest) -> Optional[ProviderOut]:
+    if not anthropic_client:
+        return None
+    model_name, text = await claude_text(build_prompt(req), json.dumps(_context(req), ensure_ascii=False))
+    return _provider_out("claude", model_name, _parse_sections(text), 0.7)
 
 
 def make_consensus(outputs: List[ProviderOut]) -> str:
@@ -330,10 +503,746 @@ def make_consensus(outputs: List[ProviderOut]) -> str:
     return "\n".join(parts).strip()
 
 
+# -------------------------
+# 串流（SSE）
+# -------------------------
+_SECTION_KEYS = {
+    "趨勢摘要": "summary",
+    "行動建議-短期": "actions_short",
+    "行動建議-中期": "actions_mid",
+    "行動建議-長期": "actions_long",
+    "信心分數": "confidence",
+}
+
+
+class SectionStream:
+    """
+    逐段解析串流中的模型輸出：feed() 收文字片段，某個 [標題] 的內容在下一個標題出現
+    （或 close()）時才算完成，回傳 [(section key, 解析後的值), ...]。
+    值與 _parse_sections 相同：summary 為文字、actions_* 為條列、confidence 為 0~1 或 None。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0              # 已檢查到的位置（只看完整的行）
+        self._open = None          # (title, body 起點)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        done = []
+        end = self.text.rfind("\n") + 1
+        for m in _SECTION_RE.finditer(self.text, self._pos, end):
+            if self._open:
+                done.append(self._section(self._open[0], self.text[self._open[1]:m.start()]))
+            self._open = (m.group(1), m.end())
+        self._pos = max(self._pos, end)
+        return done
+
+    def close(self) -> List[Tuple[str, Any]]:
+        done = self.feed("\n")
+        if self._open:
+            done.append(self._section(self._open[0], self.text[self._open[1]:]))
+            self._open = None
+        return done
+
+    @staticmethod
+    def _section(title: str, body: str) -> Tuple[str, Any]:
+        parsed = _parse_sections(f"[{title}]\n{body.strip()}\n")
+        key = _SECTION_KEYS[title]
+        value = {"summary": parsed["summary"], "actions_short": parsed["short"], "actions_mid": parsed["mid"],
+                 "actions_long": parsed["long"], "confidence": parsed["confidence"]}[key]
+        return key, value
+
+
+async def gemini_stream(model_name: str, prompt: str, data: str) -> AsyncIterator[str]:
+    """generate_content(stream=True) 在執行緒中迭代，片段經 queue 交回事件圈"""
+    model = genai.GenerativeModel(model_name)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+    end = object()
+
+    def _run():
+        try:
+            for part in model.generate_content([{"text": prompt}, {"text": data}], stream=True):
+                if stopped.is_set():
+                    return
+                text = getattr(part, "text", "") or ""
+                if text:
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+            loop.call_soon_threadsafe(queue.put_nowait, end)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+
+    loop.run_in_executor(None, _run)
+    try:
+        while True:
+            item = await queue.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # 用戶端中斷時，讓執行緒在下一個片段停下
+        stopped.set()
+
+
+async def claude_stream(model_name: str, prompt: str, data: str) -> AsyncIterator[str]:
+    params = _claude_params(prompt, data, MAX_TOKENS)
+    params["model"] = model_name
+    async with anthropic_client.messages.stream(**params) as stream:
+        async for text in stream.text_stream:
+            yield text
+
+
+_STREAMS = {
+    # provider -> (預設模型, 串流函式, 解析不到信心分數時的預設值)
+    "gemini": ("gemini-2.5-flash", gemini_stream, 0.65),
+    "claude": ("claude-3-5-sonnet-20241022", claude_stream, 0.7),
+}
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_provider(name: str, req: TrendRequest, queue: asyncio.Queue) -> Optional[ProviderOut]:
+    """單一供應商的串流轉成 SSE 事件放進 queue；回傳完整的 ProviderOut（失敗時 None）"""
+    fallback, stream_fn, default_confidence = _STREAMS[name]
+    model_name = _pick_model(name, fallback)
+    parser = SectionStream()
+
+    async def emit(sections: List[Tuple[str, Any]]):
+        for key, value in sections:
+            await queue.put(_sse("section", {"provider": name, "model": model_name, "section": key, "value": value}))
+
+    async def pump():
+        async for chunk in stream_fn(model_name, build_prompt(req), json.dumps(_context(req), ensure_ascii=False)):
+            await emit(parser.feed(chunk))
+        await emit(parser.close())
+
+    breaker = BREAKERS[name]
+    try:
+        # 與非串流呼叫相同的 deadline：卡住的供應商不可讓串流（及共用它的 _inflight）一直開著
+        await asyncio.wait_for(pump(), PROVIDER_TIMEOUT[name])
+    except asyncio.CancelledError:
+        breaker.cancelled()
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            error = f"timed out after {PROVIDER_TIMEOUT[name]:g}s"
+        else:
+            error = f"{type(e).__name__}: {e}"
+        print(f"[ERROR] Provider {name} stream failed: {error}")
+        _record_failure(name)
+        await queue.put(_sse("provider_error", {"provider": name, "error": error}))
+        return None
+    breaker.success()
+    out = _provider_out(name, model_name, _parse_sections(parser.text.strip()), default_confidence)
+    await queue.put(_sse("provider", out.model_dump()))
+    return out
+
+
+async def stream_summary(req: TrendRequest, cache_key: str) -> AsyncIterator[str]:
+    """
+    SSE 事件：
+      section         {provider, model, section, value}  某供應商的一段完成
+      provider        ProviderOut                        某供應商全部完成
+      provider_error  {provider, error}
+      done            TrendResponse                      全部完成（並寫入快取）
+      error           {detail}                           所有供應商都失敗
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    # 串流期間登記為進行中，讓同一個 key 的非串流請求共用結果
+    flight = None
+    if cache_key not in _inflight:
+        flight = asyncio.get_running_loop().create_future()
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        _inflight[cache_key] = flight
+
+    async def run(name: str) -> Optional[ProviderOut]:
+        try:
+            return await _stream_provider(name, req, queue)
+        finally:
+            queue.put_nowait(finished)
+
+    # 串流時所有供應商都送出（各自逐段顯示）；斷路器打開的略過
+    tasks = [asyncio.create_task(run(n)) for n in _providers() if BREAKERS[n].allow()]
+    try:
+        pending = len(tasks)
+        while pending:
+            item = await queue.get()
+            if item is finished:
+                pending -= 1
+            else:
+                yield item
+        # 依供應商順序組回（與非串流端點相同）
+        outputs = [t.result() for t in tasks if t.result()]
+        if not outputs:
+            yield _sse("error", {"detail": "All LLM providers failed."})
+            return
+        resp = _trend_response(req, outputs)
+        await _cache_put({cache_key: (req, resp)})
+        if flight is not None:
+            flight.set_result(resp)
+        yield _sse("done", resp.model_dump())
+    finally:
+        # 用戶端中斷：停掉還在跑的供應商
+        for t in tasks:
+            t.cancel()
+        if flight is not None:
+            if not flight.done():
+                flight.set_result(None)
+            if _inflight.get(cache_key) is flight:
+                del _inflight[cache_key]
+
+
+# -------------------------
+# L1 快取 / singleflight
+# -------------------------
+class LocalCache:
+    """
+    行程內 LRU + TTL 快取，筆數（max_entries）與位元組（max_bytes，以 JSON 長度計）都有上限。
+    只在事件圈中使用，不需要鎖。值為快取的 TrendResponse dict，呼叫端不可修改。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries, self.max_bytes, self.ttl = max_entries, max_bytes, ttl
+        self._items: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            self.delete(key)
+            return None
+        self._items.move_to_end(key)
+        return item[2]
+
+    def put(self, key: str, value: Any, nbytes: int) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0 or nbytes > self.max_bytes:
+            return
+        self.delete(key)
+        self._items[key] = (time.monotonic() + self.ttl, nbytes, value)
+        self.bytes += nbytes
+        while len(self._items) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, size, _) = self._items.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.bytes -= item[1]
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._items), "bytes": self.bytes, "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes, "ttl": self.ttl, "evictions": self.evictions}
+
+
+l1 = LocalCache(L1_MAX_ENTRIES, L1_MAX_BYTES, L1_TTL)
+
+
+def _l1_put(key: str, value: Any, raw: Optional[str] = None) -> None:
+    if raw is None:
+        raw = json.dumps(value, ensure_ascii=False)
+    l1.put(key, value, len(raw.encode("utf-8")))
+
+
+async def _publish_invalidation(keys: Any) -> None:
+    """通知其他副本丟掉 L1 中的這些 key（"*" = 全部）；自己發出的訊息由 listener 略過"""
+    if rcli is None:
+        return
+    try:
+        await rcli.publish(CACHE_CHANNEL, json.dumps({"origin": REPLICA_ID, "keys": keys}))
+    except Exception as e:
+        print(f"[ERROR] cache invalidation publish failed: {type(e).__name__}: {str(e)}")
+
+
+async def _listen_invalidations() -> None:
+    """訂閱失效頻道；斷線期間可能漏掉訊息，所以重新連上前先清空 L1"""
+    while True:
+        try:
+            pubsub = rcli.pubsub()
+            await pubsub.subscribe(CACHE_CHANNEL)
+            async for msg in pubsub.listen():
+                if msg.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(msg["data"])
+                except Exception:
+                    continue
+                if data.get("origin") == REPLICA_ID:
+                    continue
+                if data.get("keys") == "*":
+                    l1.clear()
+                else:
+                    for key in data.get("keys") or []:
+                        l1.delete(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] cache invalidation listener: {type(e).__name__}: {str(e)}")
+            l1.clear()
+            await asyncio.sleep(1)
+
+
+# 進行中的計算：cache key -> Future[TrendResponse | None]
+_inflight: Dict[str, asyncio.Future] = {}
+_flight_tasks: set = set()
+SINGLEFLIGHT_STATS: Dict[str, int] = {"started": 0, "shared": 0}
+
+
+def _flights(keys: List[str], compute: Callable[[List[str]], Awaitable[Dict[str, TrendResponse]]]) -> Dict[str, asyncio.Future]:
+    """
+    Singleflight：keys 中已有進行中計算的直接共用該結果；其餘交給 compute(其餘 keys)，
+    在獨立 task 中一次算完（呼叫端斷線不會取消計算，其他等待者照樣拿到結果）。
+    Returns: {key: Future[TrendResponse | None]}，用 _await_flights 等待
+    """
+    futs: Dict[str, asyncio.Future] = {}
+    own: List[str] = []
+    for k in dict.fromkeys(keys):
+        if k in _inflight:
+            futs[k] = _inflight[k]
+            SINGLEFLIGHT_STATS["shared"] += 1
+        else:
+            own.append(k)
+    if not own:
+        return futs
+
+    loop = asyncio.get_running_loop()
+    mine = {k: loop.create_future() for k in own}
+    for f in mine.values():
+        # 沒人等待時也不留下 "exception was never retrieved"
+        f.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _inflight.update(mine)
+    SINGLEFLIGHT_STATS["started"] += len(own)
+
+    async def run():
+        try:
+            results = await compute(own)
+            for k, f in mine.items():
+                f.set_result(results.get(k))
+        except BaseException as e:
+            for f in mine.values():
+                if not f.done():
+                    f.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            for k, f in mine.items():
+                if _inflight.get(k) is f:
+                    del _inflight[k]
+
+    task = asyncio.create_task(run())
+    _flight_tasks.add(task)
+    task.add_done_callback(_flight_tasks.discard)
+    futs.update(mine)
+    return futs
+
+
+async def _await_flights(futs: Dict[str, asyncio.Future]) -> Dict[str, TrendResponse]:
+    """等待 _flights 的結果；失敗（例外或所有供應商都失敗）的 key 不列入"""
+    results = await asyncio.gather(*(asyncio.shield(f) for f in futs.values()), return_exceptions=True)
+    return {k: r for k, r in zip(futs, results) if isinstance(r, TrendResponse)}
+
+
+# -------------------------
+# 供應商派送：deadline / 斷路器 / all・first・hedged
+# -------------------------
+class CircuitBreaker:
+    """
+    連續失敗 threshold 次後打開（略過該供應商）；cooldown 秒後放行一個試探呼叫（half-open），
+    成功就關閉，失敗再打開一輪。
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def success(self) -> None:
+        self.failures, self.opened_at, self._probing = 0, None, False
+
+    def failure(self) -> bool:
+        """記錄一次失敗；回傳 True 表示斷路器因此打開（或試探失敗後重新打開）"""
+        self.failures += 1
+        self._probing = False
+        if self.threshold > 0 and self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def cancelled(self) -> None:
+        """呼叫被取消（first / hedged 的落後者）：不算成敗，但要釋放試探名額"""
+        self._probing = False
+
+
+BREAKERS: Dict[str, CircuitBreaker] = {n: CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN) for n in PROVIDER_TIMEOUT}
+# 成功呼叫的延遲（秒），依 (呼叫種類, 供應商) 分開：single / batch 的量級不同
+LATENCY: Dict[Tuple[str, str], deque] = {}
+
+
+def _p95(kind: str, name: str) -> Optional[float]:
+    samples = sorted(LATENCY.get((kind, name), ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+
+
+def _ranked(names: List[str]) -> List[str]:
+    """依 PREFERRED_MODELS 的順序排供應商（排第一的是 hedged 的主要供應商）"""
+    def rank(name: str) -> int:
+        for i, m in enumerate(PREFERRED_MODELS):
+            if m.lower().startswith(name):
+                return i
+        return len(PREFERRED_MODELS)
+    return sorted(names, key=rank)
+
+
+def _record_failure(name: str) -> None:
+    breaker = BREAKERS[name]
+    if breaker.failure():
+        # 只在打開時記一次；之後被略過的請求不再逐筆輸出（狀態見 /v1/health）
+        print(f"[ERROR] Provider {name} circuit open after {breaker.failures} consecutive failures; "
+              f"skipping it for {breaker.cooldown:g}s")
+
+
+async def _guarded(kind: str, name: str, call: Callable[[str], Awaitable[Any]], scale: float) -> Any:
+    """單一供應商呼叫：套 deadline、記錄延遲與斷路器；失敗回傳 None"""
+    breaker = BREAKERS[name]
+    t0 = time.monotonic()
+    try:
+        result = await asyncio.wait_for(call(name), PROVIDER_TIMEOUT[name] * scale)
+    except asyncio.CancelledError:
+        breaker.cancelled()
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            print(f"[ERROR] Provider {name} timed out after {PROVIDER_TIMEOUT[name] * scale:g}s")
+        else:
+            print(f"[ERROR] Provider {name} failed: {type(e).__name__}: {str(e)}")
+        _record_failure(name)
+        return None
+    breaker.success()
+    LATENCY.setdefault((kind, name), deque(maxlen=200)).append(time.monotonic() - t0)
+    return result
+
+
+async def _dispatch(kind: str, call: Callable[[str], Awaitable[Any]],
+                    scale: float = 1.0) -> Tuple[List[Tuple[str, Any]], int]:
+    """
+    依 DISPATCH_MODE 呼叫可用的供應商；call(name) 回傳空值視為沒有結果。
+    斷路器打開的供應商直接略過；deadline 為 PROVIDER_TIMEOUT × scale。
+    Returns: ([(provider, result), ...] 依 _providers() 順序, 實際送出的呼叫數)
+    """
+    names = _providers()
+    queue = _ranked(names) if DISPATCH_MODE != "all" else list(names)
+    running: Dict[asyncio.Task, str] = {}
+    results: Dict[str, Any] = {}
+
+    def launch(n_max: int) -> None:
+        while queue and n_max > 0:
+            name = queue.pop(0)
+            if not BREAKERS[name].allow():
+                continue
+            running[asyncio.create_task(_guarded(kind, name, call, scale))] = name
+            n_max -= 1
+
+    launch(1 if DISPATCH_MODE == "hedged" else len(queue))
+    try:
+        while True:
+            pending = {t for t in running if not t.done()}
+            if not pending:
+                if DISPATCH_MODE == "hedged" and queue:
+                    # 主要供應商失敗（或被斷路器略過）：換下一個
+                    launch(1)
+                    continue
+                break
+            timeout = None
+            if DISPATCH_MODE == "hedged" and queue:
+                # 還在跑的那一個才是主要供應商（先前失敗的已不在 pending 中）
+                primary = running[next(iter(pending))]
+                timeout = min(_p95(kind, primary) or HEDGE_DELAY_SEC, PROVIDER_TIMEOUT[primary] * scale)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.result():
+                    results[running[t]] = t.result()
+            if results and DISPATCH_MODE != "all":
+                break
+            if not done:
+                # hedged：超過主要供應商的 p95 仍未回來，加呼叫其他供應商
+                launch(len(queue))
+    finally:
+        for t in running:
+            if not t.done():
+                t.cancel()
+    return [(n, results[n]) for n in names if n in results], len(running)
+
+
+def _dispatch_stats() -> Dict[str, Any]:
+    out = {}
+    for name in _providers():
+        b = BREAKERS[name]
+        out[name] = {
+            "circuit": b.state,
+            "consecutive_failures": b.failures,
+            "timeout_sec": PROVIDER_TIMEOUT[name],
+            "p95_sec": {kind: round(_p95(kind, name), 3) if _p95(kind, name) is not None else None
+                        for kind in ("single", "batch")},
+        }
+    return {"mode": DISPATCH_MODE, "providers": out}
+
+
+# -------------------------
+# 呼叫編排 / 快取寫入
+# -------------------------
+def _providers() -> List[str]:
+    out = []
+    if GEMINI_API_KEY:
+        out.append("gemini")
+    if CLAUDE_API_KEY:
+        out.append("claude")
+    return out
+
+
+async def _call_providers(req: TrendRequest) -> List[ProviderOut]:
+    """依 DISPATCH_MODE 呼叫供應商；若單一供應商失敗，不影響另一個"""
+    calls = {"gemini": call_gemini, "claude": call_claude}
+    done, _ = await _dispatch("single", lambda name: calls[name](req))
+    return [out for _, out in done]
+
+
+async def _provider_batch(name: str, reqs: List[TrendRequest]) -> Dict[int, ProviderOut]:
+    """一個供應商、一次呼叫處理多筆分析；回傳 {index: ProviderOut}（解析不到的筆數不列入）"""
+    prompt, data = build_batch_prompt(reqs), _batch_data(reqs)
+    if name == "gemini":
+        model_name, text = await gemini_text(prompt, data)
+        default_confidence = 0.65
+    else:
+        model_name, text = await claude_text(prompt, data, max_tokens=min(MAX_TOKENS * len(reqs), BATCH_MAX_TOKENS))
+        default_confidence = 0.7
+    return {i: _provider_out(name, model_name, _parse_sections(body), default_confidence)
+            for i, body in _split_batch(text, len(reqs)).items()}
+
+
+async def _call_providers_batch(reqs: List[TrendRequest]) -> Tuple[List[List[ProviderOut]], int]:
+    """
+    回傳 (每筆的 provider outputs, 實際送出的呼叫數)。
+    同一 output_lang 的請求每 BATCH_MAX_ITEMS 筆合併為一次呼叫；只有一筆時走單筆 prompt。
+    """
+    outputs: List[List[ProviderOut]] = [[] for _ in reqs]
+    groups: Dict[str, List[int]] = {}
+    for i, r in enumerate(reqs):
+        groups.setdefault(r.output_lang, []).append(i)
+    chunks = [idx[j:j + BATCH_MAX_ITEMS] for idx in groups.values() for j in range(0, len(idx), BATCH_MAX_ITEMS)]
+
+    singles = [c[0] for c in chunks if len(c) == 1]
+    combined = [c for c in chunks if len(c) > 1]
+    calls = {"gemini": call_gemini, "claude": call_claude}
+
+    def packed(c: List[int]) -> Callable[[str], Awaitable[Dict[int, ProviderOut]]]:
+        return lambda name: _provider_batch(name, [reqs[i] for i in c])
+
+    def single(i: int) -> Callable[[str], Awaitable[Optional[ProviderOut]]]:
+        return lambda name: calls[name](reqs[i])
+
+    # 合併呼叫的 deadline 依筆數放寬（輸出長度與 max_tokens 同比例）
+    results = await asyncio.gather(*(_dispatch("batch", packed(c), scale=len(c)) for c in combined),
+                                   *(_dispatch("single", single(i)) for i in singles))
+    n_calls = sum(launched for _, launched in results)
+
+    # 依供應商順序放回各筆（與單筆端點相同：gemini 在前）
+    for c, (done, _) in zip(combined, results[:len(combined)]):
+        for _, r in done:
+            for k, out in r.items():
+                outputs[c[k]].append(out)
+    for i, (done, _) in zip(singles, results[len(combined):]):
+        outputs[i] = [out for _, out in done]
+
+    # 合併輸出裡完全沒有的筆數，退回單筆呼叫
+    retry = [i for c in combined for i in c if not outputs[i]]
+    if retry:
+        again = await asyncio.gather(*(_dispatch("single", single(i)) for i in retry))
+        for i, (done, launched) in zip(retry, again):
+            outputs[i] = [out for _, out in done]
+            n_calls += launched
+    return outputs, n_calls
+
+
+def _trend_response(req: TrendRequest, outputs: List[ProviderOut]) -> TrendResponse:
+    return TrendResponse(
+        period=req.period,
+        top_keywords=req.top_keywords,
+        dates=req.dates,
+        provider_outputs=outputs,
+        consensus_summary=make_consensus(outputs),
+        notes="本結果僅依據提供的曝光時序資料，不含外部新聞。",
+    )
+
+
+# 各層命中次數（本行程，自啟動起累計）
+CACHE_STATS: Dict[str, int] = {"l1": 0, "exact": 0, "similar": 0, "miss": 0}
+
+
+def _cache_stats() -> Dict[str, Any]:
+    """
+    Returns: {'lookups': int, 'hit_rate': float,
+              'l1': {'count', 'rate'}, 'exact': {...}, 'similar': {...}, 'miss': {...},
+              'sim_distance': float, 'l1_store': {...}, 'singleflight': {'started', 'shared'}}
+    """
+    total = sum(CACHE_STATS.values())
+
+    def rate(n: int) -> float:
+        return round(n / total, 4) if total else 0.0
+
+    out: Dict[str, Any] = {"lookups": total, "hit_rate": rate(total - CACHE_STATS["miss"])}
+    for tier, n in CACHE_STATS.items():
+        out[tier] = {"count": n, "rate": rate(n)}
+    out["sim_distance"] = CACHE_SIM_DISTANCE
+    out["l1_store"] = l1.stats()
+    out["singleflight"] = dict(SINGLEFLIGHT_STATS, in_flight=len(_inflight))
+    return out
+
+
+async def _cache_lookup(reqs: Dict[str, TrendRequest]) -> Dict[str, Any]:
+    """
+    查快取（use_cache=False 的請求由呼叫端排除）：
+    0. l1：行程內快取
+    1. exact：其餘的正規化鍵一次 Redis MGET
+    2. similar（CACHE_SIM_DISTANCE > 0）：未命中者一次 pipeline 讀各自的相似度索引，
+       取距離最近且 <= CACHE_SIM_DISTANCE 的快取鍵，再一次 MGET
+    Redis 命中的結果一併放進 L1。
+    Returns: {cache key: 快取的 TrendResponse dict}
+    """
+    found: Dict[str, Any] = {}
+    for k in reqs:
+        hit = l1.get(k)
+        if hit is not None:
+            found[k] = hit
+            CACHE_STATS["l1"] += 1
+    keys = [k for k in reqs if k not in found]
+    if not keys:
+        return found
+    if rcli is None:
+        CACHE_STATS["miss"] += len(keys)
+        return found
+
+    for k, raw in zip(keys, await rcli.mget(keys)):
+        if raw:
+            try:
+                found[k] = json.loads(raw)
+                _l1_put(k, found[k], raw)
+                CACHE_STATS["exact"] += 1
+            except Exception:
+                pass
+
+    rest = [k for k in keys if k not in found]
+    if rest and CACHE_SIM_DISTANCE > 0:
+        async with rcli.pipeline(transaction=False) as pipe:
+            for k in rest:
+                pipe.hgetall(_sim_key(reqs[k]))
+            indexes = await pipe.execute()
+        nearest: Dict[str, str] = {}
+        for k, index in zip(rest, indexes):
+            vec = _series_vector(reqs[k])
+            best = None
+            for other, raw_vec in (index or {}).items():
+                try:
+                    d = _distance(vec, json.loads(raw_vec))
+                except Exception:
+                    continue
+                if d <= CACHE_SIM_DISTANCE and (best is None or d < best[0]):
+                    best = (d, other)
+            if best:
+                nearest[k] = best[1]
+        if nearest:
+            stale = []
+            for k, raw in zip(nearest, await rcli.mget(list(nearest.values()))):
+                if not raw:
+                    stale.append((_sim_key(reqs[k]), nearest[k]))  # 答案已過期，索引還在
+                    continue
+                try:
+                    found[k] = json.loads(raw)
+                    _l1_put(k, found[k], raw)
+                    CACHE_STATS["similar"] += 1
+                except Exception:
+                    pass
+            if stale:
+                async with rcli.pipeline(transaction=False) as pipe:
+                    for sim_key, field in stale:
+                        pipe.hdel(sim_key, field)
+                    await pipe.execute()
+
+    CACHE_STATS["miss"] += len(keys) - len(found)
+    return found
+
+
+async def _cache_put(items: Dict[str, Tuple[TrendRequest, TrendResponse]]) -> None:
+    """
+    寫入 L1 與 Redis（多筆時一次 pipeline）；開啟相似度層時一併登記到相似度索引。
+    同一個 pipeline 發布失效訊息，讓其他副本丟掉 L1 中的舊答案。
+    """
+    if not items:
+        return
+    raws = {}
+    for key, (_, resp) in items.items():
+        value = resp.model_dump()
+        raws[key] = json.dumps(value, ensure_ascii=False)
+        _l1_put(key, value, raws[key])
+    if rcli is None:
+        return
+    try:
+        async with rcli.pipeline(transaction=False) as pipe:
+            for key, (req, _) in items.items():
+                pipe.setex(key, CACHE_TTL, raws[key])
+                if CACHE_SIM_DISTANCE > 0:
+                    sim_key = _sim_key(req)
+                    pipe.hset(sim_key, key, json.dumps(_series_vector(req)))
+                    pipe.expire(sim_key, CACHE_TTL)
+            pipe.publish(CACHE_CHANNEL, json.dumps({"origin": REPLICA_ID, "keys": list(items)}))
+            await pipe.execute()
+    except Exception:
+        pass
+
+
 # -------------------------
 # FastAPI App
 # -------------------------
-app = FastAPI(title=APP_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = asyncio.create_task(_listen_invalidations()) if rcli is not None else None
+    yield
+    if listener is not None:
+        listener.cancel()
+
+
+app = FastAPI(title=APP_NAME, lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -358,9 +1267,34 @@ async def health():
             "claude": bool(CLAUDE_API_KEY),
         },
         "cache": bool(rcli is not None),
+        "dispatch": _dispatch_stats(),
     }
 
 
+@app.get("/v1/cache/stats")
+async def cache_stats():
+    """各快取層（l1 / exact / similar）的命中次數與命中率"""
+    return _cache_stats()
+
+
+@app.delete("/v1/cache")
+async def invalidate_cache():
+    """清空趨勢摘要快取：本機 L1、Redis 中的 llm:trend:*，並通知其他副本清空 L1"""
+    l1.clear()
+    deleted = 0
+    if rcli is not None:
+        batch = []
+        async for key in rcli.scan_iter(match="llm:trend:*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await rcli.delete(*batch)
+                batch = []
+        if batch:
+            deleted += await rcli.delete(*batch)
+        await _publish_invalidation("*")
+    return {"ok": True, "deleted": deleted}
+
+
 @app.post("/v1/summarize/trend", response_model=TrendResponse)
 async def summarize_trend(req: TrendRequest):
     # 基本資料檢查
@@ -383,67 +1317,113 @@ async def summarize_trend(req: TrendRequest):
         traceback.print_exc()
         raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
 
-    payload = req.model_dump()
-    cache_key = "llm:trend:" + _hash_payload(payload)
+    cache_key = _cache_key(req)
 
     # 讀取快取
-    if req.use_cache and rcli is not None:
-        cached = await rcli.get(cache_key)
-        if cached:
-            try:
-                return json.loads(cached)
-            except Exception:
-                pass
+    if req.use_cache:
+        found = await _cache_lookup({cache_key: req})
+        if cache_key in found:
+            return _for_request(found[cache_key], req)
 
-    # 準備 LLM 呼叫
-    calls = []
-    print(f"[DEBUG] GEMINI_API_KEY configured: {bool(GEMINI_API_KEY)}")
-    print(f"[DEBUG] CLAUDE_API_KEY configured: {bool(CLAUDE_API_KEY)}")
-    if GEMINI_API_KEY:
-        print("[DEBUG] Adding Gemini call")
-        calls.append(call_gemini(req))
-    if CLAUDE_API_KEY:
-        print("[DEBUG] Adding Claude call")
-        calls.append(call_claude(req))
-
-    if not calls:
+    if not _providers():
         print("[ERROR] No LLM provider available")
         raise HTTPException(status_code=400, detail="No LLM provider available (set GEMINI_API_KEY and/or CLAUDE_API_KEY).")
 
-    # 并發呼叫；若單一供應商失敗，不影響另一個
-    print(f"[DEBUG] Calling {len(calls)} LLM provider(s)")
-    results = await asyncio.gather(*calls, return_exceptions=True)
-    print(f"[DEBUG] Got {len(results)} results")
-    outputs: List[ProviderOut] = []
-    for i, r in enumerate(results):
-        if isinstance(r, Exception):
-            # 不中斷；略過失敗供應商
-            print(f"[ERROR] Provider {i} failed: {type(r).__name__}: {str(r)}")
-            import traceback
-            traceback.print_exc()
-            continue
-        if r:
-            print(f"[DEBUG] Provider {i} succeeded: {r.provider}")
-            outputs.append(r)
-
-    if not outputs:
+    async def compute(keys: List[str]) -> Dict[str, TrendResponse]:
+        outputs = await _call_providers(req)
+        if not outputs:
+            return {}
+        resp = _trend_response(req, outputs)
+        # 寫入快取
+        await _cache_put({cache_key: (req, resp)})
+        return {cache_key: resp}
+
+    # 同一個 key 已有進行中的呼叫時共用，不再各自呼叫供應商
+    done = await _await_flights(_flights([cache_key], compute))
+    if cache_key not in done:
         print("[ERROR] All LLM providers failed")
         raise HTTPException(status_code=502, detail="All LLM providers failed.")
+    return _for_request(done[cache_key], req)
 
-    resp = TrendResponse(
-        period=req.period,
-        top_keywords=req.top_keywords,
-        dates=req.dates,
-        provider_outputs=outputs,
-        consensus_summary=make_consensus(outputs),
-        notes="本結果僅依據提供的曝光時序資料，不含外部新聞。",
-    )
 
-    # 寫入快取
-    if rcli is not None:
+@app.post("/v1/summarize/trend:batch", response_model=TrendBatchResponse)
+async def summarize_trend_batch(batch: TrendBatchRequest):
+    """
+    多張圖表的摘要一次完成：
+    - 全部快取 key 先查 L1，其餘一次 MGET；內容相同的請求只算一次，其他請求正在算的 key 直接共用
+    - 未命中的請求，每個供應商合併成一次呼叫（每次最多 BATCH_MAX_ITEMS 筆），再依「=== 分析 k ===」切回各筆
+    - 合併輸出缺了某筆時，該筆退回單筆呼叫
+    results 與 requests 同順序；某筆所有供應商都失敗時為 null（全部失敗則 502）。
+    """
+    reqs = batch.requests
+    for i, r in enumerate(reqs):
         try:
-            await rcli.setex(cache_key, CACHE_TTL, json.dumps(resp.model_dump(), ensure_ascii=False))
-        except Exception:
-            pass
+            _validate_lengths(r)
+        except HTTPException as e:
+            raise HTTPException(status_code=400, detail=f"requests[{i}]: {e.detail}")
+
+    keys = [_cache_key(r) for r in reqs]
+    unique: Dict[str, TrendRequest] = {}
+    for k, r in zip(keys, reqs):
+        unique.setdefault(k, r)
+    # 同一個 key 只要有一筆 use_cache=false 就重新計算，同 key 的其他筆共用新結果（不可拿到舊快取）
+    bypass = {k for k, r in zip(keys, reqs) if not r.use_cache}
 
-    return resp
+    found = await _cache_lookup({k: r for k, r in unique.items() if k not in bypass})
+
+    missing = [k for k in unique if k not in found]
+    if missing and not _providers():
+        raise HTTPException(status_code=400, detail="No LLM provider available (set GEMINI_API_KEY and/or CLAUDE_API_KEY).")
+    llm_calls = 0
+
+    async def compute(own: List[str]) -> Dict[str, TrendResponse]:
+        nonlocal llm_calls
+        outputs, llm_calls = await _call_providers_batch([unique[k] for k in own])
+        computed = {k: _trend_response(unique[k], outs) for k, outs in zip(own, outputs) if outs}
+        await _cache_put({k: (unique[k], resp) for k, resp in computed.items()})
+        return computed
+
+    # 已在其他請求中計算的 key 直接等它（singleflight），其餘合併呼叫
+    fresh = await _await_flights(_flights(missing, compute)) if missing else {}
+    if missing and not fresh:
+        raise HTTPException(status_code=502, detail="All LLM providers failed.")
+
+    return TrendBatchResponse(
+        results=[_for_request(found.get(k) or fresh.get(k), r) for k, r in zip(keys, reqs)],
+        cached=[k in found for k in keys],
+        llm_calls=llm_calls,
+    )
+
+
+@app.post("/v1/summarize/trend:stream")
+async def summarize_trend_stream(req: TrendRequest):
+    """
+    summarize_trend 的 SSE 版本：各供應商的每一段（[趨勢摘要]、[行動建議-短期] ...）一完成就送出，
+    不必等最慢的模型；最後的 done 事件為完整 TrendResponse（與非串流端點相同並寫入快取）。
+    快取命中時直接送出 done。
+    """
+    _validate_lengths(req)
+    cache_key = _cache_key(req)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    if req.use_cache:
+        found = await _cache_lookup({cache_key: req})
+        if cache_key in found:
+            async def _hit():
+                yield _sse("done", _for_request(found[cache_key], req))
+            return StreamingResponse(_hit(), media_type="text/event-stream", headers=headers)
+
+    if not _providers():
+        raise HTTPException(status_code=400, detail="No LLM provider available (set GEMINI_API_KEY and/or CLAUDE_API_KEY).")
+    if cache_key in _inflight:
+        # 同一個 key 已在計算：等結果，只送出 done
+        flight = _inflight[cache_key]
+
+        async def _join():
+            done = await _await_flights({cache_key: flight})
+            if cache_key in done:
+                yield _sse("done", _for_request(done[cache_key], req).model_dump())
+            else:
+                yield _sse("error", {"detail": "All LLM providers failed."})
+        return StreamingResponse(_join(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(stream_summary(req, cache_key), media_type="text/event-stream", headers=headers)